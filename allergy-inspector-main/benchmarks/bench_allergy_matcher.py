@@ -0,0 +1,139 @@
+"""
+Benchmark: local allergy-description matcher vs. the LLM inference path.
+
+Runs every description in the corpus through services.allergy_matcher and
+reports how many it resolves locally, how accurate those answers are and how
+long they take. With --live the same corpus also goes through the model
+(get_infers_allergy_model_response with use_local=False, against an empty
+cache) so both paths and the combined fast-path-then-model flow can be compared.
+
+An answer counts as correct only when its allergies are exactly the expected
+ones, compared by canonical name (family names and aliases resolve to the
+family, foods stay foods: "shellfish" is "seafood", "peanut" is not "nuts").
+A food widened to its family, or any extra allergy, is a miss. False
+positives (predicted allergies that were not expected) are also counted on
+their own, and the corpus has cases where the right answer is the food, not
+a family it belongs to ("pizza", "eggplant", "rice cake").
+
+Usage:
+    python benchmarks/bench_allergy_matcher.py
+    python benchmarks/bench_allergy_matcher.py --verbose
+    python benchmarks/bench_allergy_matcher.py --live   # needs MULTIMODAL_API_KEY
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "allergy_descriptions.jsonl")
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def canonical(name):
+    """The family an allergy name stands for (lowercased), else the normalized food itself."""
+    from services.allergen_kb import resolve_allergy
+    families, terms = resolve_allergy(name)
+    return next(iter(families)).lower() if families else next(iter(terms), "")
+
+
+def canonical_set(names):
+    return {canonical(name) for name in names} - {""}
+
+
+def agrees(expected, predicted):
+    return canonical_set(expected) == canonical_set(predicted)
+
+
+def false_positives(expected, predicted):
+    return len(canonical_set(predicted) - canonical_set(expected))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_local(corpus, verbose=False):
+    from services.allergy_matcher import match_description
+    from services.multi_modal import normalize_description
+
+    results = []
+    for item in corpus:
+        text = normalize_description(item["text"])
+        start = time.perf_counter()
+        allergies, confident = match_description.__wrapped__(text)  # Bypass the memo: cold timing.
+        elapsed = time.perf_counter() - start
+        results.append((list(allergies), confident, elapsed))
+        if verbose:
+            mark = "✅" if confident and agrees(item["expected"], allergies) else "❌" if confident else "↗️"
+            print(f"{mark} {item['text'][:60]:<62}{list(allergies) if confident else 'escalated'}")
+    return results
+
+
+def run_model(corpus):
+    from services.multi_modal import get_infers_allergy_model_response
+
+    results = []
+    for item in corpus:
+        start = time.perf_counter()
+        allergies = get_infers_allergy_model_response(item["text"], use_local=False)
+        results.append((allergies, time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--live", action="store_true", help="Also run the model path (needs MULTIMODAL_API_KEY).")
+    parser.add_argument("--verbose", action="store_true", help="Print the local answer for every description.")
+    args = parser.parse_args()
+
+    if args.live:
+        # A fresh cache, so every model call is actually made.
+        os.environ["ALLERGY_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-allergy-")
+
+    corpus = load_corpus(args.corpus)
+    local = run_local(corpus, args.verbose)
+    resolved = [(item, allergies) for item, (allergies, confident, _) in zip(corpus, local) if confident]
+    correct = sum(agrees(item["expected"], allergies) for item, allergies in resolved)
+    wrong_allergies = sum(false_positives(item["expected"], allergies) for item, allergies in resolved)
+    local_us = [elapsed * 1e6 for _, _, elapsed in local]
+
+    print(f"\ncorpus: {len(corpus)} descriptions")
+    print(f"local matcher: resolved {len(resolved)}/{len(corpus)} ({len(resolved) / len(corpus):.0%}), "
+          f"correct {correct}/{len(resolved)} ({correct / max(1, len(resolved)):.0%}), "
+          f"false positives {wrong_allergies}, "
+          f"median {statistics.median(local_us):.0f} µs, p95 {percentile(local_us, 0.95):.0f} µs")
+
+    if not args.live:
+        return
+
+    model = run_model(corpus)
+    model_correct = sum(agrees(item["expected"], allergies) for item, (allergies, _) in zip(corpus, model))
+    model_wrong = sum(false_positives(item["expected"], allergies) for item, (allergies, _) in zip(corpus, model))
+    model_ms = [elapsed * 1000 for _, elapsed in model]
+    print(f"model only:    correct {model_correct}/{len(corpus)} ({model_correct / len(corpus):.0%}), "
+          f"false positives {model_wrong}, "
+          f"median {statistics.median(model_ms):.0f} ms, p95 {percentile(model_ms, 0.95):.0f} ms")
+
+    combined_correct, combined_ms = 0, []
+    for item, (allergies, confident, local_elapsed), (model_allergies, model_elapsed) in zip(corpus, local, model):
+        answer = allergies if confident else model_allergies
+        combined_correct += agrees(item["expected"], answer)
+        combined_ms.append((local_elapsed + (0 if confident else model_elapsed)) * 1000)
+    print(f"fast path + model: correct {combined_correct}/{len(corpus)} ({combined_correct / len(corpus):.0%}), "
+          f"median {statistics.median(combined_ms):.1f} ms, mean {statistics.mean(combined_ms):.0f} ms, "
+          f"model calls {len(corpus) - len(resolved)}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: fused single-call analysis vs. the two-step path.
+
+Runs every image through both paths against a fresh cache:
+    two-step: get_ingredients_model_response + get_crossing_data_model_response
+    fused:    get_fused_model_response (ANALYSIS_MODE=fused)
+and reports latency, token usage (from the usage accounting in
+services.multi_modal) and how well the answers agree: Jaccard overlap of the
+detected ingredients and the share of common ingredients given the same
+safety status.
+
+Usage:
+    python benchmarks/bench_fused.py --images photos/ --allergies "Nuts, Dairy"   # needs MULTIMODAL_API_KEY
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as file:
+                images.append((name, file.read()))
+    return images
+
+
+def total_tokens(stats):
+    return sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in stats.values())
+
+
+def statuses(records):
+    """{ingredient key: status} for parsed records."""
+    from services.allergen_kb import ingredient_key
+    from services.multi_modal import parse_ingredient_assessment
+
+    cards = [parse_ingredient_assessment(line) for line in records]
+    return {ingredient_key(card["ingredient"]): card["status"] for card in cards if card}
+
+
+def run_two_step(image_binary, allergies):
+    from services.multi_modal import get_ingredients_model_response, get_crossing_data_model_response
+
+    ingredients = get_ingredients_model_response(image_binary)
+    records = get_crossing_data_model_response(ingredients, allergies) if ingredients else []
+    return ingredients, records
+
+
+def run_fused(image_binary, allergies):
+    from services.multi_modal import get_fused_model_response
+    return get_fused_model_response(image_binary, allergies)
+
+
+def measure(run, images, allergies):
+    """Per-image (elapsed seconds, tokens, ingredient keys, statuses)."""
+    from services.allergen_kb import ingredient_key
+    from services.multi_modal import usage_stats
+
+    results = []
+    for name, image_binary in images:
+        before = total_tokens(usage_stats())
+        start = time.perf_counter()
+        ingredients, records = run(image_binary, allergies)
+        elapsed = time.perf_counter() - start
+        tokens = total_tokens(usage_stats()) - before
+        results.append((elapsed, tokens, {ingredient_key(item) for item in ingredients}, statuses(records)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Directory of meal photos.")
+    parser.add_argument("--allergies", default="Nuts, Dairy, Gluten", help="Comma-separated allergies.")
+    args = parser.parse_args()
+
+    # A fresh cache, so every model call is actually made.
+    os.environ["ALLERGY_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-fused-")
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No images found in {args.images}.")
+    allergies = [allergy.strip() for allergy in args.allergies.split(",") if allergy.strip()]
+
+    two_step = measure(run_two_step, images, allergies)
+    fused = measure(run_fused, images, allergies)
+
+    for label, results in (("two-step", two_step), ("fused", fused)):
+        seconds = [elapsed for elapsed, _, _, _ in results]
+        tokens = [count for _, count, _, _ in results]
+        print(f"{label:<9} median {statistics.median(seconds):.2f}s, mean {statistics.mean(seconds):.2f}s, "
+              f"mean tokens {statistics.mean(tokens):.0f} per image")
+
+    jaccard, same_status = [], []
+    for (_, _, keys_a, status_a), (_, _, keys_b, status_b) in zip(two_step, fused):
+        union = keys_a | keys_b
+        jaccard.append(len(keys_a & keys_b) / len(union) if union else 1.0)
+        common = set(status_a) & set(status_b)
+        if common:
+            same_status.append(sum(status_a[key] == status_b[key] for key in common) / len(common))
+    print(f"agreement: ingredient Jaccard mean {statistics.mean(jaccard):.2f}, "
+          f"same status on common ingredients {statistics.mean(same_status) if same_status else 0:.0%} "
+          f"({len(images)} images)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: tail latency of model calls with deadlines and hedging.
+
+Starts a local stand-in for the chat completions API whose answers normally
+take --fast seconds (with some jitter) but, with probability --slow-rate,
+stall for --slow seconds. The same workload is then sent three ways:
+    raw       the client called directly (what the app did before)
+    deadline  services.resilience.complete_async with hedging disabled
+    hedged    services.resilience.complete_async with hedging enabled
+and p50/p95/p99/max latency, timeouts and the extra requests hedging costs
+are reported. No API key or network access is needed.
+
+Usage:
+    python benchmarks/bench_hedging.py
+    python benchmarks/bench_hedging.py --calls 500 --slow-rate 0.05 --slow 8 --deadline 5
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web
+
+OPERATION = "ingredients"
+
+
+def completion(content):
+    return {
+        "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": "bench",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+    }
+
+
+def create_stand_in(fast, slow, slow_rate, seed):
+    """aiohttp app answering /chat/completions after a fast or (sometimes) a very slow delay."""
+    rng = random.Random(seed)
+    app = web.Application()
+    app["counter"] = {"requests": 0}
+
+    async def chat_completions(request):
+        app["counter"]["requests"] += 1
+        await request.read()
+        delay = slow if rng.random() < slow_rate else fast * rng.uniform(0.7, 1.5)
+        await asyncio.sleep(delay)
+        return web.json_response(completion("tomato, basil"))
+
+    app.router.add_post("/chat/completions", chat_completions)
+    return app
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_workload(call, calls, concurrency):
+    """Per-call (seconds until an answer or an error, succeeded)."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                return time.perf_counter() - start, False
+            return time.perf_counter() - start, True
+
+    return await asyncio.gather(*(one() for _ in range(calls)))
+
+
+def report(label, outcomes, requests):
+    """Latency over all calls: a call that hit its deadline is counted at the time it gave up."""
+    seconds = [elapsed for elapsed, _ in outcomes]
+    failed = sum(not ok for _, ok in outcomes)
+    print(f"{label:<9} p50 {percentile(seconds, 0.5):.2f}s  p95 {percentile(seconds, 0.95):.2f}s  "
+          f"p99 {percentile(seconds, 0.99):.2f}s  max {max(seconds):.2f}s  "
+          f"failed {failed}/{len(outcomes)}  requests sent {requests}")
+
+
+async def main_async(args):
+    app = create_stand_in(args.fast, args.slow, args.slow_rate, args.seed)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    os.environ["MULTIMODAL_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("MULTIMODAL_API_KEY", "bench")
+    os.environ[f"MODEL_DEADLINE_{OPERATION.upper()}"] = str(args.deadline)
+    from services import resilience
+    from services.clients import get_async_openai_client
+
+    kwargs = {"model": "bench", "messages": [{"role": "user", "content": "ingredients?"}]}
+    # The client's own retries would re-send timed-out requests and blur the comparison.
+    client = get_async_openai_client().with_options(max_retries=0)
+    resilience.get_async_openai_client = lambda: client
+
+    async def raw():
+        return await client.chat.completions.create(**kwargs)
+
+    async def wrapped():
+        return await resilience.complete_async(OPERATION, **kwargs)
+
+    results = []
+    for label, call, hedging in (("raw", raw, False), ("deadline", wrapped, False), ("hedged", wrapped, True)):
+        resilience.HEDGING_ENABLED = hedging
+        resilience.tracker.reset()
+        resilience.reset_breakers()  # A breaker opened by the previous mode would short-circuit this one.
+        await run_workload(wrapped, args.warmup, args.concurrency)  # Latency history for the hedge delay.
+        app["counter"]["requests"] = 0
+        outcomes = await run_workload(call, args.calls, args.concurrency)
+        results.append((label, outcomes, app["counter"]["requests"]))
+
+    await runner.cleanup()
+    print(f"\n{args.calls} calls, concurrency {args.concurrency}: {args.fast:.2f}s typical, "
+          f"{args.slow_rate:.0%} stall {args.slow:.0f}s; deadline {args.deadline:.0f}s, "
+          f"hedge at p{resilience.HEDGE_PERCENTILE * 100:.0f}")
+    for label, outcomes, requests in results:
+        report(label, outcomes, requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=40, help="Calls made before each run to seed latency history.")
+    parser.add_argument("--fast", type=float, default=0.2, help="Typical response time (seconds).")
+    parser.add_argument("--slow", type=float, default=6.0, help="Response time of a stalled request (seconds).")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of requests that stall.")
+    parser.add_argument("--deadline", type=float, default=4.0, help="Deadline for the wrapped calls (seconds).")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
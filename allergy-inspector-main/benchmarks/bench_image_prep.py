@@ -0,0 +1,131 @@
+"""
+Benchmark: image preprocessing before upload to the vision model.
+
+Compares the payload sent to the model (base64 data URL bytes) and wall-clock
+time before and after services.image_prep.prepare_image.
+
+Usage:
+    python benchmarks/bench_image_prep.py                  # synthetic camera-sized fixtures
+    python benchmarks/bench_image_prep.py --images photos/ # your own meal photos
+    python benchmarks/bench_image_prep.py --images photos/ --live  # also time the vision call
+"""
+import os
+import sys
+import io
+import time
+import base64
+import argparse
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from services.image_prep import prepare_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def synthetic_fixtures(count=6):
+    """
+    Builds camera-sized "meal photos": a plate with noisy food blobs, saved the
+    way st.camera_input/st.file_uploader typically hand them to us (PNG and JPEG).
+    """
+    fixtures = []
+    for index in range(count):
+        width, height = (4032, 3024) if index % 2 == 0 else (1920, 1080)
+        noise = Image.effect_noise((width, height), 40 + index * 5).convert("RGB")
+        image = Image.blend(Image.new("RGB", (width, height), (210, 200, 185)), noise, 0.25)
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((width * 0.15, height * 0.1, width * 0.85, height * 0.9), fill=(245, 245, 240))
+        for blob in range(12):
+            x = width * (0.25 + 0.04 * blob) % width
+            y = height * (0.3 + 0.03 * ((blob * 7 + index) % 12))
+            r = min(width, height) * 0.07
+            color = ((60 + blob * 15) % 255, (120 + blob * 30) % 255, (40 + index * 35) % 255)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+        image = image.filter(ImageFilter.GaussianBlur(1))
+        buffer = io.BytesIO()
+        fmt = "PNG" if index % 3 != 2 else "JPEG"
+        image.save(buffer, format=fmt, quality=95)
+        fixtures.append((f"synthetic_{index}.{fmt.lower()}", buffer.getvalue()))
+    return fixtures
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as file:
+                fixtures.append((name, file.read()))
+    return fixtures
+
+
+def data_url_size(image_bytes, mime_type):
+    return len(f"data:{mime_type};base64,".encode()) + len(base64.b64encode(image_bytes))
+
+
+def time_vision_call(image_bytes, mime_type):
+    from services.clients import get_openai_client
+    from services.multi_modal import MODEL_NAME
+    from services.prompts import get_prompt
+
+    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    start = time.perf_counter()
+    get_openai_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}},
+                {"type": "text", "text": get_prompt("ingredients_prompt").text},
+            ],
+        }],
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of meal photos (defaults to synthetic fixtures).")
+    parser.add_argument("--max-edge", type=int, default=None)
+    parser.add_argument("--format", default=None, choices=["JPEG", "WEBP"])
+    parser.add_argument("--quality", type=int, default=None)
+    parser.add_argument("--live", action="store_true", help="Also time the vision model call (needs MULTIMODAL_API_KEY).")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.images) if args.images else synthetic_fixtures()
+    if not fixtures:
+        print("No images found.")
+        return
+
+    print(f"{'image':<24}{'before':>12}{'after':>12}{'ratio':>8}{'prep ms':>10}", end="")
+    print(f"{'call before s':>15}{'call after s':>14}" if args.live else "")
+    before_total, after_total, prep_times = 0, 0, []
+    call_before, call_after = [], []
+    for name, raw in fixtures:
+        start = time.perf_counter()
+        processed, mime_type = prepare_image(raw, args.max_edge, args.format, args.quality)
+        prep_ms = (time.perf_counter() - start) * 1000
+        before = data_url_size(raw, "image/jpeg")
+        after = data_url_size(processed, mime_type)
+        before_total += before
+        after_total += after
+        prep_times.append(prep_ms)
+        print(f"{name:<24}{before:>12,}{after:>12,}{before / after:>7.1f}x{prep_ms:>10.1f}", end="")
+        if args.live:
+            call_before.append(time_vision_call(raw, "image/jpeg"))
+            call_after.append(time_vision_call(processed, mime_type))
+            print(f"{call_before[-1]:>15.2f}{call_after[-1]:>14.2f}")
+        else:
+            print()
+
+    print("-" * 66)
+    print(f"{'total bytes on wire':<24}{before_total:>12,}{after_total:>12,}{before_total / after_total:>7.1f}x")
+    print(f"median preprocessing time: {statistics.median(prep_times):.1f} ms")
+    if args.live:
+        print(f"median vision call: {statistics.median(call_before):.2f} s -> {statistics.median(call_after):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
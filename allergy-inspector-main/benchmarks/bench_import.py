@@ -0,0 +1,79 @@
+"""
+Benchmark: cold import time of the services package.
+
+Each run imports the modules in a fresh interpreter with `python -X importtime`
+and reports the median wall time plus the slowest modules by cumulative time.
+Runs with no API keys set, so it also checks that importing never needs them.
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --runs 10 --top 15
+    python benchmarks/bench_import.py --modules services.multi_modal
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_MODULES = [
+    "services.multi_modal",
+    "services.pipeline",
+    "services.video_model",
+    "services.video_jobs",
+]
+
+
+def import_once(modules):
+    """Returns (wall seconds, {module: cumulative us}) for one cold import."""
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    for name in ("MULTIMODAL_API_KEY", "VIDEO_API_KEY"):
+        env.pop(name, None)
+    code = "import " + ", ".join(modules)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, cwd=APP_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumul, name = line.split("|")
+        try:
+            cumulative[name.strip()] = int(cumul)
+        except ValueError:
+            continue  # Header line.
+    return elapsed, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest modules to list.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    args = parser.parse_args()
+
+    import_once(args.modules)  # Warm the filesystem and bytecode caches.
+    walls, last = [], {}
+    for _ in range(args.runs):
+        elapsed, last = import_once(args.modules)
+        walls.append(elapsed)
+
+    print(f"modules: {', '.join(args.modules)}")
+    print(f"interpreter + import wall time over {args.runs} runs: "
+          f"median {statistics.median(walls) * 1000:.0f} ms, min {min(walls) * 1000:.0f} ms")
+    print(f"\n{'cumulative ms':>14}  module")
+    for name, cumul in sorted(last.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{cumul / 1000:>14.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: memory held per session for uploaded photos.
+
+Simulates sessions that each upload a series of camera-sized photos and
+compares process RSS growth when every session keeps what the page used to
+keep (the raw bytes plus their base64 for the chat HTML) with bounded
+services.session_store.SessionStore sessions (handles and thumbnails in
+session state, full bytes within SESSION_MEMORY_BUDGET, the rest spilled to
+disk). Also reports the HTML sent to the browser per photo either way.
+
+Usage:
+    python benchmarks/bench_session_memory.py
+    python benchmarks/bench_session_memory.py --sessions 20 --photos 15 --budget 4
+"""
+import os
+import io
+import sys
+import gc
+import base64
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def camera_photos(count):
+    """Distinct camera-sized JPEGs: one noisy 12 MP photo with a different trailer each."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((4032, 3024), 60).convert("RGB").save(buffer, format="JPEG", quality=92)
+    photo = buffer.getvalue()
+    # Bytes after the JPEG end marker are ignored by decoders but change the hash.
+    return [photo + index.to_bytes(4, "big") for index in range(count)]
+
+
+def unbounded_sessions(sessions, photos):
+    kept = []
+    for _ in range(sessions):
+        history = []
+        for photo in photos:
+            data = bytes(bytearray(photo))  # getvalue() hands every rerun its own copy
+            history.append((data, base64.b64encode(data).decode("utf-8")))
+        kept.append(history)
+    return kept
+
+
+def bounded_sessions(sessions, photos):
+    from services.session_store import SessionStore
+
+    kept = []
+    for _ in range(sessions):
+        store = SessionStore()
+        handles = [store.add_image(bytes(bytearray(photo)), "camera.jpg") for photo in photos]
+        kept.append((store, handles))
+    return kept
+
+
+def measure(label, build, sessions, photos):
+    from services.session_store import process_rss
+
+    gc.collect()
+    before = process_rss()
+    kept = build(sessions, photos)
+    growth = process_rss() - before
+    print(f"{label:<10} RSS +{growth / 1e6:8.1f} MB ({growth / sessions / 1e6:6.1f} MB per session)")
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--photos", type=int, default=10, help="photos uploaded per session")
+    parser.add_argument("--budget", type=float, default=8, help="SESSION_MEMORY_BUDGET in MB")
+    args = parser.parse_args()
+
+    os.environ["SESSION_SPILL_DIR"] = tempfile.mkdtemp(prefix="bench-sessions-")
+    os.environ["SESSION_MEMORY_BUDGET"] = str(int(args.budget * 1024 * 1024))
+    os.environ["SESSION_DISK_BUDGET"] = str(args.photos * 8 * 1024 * 1024)
+    from services.session_store import session_memory_stats
+
+    photos = camera_photos(args.photos)
+    print(f"\n{args.sessions} sessions x {args.photos} photos of {len(photos[0]) / 1e6:.1f} MB, "
+          f"budget {args.budget:g} MB per session")
+
+    # Bounded first: memory the unbounded run frees is reused and would hide growth.
+    kept = measure("bounded", bounded_sessions, args.sessions, photos)
+    stats = session_memory_stats()
+    measure("unbounded", unbounded_sessions, args.sessions, photos)
+
+    print(f"bounded: {stats['memory_bytes'] / 1e6:.1f} MB in memory "
+          f"(largest session {stats['max_session_memory_bytes'] / 1e6:.1f} MB), "
+          f"{stats['disk_bytes'] / 1e6:.1f} MB spilled to disk")
+
+    handle = kept[0][1][0]
+    inline = len(base64.b64encode(photos[0]))
+    thumbnail = len(base64.b64encode(handle.thumbnail))
+    print(f"image data in the chat HTML per photo: {inline / 1e3:.0f} KB inline -> {thumbnail / 1e3:.1f} KB thumbnail")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: showing a photo and sending it to the model.
+
+Per photo, compares the old path (the whole upload inlined as base64 in the
+<img> tag, then prepare_image for the model request) with services.thumbnails
+(one decode for the thumbnail and the model image, then a cached thumbnail on
+every rerun). Reports the image data sent to the browser per rerun and the
+time to display and prepare the photo.
+
+Usage:
+    python benchmarks/bench_thumbnails.py                  # synthetic camera-sized fixtures
+    python benchmarks/bench_thumbnails.py --images photos/ # your own meal photos
+    python benchmarks/bench_thumbnails.py --reruns 10
+"""
+import os
+import sys
+import time
+import base64
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_image_prep import synthetic_fixtures, load_fixtures
+
+
+def old_path(raw, reruns):
+    from services.image_prep import prepare_image
+
+    start = time.perf_counter()
+    for _ in range(reruns):
+        display = base64.b64encode(raw).decode("utf-8")
+    prepare_image(raw)
+    return time.perf_counter() - start, len(display)
+
+
+def new_path(raw, reruns):
+    from services.thumbnails import thumbnail_for, model_image
+
+    start = time.perf_counter()
+    for _ in range(reruns):
+        display = base64.b64encode(thumbnail_for(raw)).decode("utf-8")
+    model_image(raw)
+    return time.perf_counter() - start, len(display)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory of photos (default: synthetic fixtures)")
+    parser.add_argument("--reruns", type=int, default=5, help="page reruns that show the photo again")
+    args = parser.parse_args()
+
+    # A fresh thumbnail cache, so the first rerun really decodes.
+    os.environ["THUMBNAIL_DIR"] = tempfile.mkdtemp(prefix="bench-thumbnails-")
+    from services.thumbnails import thumbnail_stats
+
+    images = load_fixtures(args.images) if args.images else synthetic_fixtures()
+    print(f"\n{len(images)} photos, {args.reruns} reruns each")
+    print(f"{'photo':<16} {'size':>9} {'inline':>10} {'thumbnail':>10} {'old ms':>8} {'new ms':>8}")
+    old_times, new_times, old_bytes, new_bytes = [], [], [], []
+    for name, raw in images:
+        old_seconds, old_size = old_path(raw, args.reruns)
+        new_seconds, new_size = new_path(raw, args.reruns)
+        old_times.append(old_seconds)
+        new_times.append(new_seconds)
+        old_bytes.append(old_size)
+        new_bytes.append(new_size)
+        print(f"{name:<16} {len(raw) / 1e3:>7.0f}KB {old_size / 1e3:>8.0f}KB {new_size / 1e3:>8.1f}KB "
+              f"{old_seconds * 1000:>8.0f} {new_seconds * 1000:>8.0f}")
+
+    print(f"\nbrowser payload per rerun: median {statistics.median(old_bytes) / 1e3:.0f} KB -> "
+          f"{statistics.median(new_bytes) / 1e3:.1f} KB "
+          f"({statistics.median(old_bytes) / statistics.median(new_bytes):.0f}x smaller)")
+    print(f"display + prepare time: median {statistics.median(old_times) * 1000:.0f} ms -> "
+          f"{statistics.median(new_times) * 1000:.0f} ms")
+    print(f"cache: {thumbnail_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: streamed voice alerts and the phrase cache.
+
+Reads out the alerts of a series of meals through services.voice_model
+against an empty phrase cache. Alert sentences repeat across meals ("Contains
+Nuts. High allergy risk."), so later meals reuse phrases synthesized for
+earlier ones. Reports time-to-first-audio (when the first audio chunk is
+ready to play) against time to the whole clip, for the cold pass and for a
+second, fully cached pass, plus the phrase cache hit rate.
+
+Usage:
+    python benchmarks/bench_voice.py            # needs espeak-ng or espeak
+    python benchmarks/bench_voice.py --meals 50 --voice en-gb
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+INGREDIENTS = [
+    ("peanut sauce", "dangerous", "Contains Nuts. High allergy risk."),
+    ("almond flakes", "dangerous", "Contains Nuts. High allergy risk."),
+    ("cheddar", "dangerous", "Contains Dairy. High allergy risk."),
+    ("cream sauce", "dangerous", "Contains Dairy. High allergy risk."),
+    ("bread cubes", "dangerous", "Contains Gluten. High allergy risk."),
+    ("soy sauce", "alert", "May contain Gluten through cross-contamination."),
+    ("granola", "alert", "May contain Nuts through cross-contamination."),
+    ("chickpeas", "alert", "Possible cross-reactivity with Legumes."),
+    ("mystery leaf", "alert", "Could not be checked because the analysis service is unavailable. Treat with caution."),
+]
+
+
+def make_meals(count, seed):
+    rng = random.Random(seed)
+    meals = []
+    for _ in range(count):
+        picked = rng.sample(INGREDIENTS, rng.randint(1, 4))
+        meals.append([
+            {"ingredient": name, "status": status, "emoji": "🍽️", "description": description}
+            for name, status, description in picked
+        ])
+    return meals
+
+
+def read_out(meals, voice):
+    """Per meal: (seconds to first audio chunk, seconds to the whole clip, audio bytes)."""
+    from services.voice_model import stream_voice, alert_text
+
+    results = []
+    for cards in meals:
+        start = time.perf_counter()
+        first, size = None, 0
+        for chunk in stream_voice(alert_text(cards), voice):
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+        results.append((first, time.perf_counter() - start, size))
+    return results
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(label, results):
+    first = [value for value, _, _ in results if value is not None]
+    total = [value for _, value, _ in results]
+    print(f"{label:<6} first audio median {statistics.median(first) * 1000:.1f} ms, "
+          f"p95 {percentile(first, 0.95) * 1000:.1f} ms; "
+          f"whole clip median {statistics.median(total) * 1000:.1f} ms, p95 {percentile(total, 0.95) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=30)
+    parser.add_argument("--voice", default="en-us")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    # A fresh phrase cache, so the first pass really synthesizes.
+    os.environ["VOICE_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-voice-")
+    from services.voice_model import find_engine, voice_stats
+    if find_engine() is None:
+        sys.exit("No speech engine found; install espeak-ng (or espeak).")
+
+    meals = make_meals(args.meals, args.seed)
+    cold = read_out(meals, args.voice)
+    cold_stats = voice_stats()
+    warm = read_out(meals, args.voice)
+
+    print(f"\n{args.meals} meals read out, voice {args.voice}")
+    summarize("cold", cold)
+    summarize("warm", warm)
+    print(f"phrase cache: cold pass hit rate {cold_stats['hit_rate']:.0%} "
+          f"({cold_stats['hits']}/{cold_stats['phrases']} phrases), overall {voice_stats()['hit_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
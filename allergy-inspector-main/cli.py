@@ -0,0 +1,162 @@
+"""
+Headless batch analysis.
+
+Runs ingredient detection, crossing and symptom lookups over a directory of
+images (or a manifest) with a pool of workers, and writes one JSON line per
+image as soon as it finishes, including per-stage timings. Shares the same
+caches as the Streamlit app.
+
+Usage:
+    python allergy-inspector-main/cli.py photos/ --allergies "Nuts, Dairy"
+    python allergy-inspector-main/cli.py photos/ --allergies Gluten --recursive --workers 8 -o results.jsonl
+    python allergy-inspector-main/cli.py manifest.jsonl --allergies Nuts
+
+A manifest is a text file with one image path per line, or a JSONL file with
+{"image": "path", "allergies": [...], "id": "..."} per line (allergies and id
+optional). Relative paths are resolved against the manifest's directory.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+from services import startup
+from services.pipeline import analyze_meal_stream
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+DEFAULT_WORKERS = int(os.getenv("CLI_WORKERS", "4"))
+
+
+def parse_allergies(text):
+    return [allergy.strip() for allergy in (text or "").split(",") if allergy.strip()]
+
+
+def collect_jobs(target, allergies, recursive=False):
+    """Returns [{"id", "image", "allergies"}] for a directory or a manifest file."""
+    if os.path.isdir(target):
+        paths = []
+        for root, dirs, files in os.walk(target):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+            if not recursive:
+                break
+        return [
+            {"id": os.path.relpath(path, target), "image": path, "allergies": allergies}
+            for path in sorted(paths)
+        ]
+
+    base = os.path.dirname(os.path.abspath(target))
+    jobs = []
+    with open(target, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"image": line}
+            path = os.path.join(base, entry["image"])
+            jobs.append({
+                "id": entry.get("id", entry["image"]),
+                "image": path,
+                "allergies": entry.get("allergies", allergies),
+            })
+    return jobs
+
+
+async def analyze_job(job):
+    """Runs one image through the pipeline and returns its result record."""
+    record = {"id": job["id"], "image": job["image"], "allergies": job["allergies"]}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with open(job["image"], "rb") as file:
+            image_binary = file.read()
+        timings["read_s"] = time.perf_counter() - start
+        async for event, payload in analyze_meal_stream(image_binary, job["allergies"]):
+            elapsed = time.perf_counter() - start
+            if event == "ingredients":
+                timings["ingredients_s"] = elapsed
+            elif event == "card":
+                timings.setdefault("first_card_s", elapsed)
+            elif event == "symptoms":
+                timings["symptoms_s"] = elapsed
+            elif event == "done":
+                record["ingredients"] = payload.ingredients
+                record["cards"] = payload.cards
+                record["symptoms"] = payload.symptoms
+                if payload.degraded:
+                    record["degraded"] = payload.degraded
+        if not record.get("ingredients"):
+            record["error"] = "No ingredients detected."
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    timings["total_s"] = time.perf_counter() - start
+    record["timings"] = {name: round(value, 3) for name, value in timings.items()}
+    return record
+
+
+async def run_jobs(jobs, workers, output):
+    """Worker pool over the jobs; writes each record as soon as it is ready."""
+    pending = asyncio.Queue()
+    for job in jobs:
+        pending.put_nowait(job)
+    records = []
+
+    async def worker():
+        while True:
+            try:
+                job = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await analyze_job(job)
+            records.append(record)
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", help="Directory of images, or a manifest (.txt/.jsonl).")
+    parser.add_argument("--allergies", default="", help="Comma-separated allergies (manifest entries may override).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Images analyzed at the same time.")
+    parser.add_argument("--recursive", action="store_true", help="Include images in subdirectories.")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout).")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors.")
+    args = parser.parse_args(argv)
+
+    startup()
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    jobs = collect_jobs(args.target, parse_allergies(args.allergies), args.recursive)
+    if not jobs:
+        print(f"No images found in {args.target}.", file=sys.stderr)
+        return 1
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        records = asyncio.run(run_jobs(jobs, args.workers, output))
+    finally:
+        if args.output:
+            output.close()
+    wall = time.perf_counter() - start
+
+    failed = [record for record in records if "error" in record]
+    per_item = [record["timings"]["total_s"] for record in records]
+    print(
+        f"Analyzed {len(records)} images in {wall:.1f}s ({len(records) / wall:.2f} images/s) "
+        f"with {args.workers} workers; median {statistics.median(per_item):.2f}s per image, "
+        f"{len(failed)} failed.",
+        file=sys.stderr
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
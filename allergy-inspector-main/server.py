@@ -0,0 +1,294 @@
+"""
+Standalone analysis service.
+
+Serves the analysis pipeline over HTTP so the inference tier can be scaled
+(and reached by mobile clients) independently of the Streamlit UI. Every
+request shares the process-wide caches; analyses run on a bounded worker pool
+and requests beyond the queue limit are turned away with 503 + Retry-After.
+
+Endpoints (JSON in/out unless noted):
+    GET  /health                      pool and circuit breaker status
+    POST /v1/ingredients              body: image bytes            -> {"ingredients": [...], "degraded": [...]}
+    POST /v1/crossing[?stream=1]      {"ingredients", "allergies"} -> {"assessments": [...], "degraded": [...]}
+                                                                      or NDJSON lines, then a "done" event
+    POST /v1/allergies/infer          {"description"}              -> {"allergies": [...], "degraded": [...]}
+    POST /v1/symptoms                 {"allergens"}                -> {"symptoms": {...}, "degraded": [...]}
+    POST /v1/analyze?allergies=a,b    body: image bytes            -> NDJSON events of analyze_meal_stream
+    POST /v1/analyze/batch?allergies= multipart "images" files     -> NDJSON events of analyze_images_stream
+    GET  /v1/videos/<sha256>          a stored video (Range requests, immutable caching)
+    POST /v1/voice                    {"text", "voice"?}           -> audio/wav, streamed while synthesizing
+    GET  /v1/voice?text=&voice=       the same, as an <audio> source (voice_model.voice_url)
+
+Usage:
+    python allergy-inspector-main/server.py --host 0.0.0.0 --port 8080
+"""
+import os
+import json
+import asyncio
+import logging
+import argparse
+import threading
+import contextlib
+from dataclasses import asdict
+
+from aiohttp import web
+
+from services import startup
+from services.resilience import breaker_stats, start_degradation_tracking
+from services.video_store import video_path, content_type
+from services.voice_model import stream_voice, DEFAULT_VOICE
+from services.multi_modal import get_infers_allergy_model_response
+from services.pipeline import (
+    get_ingredients_async,
+    get_crossing_async,
+    stream_crossing_async,
+    get_symptoms_batch_async,
+    analyze_meal_stream,
+    analyze_images_stream,
+)
+
+logger = logging.getLogger(__name__)
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+SERVER_QUEUE_LIMIT = int(os.getenv("SERVER_QUEUE_LIMIT", "32"))
+# Model requests in flight across all requests handled by this process.
+SERVER_MODEL_CONCURRENCY = int(os.getenv("SERVER_MODEL_CONCURRENCY", "16"))
+MAX_UPLOAD_BYTES = int(os.getenv("SERVER_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Seconds between checks for a disconnected client while speech is synthesized.
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class WorkerPool:
+    """At most `workers` requests run at once; at most `queue_limit` more wait for a slot."""
+
+    def __init__(self, workers=SERVER_WORKERS, queue_limit=SERVER_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.active = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(workers)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        if self.active >= self.workers and self.waiting >= self.queue_limit:
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({"error": "Server is busy, please retry."}),
+                content_type="application/json",
+                headers={"Retry-After": "1"},
+            )
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+def _allergies_param(request):
+    return [allergy.strip() for allergy in request.query.get("allergies", "").split(",") if allergy.strip()]
+
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be JSON."}), content_type="application/json")
+    if not isinstance(data, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be a JSON object."}), content_type="application/json")
+    return data
+
+
+async def _ndjson_response(request, events):
+    """Streams (event, payload) tuples as {"event": ..., "data": ...} lines."""
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    async for event, payload in events:
+        if hasattr(payload, "__dataclass_fields__"):
+            payload = asdict(payload)
+        line = json.dumps({"event": event, "data": payload}, ensure_ascii=False) + "\n"
+        await response.write(line.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def health(request):
+    pool = request.app["pool"]
+    breakers = breaker_stats()
+    status = "degraded" if any(breaker["state"] != "closed" for breaker in breakers.values()) else "ok"
+    return web.json_response({
+        "status": status, "active": pool.active, "waiting": pool.waiting, "workers": pool.workers,
+        "breakers": breakers,
+    })
+
+
+# Every response says which steps fell back ("degraded"), so clients never mistake
+# a failed lookup for an empty answer.
+async def ingredients(request):
+    image_binary = await request.read()
+    degraded = start_degradation_tracking()
+    async with request.app["pool"].slot():
+        detected = await get_ingredients_async(image_binary, request.app["model_semaphore"])
+    return web.json_response({"ingredients": detected, "degraded": sorted(degraded)})
+
+
+async def crossing(request):
+    data = await _json_body(request)
+    ingredients_list, user_allergies = data.get("ingredients", []), data.get("allergies", [])
+    semaphore = request.app["model_semaphore"]
+    degraded = start_degradation_tracking()
+    async with request.app["pool"].slot():
+        if request.query.get("stream") in ("1", "true"):
+            async def events():
+                async for line in stream_crossing_async(ingredients_list, user_allergies, semaphore):
+                    yield "line", line
+                yield "done", {"degraded": sorted(degraded)}
+
+            return await _ndjson_response(request, events())
+        assessments = await get_crossing_async(ingredients_list, user_allergies, semaphore)
+    return web.json_response({"assessments": assessments, "degraded": sorted(degraded)})
+
+
+async def infer_allergies(request):
+    data = await _json_body(request)
+    degraded = start_degradation_tracking()
+    async with request.app["pool"].slot():
+        # Sync (local matcher first, then a cached model call); keep it off the event loop.
+        allergies = await asyncio.to_thread(get_infers_allergy_model_response, data.get("description", ""))
+    return web.json_response({"allergies": allergies, "degraded": sorted(degraded)})
+
+
+async def symptoms(request):
+    data = await _json_body(request)
+    degraded = start_degradation_tracking()
+    async with request.app["pool"].slot():
+        result = await get_symptoms_batch_async(data.get("allergens", []), request.app["model_semaphore"])
+    return web.json_response({"symptoms": result, "degraded": sorted(degraded)})
+
+
+async def analyze(request):
+    image_binary = await request.read()
+    async with request.app["pool"].slot():
+        events = analyze_meal_stream(image_binary, _allergies_param(request), semaphore=request.app["model_semaphore"])
+        return await _ndjson_response(request, events)
+
+
+async def analyze_batch(request):
+    images = []
+    reader = await request.multipart()
+    async for part in reader:
+        if part.name == "images":
+            images.append((part.filename or f"image-{len(images) + 1}", await part.read()))
+    if not images:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "No images uploaded."}), content_type="application/json")
+    async with request.app["pool"].slot():
+        events = analyze_images_stream(images, _allergies_param(request), semaphore=request.app["model_semaphore"])
+        return await _ndjson_response(request, events)
+
+
+async def video(request):
+    path = video_path(request.match_info["sha"])
+    if path is None:
+        raise web.HTTPNotFound(text=json.dumps({"error": "Unknown video."}), content_type="application/json")
+    # Content-addressed, so a URL always means the same bytes. FileResponse handles Range and conditional GETs.
+    return web.FileResponse(path, headers={
+        "Content-Type": content_type(path),
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    })
+
+
+def _next_chunk(chunks, lock):
+    with lock:
+        return next(chunks, None)
+
+
+def _close_chunks(chunks, lock):
+    with lock:  # Waits for a next() still running on another thread; `stop` makes it return soon.
+        chunks.close()
+
+
+def _client_gone(request):
+    transport = request.transport
+    return transport is None or transport.is_closing()
+
+
+async def _read_chunk(request, chunks, lock, stop):
+    """The next chunk (None at the end), read on a worker thread; sets `stop` once the client has gone."""
+    read = asyncio.ensure_future(asyncio.to_thread(_next_chunk, chunks, lock))
+    while not (await asyncio.wait([read], timeout=DISCONNECT_POLL_SECONDS))[0]:
+        if _client_gone(request):
+            stop.set()
+    return read.result()
+
+
+async def voice(request):
+    data = request.query if request.method == "GET" else await _json_body(request)
+    stop = threading.Event()
+    chunks = stream_voice(str(data.get("text", "")), data.get("voice") or DEFAULT_VOICE, stop)
+    # The engine is read with blocking calls on worker threads; the lock keeps close() from racing a read.
+    lock = threading.Lock()
+    try:
+        async with request.app["pool"].slot():
+            chunk = await _read_chunk(request, chunks, lock, stop)
+            if chunk is None:
+                raise web.HTTPServiceUnavailable(
+                    text=json.dumps({"error": "Speech synthesis is unavailable."}), content_type="application/json"
+                )
+            response = web.StreamResponse(headers={"Content-Type": "audio/wav", "Cache-Control": "no-store"})
+            await response.prepare(request)
+            while chunk is not None and not stop.is_set():
+                await response.write(chunk)
+                chunk = await _read_chunk(request, chunks, lock, stop)
+        if stop.is_set():
+            return response
+        await response.write_eof()
+        return response
+    except ConnectionResetError:
+        logger.info("Voice client disconnected; stopped synthesis.")
+        return response
+    finally:
+        # Kills the engine if the client disconnected mid-stream. Not awaited, so it
+        # also runs when this handler is being cancelled.
+        stop.set()
+        asyncio.get_running_loop().run_in_executor(None, _close_chunks, chunks, lock)
+
+
+def create_app(workers=SERVER_WORKERS, queue_limit=SERVER_QUEUE_LIMIT):
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES)
+    app["pool"] = WorkerPool(workers, queue_limit)
+    app["model_semaphore"] = asyncio.Semaphore(SERVER_MODEL_CONCURRENCY)
+    app.add_routes([
+        web.get("/health", health),
+        web.post("/v1/ingredients", ingredients),
+        web.post("/v1/crossing", crossing),
+        web.post("/v1/allergies/infer", infer_allergies),
+        web.post("/v1/symptoms", symptoms),
+        web.post("/v1/analyze", analyze),
+        web.post("/v1/analyze/batch", analyze_batch),
+        web.get("/v1/videos/{sha}", video),
+        web.post("/v1/voice", voice),
+        web.get("/v1/voice", voice),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Requests processed at the same time.")
+    parser.add_argument("--queue-limit", type=int, default=SERVER_QUEUE_LIMIT, help="Requests allowed to wait for a worker.")
+    args = parser.parse_args()
+
+    startup()
+    logger.info("🚀 Analysis service on http://%s:%d (%d workers).", args.host, args.port, args.workers)
+    web.run_app(create_app(args.workers, args.queue_limit), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
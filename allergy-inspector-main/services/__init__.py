@@ -0,0 +1,24 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keys the services read on first use; missing ones only break the calls that need them.
+REQUIRED_KEYS = ("MULTIMODAL_API_KEY", "VIDEO_API_KEY")
+
+_started = False
+
+
+def startup():
+    """
+    One-time process setup: configures logging and reports missing API keys.
+    Importing services has no side effects; entry points call this instead.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    for name in REQUIRED_KEYS:
+        if not os.getenv(name):
+            logger.warning("⚠️ %s is not set; features that need it will report an error.", name)
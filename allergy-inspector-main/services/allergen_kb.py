@@ -0,0 +1,408 @@
+"""
+Local allergen knowledge base.
+
+Maps common ingredients to the allergy families offered in the sidebar
+(utils/session_state.py allergy_options) so that ingredients which
+definitely contain one of the user's allergens are flagged without a model
+call. The knowledge base never clears an ingredient: recipes vary (a
+croissant has butter, fried rice has egg, tempura batter has wheat), so
+everything that is not a definite hit is left for the LLM.
+"""
+import re
+from functools import lru_cache
+
+# Allergy family -> (emoji, ingredients that definitely contain it).
+ALLERGEN_FAMILIES = {
+    "Nuts": ("🥜", [
+        "nut", "peanut", "peanut butter", "almond", "walnut", "cashew", "pecan", "pistachio",
+        "hazelnut", "macadamia", "brazil nut", "pine nut", "praline", "marzipan", "nutella",
+        "gianduja", "nougat", "satay", "pesto", "almond milk", "peanut oil",
+    ]),
+    "Dairy": ("🥛", [
+        "milk", "cheese", "butter", "cream", "yogurt", "yoghurt", "ghee", "whey", "casein",
+        "lactose", "mozzarella", "parmesan", "cheddar", "feta", "ricotta", "mascarpone",
+        "paneer", "brie", "gouda", "burrata", "halloumi", "cream cheese", "sour cream",
+        "buttermilk", "kefir", "custard", "ice cream", "bechamel", "alfredo", "latte",
+        "cappuccino", "nutella", "pesto",
+    ]),
+    "Gluten": ("🌾", [
+        "wheat", "flour", "bread", "pasta", "spaghetti", "macaroni", "noodle", "barley", "rye",
+        "couscous", "bulgur", "semolina", "seitan", "crouton", "cracker", "breadcrumb", "bun",
+        "bagel", "pita", "naan", "baguette", "brioche", "croissant", "pastry", "cake", "cookie",
+        "biscuit", "malt", "spelt", "farro", "panko", "udon", "ramen", "dumpling", "soy sauce",
+        "beer", "pizza", "pizza dough", "flour tortilla", "brownie", "egg noodle",
+    ]),
+    "Seafood": ("🦐", [
+        "seafood", "shellfish", "shrimp", "prawn", "crab", "lobster", "crayfish", "oyster",
+        "mussel", "clam", "scallop", "squid", "calamari", "octopus", "fish", "salmon", "tuna",
+        "cod", "anchovy", "sardine", "mackerel", "trout", "tilapia", "halibut", "haddock",
+        "sea bass", "eel", "caviar", "roe", "surimi", "fish sauce", "oyster sauce", "sushi",
+    ]),
+    "Soy": ("🫘", [
+        "soy", "soya", "soybean", "tofu", "tempeh", "edamame", "miso", "soy sauce", "tamari",
+        "natto", "soy milk",
+    ]),
+    "Eggs": ("🥚", [
+        "egg", "egg yolk", "egg white", "mayonnaise", "mayo", "meringue", "aioli", "hollandaise",
+        "omelette", "omelet", "frittata", "quiche", "eggnog", "albumin", "custard", "egg noodle",
+        "brioche", "brownie",
+    ]),
+    "Sesame": ("🥯", [
+        "sesame", "sesame seed", "sesame oil", "tahini", "hummus", "halva", "zaatar",
+    ]),
+    "Corn": ("🌽", [
+        "corn", "maize", "cornmeal", "polenta", "popcorn", "cornstarch", "corn syrup", "grits",
+        "corn tortilla", "tortilla chip", "nacho", "taco shell", "sweetcorn",
+    ]),
+    "Mustard": ("🌭", [
+        "mustard", "dijon", "mustard seed", "mustard green",
+    ]),
+    "Celery": ("🥬", [
+        "celery", "celeriac", "celery salt", "celery seed",
+    ]),
+    "Sulfites": ("🍷", [
+        "sulfite", "sulphite", "wine", "red wine", "white wine", "champagne", "prosecco",
+        "dried fruit", "dried apricot", "raisin", "balsamic vinegar", "wine vinegar",
+    ]),
+    "Legumes": ("🫘", [
+        "legume", "bean", "black bean", "kidney bean", "pinto bean", "green bean", "lentil",
+        "chickpea", "pea", "green pea", "split pea", "falafel", "hummus", "peanut",
+        "peanut butter", "soy", "soybean", "tofu", "edamame",
+    ]),
+    "Nightshades": ("🍅", [
+        "tomato", "cherry tomato", "potato", "eggplant", "aubergine", "bell pepper", "red pepper",
+        "green pepper", "yellow pepper", "chili", "chilli", "chili pepper", "jalapeno", "paprika",
+        "cayenne", "tomatillo", "goji berry", "ketchup", "salsa", "marinara", "french fry",
+        "fries",
+    ]),
+    "Chocolate": ("🍫", [
+        "chocolate", "cocoa", "cacao", "cocoa butter", "mocha", "nutella", "brownie",
+    ]),
+    "Alcohol": ("🍺", [
+        "alcohol", "beer", "wine", "red wine", "white wine", "champagne", "prosecco", "vodka",
+        "rum", "whiskey", "whisky", "sake", "mirin", "liqueur", "brandy", "cider", "tequila", "gin",
+    ]),
+    "Caffeine": ("☕", [
+        "caffeine", "coffee", "espresso", "tea", "green tea", "black tea", "matcha", "cola",
+        "energy drink", "latte", "cappuccino", "mocha",
+    ]),
+    "Pork": ("🥓", [
+        "pork", "bacon", "ham", "prosciutto", "pancetta", "chorizo", "salami", "pepperoni",
+        "lard", "pork belly",
+    ]),
+    "Red Meat": ("🥩", [
+        "red meat", "beef", "steak", "lamb", "veal", "mutton", "venison", "goat", "bison",
+        "brisket", "ground beef", "hamburger", "beef patty",
+    ]),
+    "Garlic": ("🧄", [
+        "garlic", "garlic powder", "garlic clove", "aioli",
+    ]),
+    "Onion": ("🧅", [
+        "onion", "red onion", "shallot", "scallion", "spring onion", "green onion", "leek", "chive",
+    ]),
+    "Spices": ("🌶️", [
+        "spice", "cinnamon", "cumin", "coriander", "turmeric", "paprika", "cayenne", "chili powder",
+        "nutmeg", "clove", "cardamom", "curry", "black pepper", "white pepper", "ginger", "saffron",
+        "star anise", "anise", "fennel seed", "garam masala", "zaatar",
+    ]),
+    "Lupin": ("🫘", [
+        "lupin", "lupine", "lupini", "lupin flour",
+    ]),
+    "Poppy seeds": ("🌼", [
+        "poppy", "poppy seed",
+    ]),
+}
+
+# Ingredients that may carry an allergen through cross-contamination or hidden use.
+MAY_CONTAIN = {
+    "oat": ["Gluten"],
+    "oatmeal": ["Gluten"],
+    "granola": ["Gluten", "Nuts"],
+    "chocolate": ["Dairy", "Nuts"],
+    "sausage": ["Pork", "Red Meat"],
+    "meatball": ["Red Meat", "Pork", "Gluten"],
+    "gelatin": ["Pork", "Red Meat"],
+    "coconut": ["Nuts"],
+    "curry": ["Nuts", "Dairy"],
+    "pizza": ["Dairy"],
+    "hamburger": ["Gluten"],
+    "sushi": ["Soy", "Sesame"],
+    "tempura": ["Gluten", "Eggs"],
+    "worcestershire sauce": ["Seafood"],
+    "coconut milk": ["Nuts"],
+    "coconut cream": ["Nuts"],
+    "oat milk": ["Gluten"],
+    "rice cake": ["Gluten"],
+}
+
+# Names built on an allergen's word that are not that food. Matched as whole terms,
+# so "butter" alone does not flag butter lettuce; the model decides them.
+LOOKALIKES = [
+    "butter lettuce", "butterhead lettuce", "cream of tartar", "cream soda", "apple butter",
+    "rice milk",
+]
+
+# Words saying the allergen was left out or replaced ("gluten-free bread", "vegan mayo").
+# A name with one of them is never flagged locally; only the model can judge the claim.
+FREE_FROM_WORDS = {
+    "free", "vegan", "substitute", "imitation", "alternative", "faux", "mock", "eggless",
+    "plant-based", "non-dairy", "dairyless", "meatless",
+}
+
+# Well-known ingredients with no allergen family of their own.
+SAFE_INGREDIENTS = [
+    "rice", "brown rice", "chicken", "turkey", "duck", "lettuce", "cucumber", "apple", "banana",
+    "orange", "lemon", "lime", "strawberry", "blueberry", "raspberry", "grape", "mango",
+    "pineapple", "avocado", "spinach", "kale", "cabbage", "red cabbage", "broccoli", "cauliflower",
+    "zucchini", "courgette", "mushroom", "olive", "olive oil", "salt", "sugar", "honey", "water",
+    "basil", "mint", "rosemary", "thyme", "oregano", "dill", "quinoa", "arugula", "rocket",
+    "radish", "beet", "beetroot", "sweet potato", "pumpkin", "squash", "asparagus", "pear",
+    "peach", "cherry", "watermelon", "melon", "kiwi", "vegetable oil", "sunflower oil",
+    "canola oil", "maple syrup", "vinegar", "ice", "carrot", "parsley", "cilantro", "fennel",
+    "rice noodle", "rice flour", "rice paper",
+]
+
+# Ingredients botanically related to a family without containing it (e.g. celery-carrot syndrome).
+RELATED_INGREDIENTS = {
+    "carrot": ["Celery"],
+    "parsley": ["Celery"],
+    "cilantro": ["Celery"],
+    "coriander": ["Celery"],
+    "fennel": ["Celery"],
+    "cumin": ["Celery"],
+    "anise": ["Celery"],
+    "kiwi": ["Nuts"],
+    "peach": ["Nuts"],
+}
+
+# Free-text allergy names that stand for a whole family.
+ALLERGY_ALIASES = {
+    "nut": "Nuts", "tree nut": "Nuts", "milk": "Dairy", "lactose": "Dairy", "dairy product": "Dairy",
+    "wheat": "Gluten", "shellfish": "Seafood", "fish": "Seafood", "seafood": "Seafood",
+    "egg": "Eggs", "soya": "Soy", "soybean": "Soy", "sulphite": "Sulfites", "sulfite": "Sulfites",
+    "legume": "Legumes", "nightshade": "Nightshades", "spice": "Spices", "poppy": "Poppy seeds",
+    "poppy seed": "Poppy seeds", "lupine": "Lupin", "meat": "Red Meat", "beef": "Red Meat",
+    "alpha-gal": "Red Meat", "cocoa": "Chocolate", "coffee": "Caffeine",
+}
+
+INGREDIENT_EMOJI = {
+    "peanut": "🥜", "almond": "🌰", "walnut": "🌰", "hazelnut": "🌰", "chestnut": "🌰",
+    "milk": "🥛", "cheese": "🧀", "butter": "🧈", "ice cream": "🍨", "yogurt": "🥛",
+    "bread": "🍞", "baguette": "🥖", "croissant": "🥐", "bagel": "🥯", "pasta": "🍝",
+    "spaghetti": "🍝", "noodle": "🍜", "ramen": "🍜", "cookie": "🍪", "cake": "🍰",
+    "pizza": "🍕", "dumpling": "🥟", "shrimp": "🦐", "prawn": "🦐", "crab": "🦀",
+    "lobster": "🦞", "oyster": "🦪", "squid": "🦑", "octopus": "🐙", "fish": "🐟",
+    "salmon": "🐟", "tuna": "🐟", "sushi": "🍣", "egg": "🥚", "omelette": "🍳",
+    "corn": "🌽", "popcorn": "🍿", "tomato": "🍅", "cherry tomato": "🍅", "potato": "🥔",
+    "eggplant": "🍆", "bell pepper": "🫑", "chili": "🌶️", "jalapeno": "🌶️", "chocolate": "🍫",
+    "wine": "🍷", "beer": "🍺", "coffee": "☕", "tea": "🍵", "bacon": "🥓", "ham": "🍖",
+    "beef": "🥩", "steak": "🥩", "hamburger": "🍔", "garlic": "🧄", "onion": "🧅",
+    "ginger": "🫚", "rice": "🍚", "chicken": "🍗", "lettuce": "🥬", "cucumber": "🥒",
+    "apple": "🍎", "banana": "🍌", "orange": "🍊", "lemon": "🍋", "strawberry": "🍓",
+    "blueberry": "🫐", "grape": "🍇", "mango": "🥭", "pineapple": "🍍", "avocado": "🥑",
+    "spinach": "🥬", "kale": "🥬", "broccoli": "🥦", "mushroom": "🍄", "olive": "🫒",
+    "carrot": "🥕", "coconut": "🥥", "kiwi": "🥝", "peach": "🍑", "cherry": "🍒",
+    "watermelon": "🍉", "melon": "🍈", "honey": "🍯", "salt": "🧂", "bean": "🫘",
+    "pea": "🫛", "tofu": "🫘", "sausage": "🌭", "falafel": "🧆", "water": "💧",
+}
+
+# Words describing preparation or appearance that never add an allergen. Not "fried",
+# "crispy", "dried" or "mashed": batter, breading, sulfites and butter come with them.
+MODIFIERS = {
+    "fresh", "grilled", "roasted", "baked", "steamed", "boiled", "raw", "sliced",
+    "chopped", "diced", "minced", "shredded", "grated", "smoked", "toasted", "sauteed",
+    "pickled", "whole", "half", "small", "large", "baby", "organic", "mixed", "cooked", "plain",
+    "leaf", "leaves", "slice", "piece", "chunk", "cube", "ring", "strip", "fillet", "breast",
+    "thigh", "wing", "red", "green", "yellow", "white", "black", "purple", "of", "and", "with",
+    "a", "the", "some", "extra", "virgin", "ground",
+}
+
+FAMILY_NAMES = {family.lower(): family for family in ALLERGEN_FAMILIES}
+
+
+def _singular(token):
+    if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("oes", "ches", "shes", "xes")):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def normalize(text):
+    """Lowercases, strips punctuation/accents we care about and singularizes each token."""
+    text = text.lower().replace("é", "e").replace("ñ", "n").replace("'", "")
+    tokens = re.findall(r"[a-z]+(?:-[a-z]+)?", text)
+    return tuple(_singular(token) for token in tokens)
+
+
+def ingredient_key(ingredient):
+    """Canonical identity of an ingredient name ("Tomatoes" and "tomato" share one, "fresh tomato" does not)."""
+    return " ".join(normalize(ingredient)) or ingredient.strip().lower()
+
+
+def allergies_key(user_allergies):
+    """Canonical identity of an allergy set, independent of order, case and plurals."""
+    return ",".join(sorted({ingredient_key(allergy) for allergy in user_allergies if allergy.strip()}))
+
+
+def _build_index():
+    index = {}
+
+    def entry(term):
+        key = " ".join(normalize(term))
+        return index.setdefault(key, {"contains": set(), "may_contain": set(), "related": set()})
+
+    for family, (_, terms) in ALLERGEN_FAMILIES.items():
+        for term in terms:
+            entry(term)["contains"].add(family)
+    for term, families in MAY_CONTAIN.items():
+        entry(term)["may_contain"].update(families)
+    for term, families in RELATED_INGREDIENTS.items():
+        entry(term)["related"].update(families)
+    for term in SAFE_INGREDIENTS + LOOKALIKES:
+        entry(term)
+    return index
+
+
+TERM_INDEX = _build_index()
+MODIFIER_TOKENS = {_singular(word) for word in MODIFIERS}
+MAX_TERM_WORDS = max(len(term.split()) for term in TERM_INDEX)
+EMOJI_INDEX = {" ".join(normalize(term)): emoji for term, emoji in INGREDIENT_EMOJI.items()}
+
+
+@lru_cache(maxsize=4096)
+def analyze_ingredient(ingredient):
+    """
+    Splits an ingredient name into known terms (longest match first).
+    Returns (matched_terms, fully_known) where fully_known is False when some
+    meaningful word is not in the knowledge base.
+    """
+    tokens = normalize(ingredient)
+    matched = []
+    fully_known = True
+    i = 0
+    while i < len(tokens):
+        for size in range(min(MAX_TERM_WORDS, len(tokens) - i), 0, -1):
+            term = " ".join(tokens[i:i + size])
+            if term in TERM_INDEX:
+                matched.append(term)
+                i += size
+                break
+        else:
+            if tokens[i] not in MODIFIER_TOKENS:
+                fully_known = False
+            i += 1
+    return tuple(matched), fully_known and bool(matched)
+
+
+@lru_cache(maxsize=1024)
+def resolve_allergy(allergy):
+    """
+    Maps a user allergy to (families, terms).
+    Family names and aliases resolve to a family; specific foods ("peanuts")
+    resolve to the term itself so only that food is treated as dangerous.
+    """
+    name = allergy.strip().lower()
+    if name in FAMILY_NAMES:
+        return frozenset([FAMILY_NAMES[name]]), frozenset()
+    key = " ".join(normalize(allergy))
+    if key in FAMILY_NAMES:
+        return frozenset([FAMILY_NAMES[key]]), frozenset()
+    if key in ALLERGY_ALIASES:
+        return frozenset([ALLERGY_ALIASES[key]]), frozenset()
+    return frozenset(), frozenset([key])
+
+
+def ingredient_emoji(ingredient, families=()):
+    terms, _ = analyze_ingredient(ingredient)
+    for term in terms:
+        if term in EMOJI_INDEX:
+            return EMOJI_INDEX[term]
+    for term in terms:
+        for word in term.split():
+            if word in EMOJI_INDEX:
+                return EMOJI_INDEX[word]
+    for family in families:
+        return ALLERGEN_FAMILIES[family][0]
+    return "🍽️"
+
+
+def format_assessment(status, emoji, ingredient, description):
+    """
+    Formats a record exactly like the crossing prompt asks the model to.
+    Descriptions avoid ", " because the UI splits records on it.
+    """
+    return f'[{status}, {emoji}, {ingredient}, "{description}"]'
+
+
+def _free_from(ingredient):
+    """Whether the name claims an allergen was left out or replaced ("gluten-free", "vegan")."""
+    return any(token in FREE_FROM_WORDS or token.endswith("-free") for token in normalize(ingredient))
+
+
+def _allergy_targets(user_allergies):
+    """(families, specific terms) the user's allergies resolve to."""
+    allergy_families, allergy_terms = set(), set()
+    for allergy in user_allergies:
+        families, specific = resolve_allergy(allergy)
+        allergy_families |= families
+        allergy_terms |= specific
+    return allergy_families, allergy_terms
+
+
+def assess_ingredient(ingredient, user_allergies):
+    """
+    Flags an ingredient that definitely contains one of the user's allergies.
+    Returns a bracketed "[dangerous, emoji, ingredient, "desc"]" record, or None
+    when the LLM should be consulted; it never answers "safe" or "alert".
+    Names that claim the allergen is absent ("gluten-free bread") always go to the LLM.
+    """
+    terms, _ = analyze_ingredient(ingredient)
+    if not terms or _free_from(ingredient):
+        return None
+
+    contains = set()
+    for term in terms:
+        contains |= TERM_INDEX[term]["contains"]
+
+    allergy_families, allergy_terms = _allergy_targets(user_allergies)
+    padded = " " + " ".join(normalize(ingredient)) + " "
+    hit_families = sorted(contains & allergy_families)
+    hit_terms = sorted(term for term in allergy_terms if term and f" {term} " in padded)
+    if not hit_families and not hit_terms:
+        return None
+    emoji = ingredient_emoji(ingredient, hit_families)
+    allergens = " and ".join(hit_families + hit_terms)
+    return format_assessment("dangerous", emoji, ingredient, f"Contains {allergens}. High allergy risk.")
+
+
+def resolve_locally(ingredients_list, user_allergies):
+    """
+    Returns one entry per ingredient: its "dangerous" record when the knowledge
+    base finds a definite allergen, otherwise None.
+    """
+    allergies = tuple(user_allergies)
+    return [assess_ingredient(ingredient, allergies) for ingredient in ingredients_list]
+
+
+def may_affect(ingredient, user_allergies):
+    """
+    Whether the knowledge base links the ingredient to one of the user's
+    allergies at all: a family it contains, may contain or is related to, or
+    a word of a specific allergy. Not an assessment; the pipeline uses it to
+    pick the ingredients worth fetching symptoms for before the crossing answer.
+    """
+    terms, _ = analyze_ingredient(ingredient)
+    allergy_families, allergy_terms = _allergy_targets(user_allergies)
+    linked = set()
+    for term in terms:
+        entry = TERM_INDEX[term]
+        linked |= entry["contains"] | entry["may_contain"] | entry["related"]
+    if linked & allergy_families:
+        return True
+    words = set(normalize(ingredient))
+    return any(words & set(term.split()) for term in allergy_terms)
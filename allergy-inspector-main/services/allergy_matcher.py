@@ -0,0 +1,142 @@
+"""
+Local matcher for free-text allergy descriptions.
+
+Most sidebar descriptions ("I got hives after peanuts and shrimp") just name
+foods the allergen knowledge base already knows. This matcher tokenizes the
+description with the knowledge base's normalizer (lowercase, singular forms),
+matches the longest known phrases, corrects small typos with difflib and maps
+each food to its allergy family where it has exactly one. It only answers when it understood every
+word; negations ("not", "except", "fine with") and unknown words are left to
+the LLM.
+"""
+import difflib
+from functools import lru_cache
+
+from services.allergen_kb import (
+    ALLERGEN_FAMILIES,
+    ALLERGY_ALIASES,
+    TERM_INDEX,
+    MODIFIER_TOKENS,
+    normalize,
+    _singular,
+)
+
+# Description-only ways of naming an allergy family.
+DESCRIPTION_SYNONYMS = {
+    "celiac": "Gluten", "coeliac": "Gluten", "lactose intolerant": "Dairy", "dairy": "Dairy",
+    "tree nut": "Nuts", "groundnut": "Nuts", "crustacean": "Seafood", "mollusc": "Seafood",
+    "mollusk": "Seafood", "shell fish": "Seafood", "sea food": "Seafood", "red wine": "Alcohol",
+    "wine": "Alcohol", "alcoholic drink": "Alcohol", "espresso": "Caffeine",
+    "energy drink": "Caffeine", "msg": "Spices", "chilli": "Spices", "chili": "Spices",
+    "spicy": "Spices",
+}
+
+# Words that carry no allergy of their own: who, when, how it felt.
+FILLER_WORDS = {
+    "i", "im", "ive", "id", "me", "my", "mine", "we", "our", "he", "she", "his", "her", "they",
+    "it", "its", "this", "that", "these", "those", "there", "is", "am", "are", "was", "were",
+    "be", "been", "being", "have", "has", "had", "do", "did", "does", "get", "got", "gotten",
+    "getting", "go", "went", "eat", "ate", "eaten", "eating", "drink", "drank", "drinking",
+    "try", "tried", "taste", "tasted", "after", "before", "when", "whenever", "every", "time",
+    "once", "last", "year", "week", "day", "night", "ago", "later", "then", "soon", "right",
+    "away", "always", "usually", "sometime", "also", "too", "both", "or", "any", "anything",
+    "food", "meal", "dish", "thing", "stuff", "product", "contain", "containing", "in", "on",
+    "at", "from", "to", "for", "by", "about", "like", "such", "as", "especially", "even",
+    "little", "bit", "lot", "very", "really", "so", "bad", "badly", "severe", "severely",
+    "mild", "terrible", "awful", "allergic", "allergy", "allergies", "intolerant", "intolerance",
+    "sensitive", "sensitivity", "reaction", "react", "reacted", "sick", "ill", "unwell",
+    "nausea", "nauseous", "vomit", "vomited", "vomiting", "threw", "up", "throw", "hive",
+    "rash", "itch", "itchy", "itching", "swell", "swelled", "swollen", "swelling", "throat",
+    "lip", "tongue", "face", "eye", "skin", "mouth", "stomach", "ache", "cramp", "pain",
+    "diarrhea", "bloated", "bloating", "headache", "migraine", "breathe", "breathing",
+    "wheezing", "anaphylaxis", "anaphylactic", "shock", "hospital", "epipen", "doctor", "said",
+    "told", "diagnosed", "found", "out", "make", "made", "makes", "feel", "felt", "feeling",
+    "cause", "caused", "causes", "give", "gave", "gives", "start", "started", "turn", "turned",
+    "red", "puffy", "sneeze", "sneezing", "cough", "coughing", "dizzy", "faint", "can",
+    "could", "will", "would", "just", "all", "kind", "type", "sort", "thing", "everything",
+    "mostly", "probably", "seem", "seemed", "think", "guess", "especially", "including",
+    "etc", "other", "anyone", "one", "two", "some", "certain", "hurt", "hurts", "close",
+    "closed", "closing", "tight", "palpitation", "break", "broke", "breaking", "outbreak",
+    "eczema", "flare", "flared", "hay", "fever",
+}
+
+# Words that change the meaning of what follows; descriptions using them go to the LLM.
+NEGATIONS = {
+    "not", "no", "never", "nor", "without", "except", "but", "although", "though", "however",
+    "unless", "dont", "didnt", "doesnt", "cant", "cannot", "wont", "isnt", "wasnt", "arent",
+    "fine", "ok", "okay", "tolerate", "tolerated", "safe", "only", "maybe", "unsure", "sure",
+    "perhaps", "might",
+}
+
+# Typos must be this close (difflib ratio) to a single known word to be corrected.
+FUZZY_CUTOFF = 0.85
+FUZZY_MIN_LENGTH = 5
+
+def _build_vocabulary():
+    """
+    Normalized phrase -> lowercased allergy name. Foods in exactly one family
+    map to that family; the rest (peanut: Nuts and Legumes, kiwi: none) are
+    kept as the food itself, which resolve_allergy treats as a specific allergy.
+    """
+    vocabulary = {}
+    for term, info in TERM_INDEX.items():
+        families = info["contains"]
+        vocabulary[term] = next(iter(families)).lower() if len(families) == 1 else term
+    names = {family: family for family in ALLERGEN_FAMILIES}
+    names.update(ALLERGY_ALIASES)
+    names.update(DESCRIPTION_SYNONYMS)
+    for name, family in names.items():
+        vocabulary[" ".join(normalize(name))] = family.lower()
+    return vocabulary
+
+
+VOCABULARY = _build_vocabulary()
+MAX_PHRASE_WORDS = max(len(phrase.split()) for phrase in VOCABULARY)
+SKIP_TOKENS = {_singular(word) for word in FILLER_WORDS} | MODIFIER_TOKENS
+NEGATION_TOKENS = {_singular(word) for word in NEGATIONS}
+FUZZY_WORDS = sorted(
+    word for word in set(VOCABULARY) | SKIP_TOKENS
+    if " " not in word and len(word) >= FUZZY_MIN_LENGTH
+)
+
+
+@lru_cache(maxsize=4096)
+def _correct(token):
+    """Closest known word for a misspelled token, or None."""
+    if len(token) < FUZZY_MIN_LENGTH:
+        return None
+    matches = difflib.get_close_matches(token, FUZZY_WORDS, n=1, cutoff=FUZZY_CUTOFF)
+    return matches[0] if matches else None
+
+
+@lru_cache(maxsize=1024)
+def match_description(description):
+    """
+    Extracts allergies from a description without a model call.
+    Returns (allergies, confident): lowercased allergy names in order of
+    appearance, and whether every word was understood. When confident is
+    False the result must not be used and the LLM should be asked instead.
+    """
+    tokens = list(normalize(description))
+    if any(token in NEGATION_TOKENS for token in tokens):
+        return (), False
+
+    allergies = []
+    i = 0
+    while i < len(tokens):
+        for size in range(min(MAX_PHRASE_WORDS, len(tokens) - i), 0, -1):
+            phrase = " ".join(tokens[i:i + size])
+            if phrase in VOCABULARY:
+                allergies.append(VOCABULARY[phrase])
+                i += size
+                break
+        else:
+            token = tokens[i]
+            if token not in SKIP_TOKENS:
+                corrected = _correct(token)
+                if corrected is None:
+                    return (), False
+                if corrected in VOCABULARY:
+                    allergies.append(VOCABULARY[corrected])
+            i += 1
+    return tuple(dict.fromkeys(allergies)), True
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Cache location is shared by every session and every Streamlit worker process.
+CACHE_DIR = os.getenv(
+    "ALLERGY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
+)
+DEFAULT_MEMORY_ITEMS = int(os.getenv("ALLERGY_CACHE_MEMORY_ITEMS", "256"))
+DEFAULT_DISK_BYTES = int(os.getenv("ALLERGY_CACHE_DISK_BYTES", str(64 * 1024 * 1024)))
+
+
+def make_key(*parts) -> str:
+    """
+    Builds a content-addressed cache key from bytes/str parts.
+    Each part is length-prefixed so ("ab", "c") and ("a", "bc") never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(str(len(part)).encode("ascii") + b":")
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DiskStore:
+    """
+    A size-bounded directory of files, shared across processes.
+
+    Files are written atomically (temp file + os.replace), so concurrent
+    workers never read half-written files. The directory is measured once, on
+    the first write, and its size is then tracked in memory: writes do not walk
+    it. Only once it grows past max_bytes are the least recently used files
+    (by mtime, refreshed with touch()) removed, down to ~90% of the budget.
+    Only files ending in one of `suffixes` are counted and evicted.
+    """
+
+    def __init__(self, directory, max_bytes, suffixes, name=None):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.suffixes = tuple(suffixes)
+        self.name = name or os.path.basename(self.directory)
+        self._lock = threading.Lock()
+        self._bytes = None  # Lazily measured on first write.
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def write(self, path, data):
+        """Writes data to path atomically. Raises OSError."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._added(len(data))
+
+    def add(self, path, tmp_path):
+        """Moves an already written file (on the same filesystem) to path. Raises OSError."""
+        size = os.path.getsize(tmp_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        self._added(size)
+
+    def touch(self, path):
+        """Marks the file as recently used, so eviction keeps it longer."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _added(self, size):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._measure()
+            else:
+                self._bytes += size
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffixes):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _measure(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drops least recently used files until the directory is ~90% of its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        with self._lock:
+            self._bytes = total
+        logger.info("🧹 Evicted %d entries from cache '%s' (%d bytes on disk).", removed, self.name, total)
+
+
+class TieredCache:
+    """
+    Two-tier cache for JSON-serializable values:
+      - an in-memory LRU in front (per process),
+      - a size-bounded directory on disk behind it (shared across processes).
+
+    The disk tier is a DiskStore: entries are written atomically, and the least
+    recently used ones (refreshed on every disk hit) are evicted once the
+    namespace grows past max_disk_bytes. With a ttl (seconds), entries expire
+    that long after they were written.
+    """
+
+    def __init__(self, namespace, max_memory_items=DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes=DEFAULT_DISK_BYTES, cache_dir=None, ttl=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = os.path.abspath(os.path.join(cache_dir or CACHE_DIR, namespace))
+        self._disk = DiskStore(self.directory, max_disk_bytes, (".json",), name=namespace)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self._disk.path(key, ".json")
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._memory:
+                expires_at, value = self._memory[key]
+                if expires_at is None or expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                value = json.load(file)
+            expires_at = None
+            if self.ttl is not None:
+                expires_at, value = value["expires_at"], value["value"]
+                if expires_at <= time.time():
+                    with self._lock:
+                        self.misses += 1
+                    return default
+            self._disk.touch(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return default
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("⚠️ Cache entry '%s' in '%s' is unreadable: %s", key, self.namespace, e)
+            with self._lock:
+                self.misses += 1
+            return default
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, expires_at, value)
+        return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+
+        path = self._path(key)
+        stored = value if self.ttl is None else {"expires_at": expires_at, "value": value}
+        try:
+            data = json.dumps(stored, ensure_ascii=False).encode("utf-8")
+            self._disk.write(path, data)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("⚠️ Could not write cache entry '%s' in '%s': %s", key, self.namespace, e)
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
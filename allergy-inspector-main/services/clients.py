@@ -0,0 +1,69 @@
+"""
+Lazily constructed API clients.
+
+Nothing here reads keys or imports the (slow to import) OpenAI SDK until a
+client is first needed, so importing services is cheap and works offline.
+"""
+
+import os
+import threading
+import weakref
+
+API_BASE_URL = os.getenv("MULTIMODAL_API_BASE_URL", "https://api.aimlapi.com/v1")
+
+_client = None
+_client_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+# AsyncOpenAI clients hold connections bound to the loop that created them.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _require_key(name):
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} is not set. Please check your environment variables.")
+    return value
+
+
+def get_openai_client():
+    """Shared OpenAI client for the multimodal API, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(base_url=API_BASE_URL, api_key=_require_key("MULTIMODAL_API_KEY"))
+    return _client
+
+
+def get_async_openai_client():
+    """AsyncOpenAI client for the running event loop, created on first use."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(base_url=API_BASE_URL, api_key=_require_key("MULTIMODAL_API_KEY"))
+        _async_clients[loop] = client
+    return client
+
+
+def background_loop():
+    """A long-lived event loop shared by all sessions, so pooled connections are reused."""
+    import asyncio
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pipeline-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro):
+    """Runs a coroutine on the background loop from synchronous code (e.g. the Streamlit script thread)."""
+    import asyncio
+    return asyncio.run_coroutine_threadsafe(coro, background_loop()).result()
+
+
+def get_video_api_key():
+    return _require_key("VIDEO_API_KEY")
@@ -0,0 +1,95 @@
+import io
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Preprocessing applied before an image is sent to the vision model.
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+}
+
+
+def prep_signature(max_edge=None, fmt=None, quality=None) -> str:
+    """Identifies the preprocessing settings, so caches can tell apart images the model saw differently."""
+    return f"{max_edge or IMAGE_MAX_EDGE}:{(fmt or IMAGE_FORMAT).upper()}:{quality or IMAGE_QUALITY}"
+
+
+def prepare_image(image_binary: bytes, max_edge=None, fmt=None, quality=None):
+    """
+    Normalizes EXIF orientation, downsizes to max_edge and re-encodes the image.
+    Returns (image_bytes, mime_type). Falls back to the original bytes when the
+    image cannot be decoded or re-encoding would not make it smaller.
+    """
+    image_bytes, mime_type, _ = _prepare(image_binary, max_edge, fmt, quality)
+    return image_bytes, mime_type
+
+
+def prepare_image_and_thumbnail(image_binary: bytes, thumbnail_edge, thumbnail_quality,
+                                max_edge=None, fmt=None, quality=None):
+    """
+    prepare_image() plus a JPEG thumbnail of at most thumbnail_edge pixels,
+    from a single decode: the thumbnail is scaled down from the model image.
+    Returns (image_bytes, mime_type, thumbnail); the thumbnail is b"" when the
+    image cannot be decoded.
+    """
+    return _prepare(image_binary, max_edge, fmt, quality, thumbnail_edge, thumbnail_quality)
+
+
+def _prepare(image_binary, max_edge, fmt, quality, thumbnail_edge=None, thumbnail_quality=None):
+    max_edge = max_edge or IMAGE_MAX_EDGE
+    fmt = (fmt or IMAGE_FORMAT).upper()
+    quality = quality or IMAGE_QUALITY
+    if fmt not in ("JPEG", "WEBP"):
+        logger.warning("⚠️ Unsupported image format '%s', using JPEG.", fmt)
+        fmt = "JPEG"
+
+    from PIL import Image, ImageOps  # Imported on first use; Pillow is slow to import.
+
+    thumbnail = b""
+    try:
+        with Image.open(io.BytesIO(image_binary)) as image:
+            original_format = image.format
+            original_size = image.size
+            if original_format == "JPEG":
+                # Let libjpeg decode at a reduced scale instead of full resolution.
+                image.draft("RGB", (max_edge, max_edge))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt, quality=quality, optimize=True)
+            processed = buffer.getvalue()
+
+            if thumbnail_edge:
+                image.thumbnail((thumbnail_edge, thumbnail_edge), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=thumbnail_quality or quality, optimize=True)
+                thumbnail = buffer.getvalue()
+    except Exception as e:
+        logger.error("❌ ERROR: Failed to preprocess image: %s", e)
+        return image_binary, "image/jpeg", thumbnail
+
+    original_mime = MIME_TYPES.get(original_format)
+    if original_mime and len(processed) >= len(image_binary) and max(original_size) <= max_edge:
+        return image_binary, original_mime, thumbnail
+
+    logger.info(
+        "Preprocessed image %sx%s %s (%d bytes) -> %s (%d bytes).",
+        original_size[0], original_size[1], original_format, len(image_binary), fmt, len(processed)
+    )
+    return processed, MIME_TYPES[fmt], thumbnail
@@ -1,43 +1,55 @@
-import os
 import base64
 import json
 import logging
-from openai import OpenAI
+import threading
+
+from services.resilience import complete, mark_degraded
+from services.prompts import get_prompt
+from services.cache import TieredCache, make_key
+from services.allergen_kb import resolve_locally, ingredient_key, allergies_key, format_assessment
+from services.allergy_matcher import match_description
+from services.image_prep import prep_signature
+from services.thumbnails import model_image
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Load API Key
-MULTIMODAL_API_KEY = os.getenv("MULTIMODAL_API_KEY")
-if not MULTIMODAL_API_KEY:
-    raise ValueError("❌ ERROR: MULTIMODAL_API_KEY is not set. Please check your environment variables.")
-
-client = OpenAI(
-    base_url="https://api.aimlapi.com/v1",
-    api_key=MULTIMODAL_API_KEY
-)
-
-# Use the current working directory and the repository structure to locate the prompts folder.
-# In your repository, prompts are in "allergy-inspector-main/prompts".
-cwd = os.getcwd()
-logger.info("Current working directory: %s", cwd)
-PROMPT_DIR = os.path.join(cwd, "allergy-inspector-main", "prompts")
-logger.info("Expected prompt directory: %s", PROMPT_DIR)
-
-CROSSING_PROMPT_FILE = os.path.join(PROMPT_DIR, "crossing_prompt.txt")
-INGREDIENTS_PROMPT_FILE = os.path.join(PROMPT_DIR, "ingredients_prompt.txt")
-INFERS_ALLERGY_PROMPT_FILE = os.path.join(PROMPT_DIR, "infers_allergy_prompt.txt")
-logger.info("Expected ingredients prompt file at: %s", INGREDIENTS_PROMPT_FILE)
-
-def load_prompt(filepath):
-    if not os.path.exists(filepath):
-        logger.error("Prompt file '%s' not found.", filepath)
-        return ""
-    with open(filepath, 'r', encoding='utf-8') as file:
-        content = file.read().strip()
-        logger.info("Loaded prompt file '%s' successfully.", filepath)
-        return content
+MODEL_NAME = "gpt-4o-mini-2024-07-18"
+
+# Detected ingredients keyed by image bytes + prompt + model, shared across sessions.
+ingredients_cache = TieredCache("ingredients")
+# Symptom descriptions keyed by allergen + model.
+symptoms_cache = TieredCache("symptoms")
+# One crossing record per (canonical ingredient, canonical allergy set, prompt, model).
+crossing_cache = TieredCache("crossing")
+# Fused (ingredients + crossing in one call) results keyed by image + allergy set + prompt + model.
+fused_cache = TieredCache("fused")
+# Allergies inferred from a sidebar description, keyed by normalized text + prompt + model.
+inference_cache = TieredCache("allergy_inference")
+
+# Token usage per operation reported by the API in this process.
+_usage_lock = threading.Lock()
+_usage = {}
+
+NO_SYMPTOMS_TEXT = "No description available."
+# Shown for ingredients the model could not assess (provider down); no ", " since records split on it.
+UNCHECKED_TEXT = "Could not be checked because the analysis service is unavailable. Treat with caution."
+# Only cards with these statuses show allergy reactions.
+SYMPTOM_STATUSES = ("dangerous", "alert")
+
+def _record_usage(operation, response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    with _usage_lock:
+        totals = _usage.setdefault(operation, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        totals["calls"] += 1
+        totals["prompt_tokens"] += usage.prompt_tokens or 0
+        totals["completion_tokens"] += usage.completion_tokens or 0
+
+def usage_stats():
+    """Calls and tokens per operation ("ingredients", "crossing", "fused", ...) in this process."""
+    with _usage_lock:
+        return {operation: dict(totals) for operation, totals in _usage.items()}
 
 def _encode_image_to_base64(image_binary: bytes) -> str:
     try:
@@ -46,166 +58,511 @@ def _encode_image_to_base64(image_binary: bytes) -> str:
         logger.error("❌ ERROR: Failed to encode image: %s", e)
         return ""
 
+def _ingredients_messages(image_base64, mime_type, prompt_text):
+    return [{
+        "role": "user",
+        "content": [
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}
+            },
+            {
+                "type": "text",
+                "text": prompt_text
+            }
+        ]
+    }]
+
+def _parse_ingredients(raw_text):
+    detected_ingredients = [i.strip().lower() for i in raw_text.split(",")]
+    return list(set(i for i in detected_ingredients if i))
+
+def _parse_crossing(raw_response):
+    return [
+        line.strip()
+        for line in raw_response.split("\n")
+        if line.startswith("[")
+    ]
+
+def _take_complete_lines(buffer):
+    """
+    Splits streamed text into finished bracketed records and the unfinished tail.
+    Returns (records, rest_of_buffer).
+    """
+    if "\n" not in buffer:
+        return [], buffer
+    complete, rest = buffer.rsplit("\n", 1)
+    return _parse_crossing(complete), rest
+
+def _symptoms_batch_prompt(allergens):
+    allergen_list = "\n".join(f"- {allergen}" for allergen in allergens)
+    return (
+        "For each allergen below, describe in up to three sentences the common symptoms and "
+        "allergic reactions experienced by individuals who are allergic to it. "
+        "Be concise, clear, and informative.\n"
+        f"{allergen_list}\n"
+        "Respond only with a JSON object mapping each allergen, spelled exactly as given, "
+        "to its description."
+    )
+
+def _parse_symptoms_batch(raw_text, allergens):
+    """Maps the model's JSON object back onto the requested (lowercased) allergens."""
+    raw_text = raw_text.strip()
+    if raw_text.startswith("```"):
+        raw_text = raw_text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(raw_text)
+    except json.JSONDecodeError:
+        logger.error("JSON decode error for symptoms response: %s", raw_text)
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    by_name = {str(key).strip().lower(): value for key, value in data.items()}
+    return {
+        allergen: str(by_name[allergen]).strip()
+        for allergen in allergens
+        if by_name.get(allergen)
+    }
+
+def _split_cached_symptoms(allergens):
+    """Returns ({allergen: cached description}, [allergens still to fetch])."""
+    names = sorted({allergen.strip().lower() for allergen in allergens if allergen.strip()})
+    symptoms, misses = {}, []
+    for name in names:
+        cached = symptoms_cache.get(make_key(name, MODEL_NAME))
+        if cached is not None:
+            symptoms[name] = cached
+        else:
+            misses.append(name)
+    return symptoms, misses
+
+def _store_symptoms(fetched):
+    for name, text in fetched.items():
+        symptoms_cache.set(make_key(name, MODEL_NAME), text)
+
+def allergens_needing_symptoms(cards):
+    """Distinct lowercased ingredient names of the cards that show allergy reactions."""
+    return sorted({
+        card["ingredient"].strip().lower()
+        for card in cards
+        if card["status"].strip().lower() in SYMPTOM_STATUSES
+    })
+
+def _prepare_crossing(ingredients_list, user_allergies):
+    """
+    Decides what it can without the model: first the local knowledge base,
+    then previously seen (ingredient, allergy set) pairs from the crossing cache.
+    Returns (known, prompt_text, pending):
+      - known: {ingredient key: record} for the decided ingredients,
+      - prompt_text: the crossing prompt for the rest ("" when nothing is left),
+      - pending: {ingredient key: crossing cache key} for the ingredients in the prompt.
+    """
+    known, unresolved = {}, {}
+    for ingredient, line in zip(ingredients_list, resolve_locally(ingredients_list, user_allergies)):
+        key = ingredient_key(ingredient)
+        if line:
+            known.setdefault(key, line)
+        elif key not in known:
+            unresolved.setdefault(key, ingredient)
+    local_count = len(known)
+
+    prompt = get_prompt("crossing_prompt")
+    if prompt is None:
+        return known, "", {}
+
+    allergy_set = allergies_key(user_allergies)
+    pending = {}
+    for key, ingredient in unresolved.items():
+        cache_key = make_key(key, allergy_set, prompt.version, MODEL_NAME)
+        cached = crossing_cache.get(cache_key)
+        card = parse_ingredient_assessment(cached) if cached else None
+        if card:
+            known[key] = format_assessment(card["status"], card["emoji"], ingredient, card["description"])
+        else:
+            pending[key] = cache_key
+
+    logger.info(
+        "Crossing %d ingredients: %d local, %d cached, %d sent to the model.",
+        len(known) + len(pending), local_count, len(known) - local_count, len(pending)
+    )
+    if not pending:
+        return known, "", {}
+    return known, prompt.format(", ".join(unresolved[key] for key in pending), ", ".join(user_allergies)), pending
+
+def _remember_crossing(line, pending):
+    """Caches a model record under its (ingredient, allergy set) pair, if it answers a pending ingredient."""
+    card = parse_ingredient_assessment(line)
+    if card:
+        cache_key = pending.get(ingredient_key(card["ingredient"]))
+        if cache_key:
+            crossing_cache.set(cache_key, line)
+
+# Crossing statuses by severity; unknown statuses count as an alert.
+STATUS_SEVERITY = {"safe": 0, "alert": 1, "dangerous": 2}
+
+def status_severity(card):
+    return STATUS_SEVERITY.get(card["status"].strip().lower(), 1) if card else 1
+
+def _merge_crossing(ingredients_list, known, model_lines):
+    """
+    Records in the order of ingredients_list; model records that match no
+    ingredient go last. For each ingredient the most severe record wins, so a
+    known record can raise a model verdict but never lower it; on a tie the
+    known record is kept and repeated model records are dropped.
+    """
+    by_key = dict(known)
+    severity = {key: status_severity(parse_ingredient_assessment(line)) for key, line in known.items()}
+    extra = []
+    for line in model_lines:
+        card = parse_ingredient_assessment(line)
+        key = ingredient_key(card["ingredient"]) if card else None
+        if not key:
+            extra.append(line)
+        elif key not in by_key or status_severity(card) > severity[key]:
+            by_key[key] = line
+            severity[key] = status_severity(card)
+    ordered = []
+    for ingredient in ingredients_list:
+        line = by_key.pop(ingredient_key(ingredient), None)
+        if line:
+            ordered.append(line)
+    return ordered + list(by_key.values()) + extra
+
+def _unchecked_crossing(ingredients_list, pending, answered_lines):
+    """
+    Cautionary records for the pending ingredients no model line answered,
+    used when the crossing call failed. Never cached.
+    """
+    answered = set()
+    for line in answered_lines:
+        card = parse_ingredient_assessment(line)
+        if card:
+            answered.add(ingredient_key(card["ingredient"]))
+    records = {}
+    for ingredient in ingredients_list:
+        key = ingredient_key(ingredient)
+        if key in pending and key not in answered and key not in records:
+            records[key] = format_assessment("alert", "❔", ingredient, UNCHECKED_TEXT)
+    return list(records.values())
+
+def parse_ingredient_assessment(bracket_str):
+    """
+    Parses '[status, emoji, ingredient, "desc"]' into a card dict, or None.
+    """
+    try:
+        parts = bracket_str.strip("[]").split(", ")
+        return {
+            "status": parts[0],
+            "emoji": parts[1],
+            "ingredient": parts[2],
+            "description": parts[3].strip('"')
+        }
+    except Exception as e:
+        logger.error("⚠️ ERROR parsing ingredient assessment: %s", e)
+        return None
+
 def get_ingredients_model_response(image_binary: bytes):
     """
     Detects ingredients in an uploaded image.
     - Removes duplicates.
+    - Downsizes/recompresses the image before upload (see services.image_prep).
+    - Serves repeat analyses of the same image from the ingredients cache.
     """
-    image_base64 = _encode_image_to_base64(image_binary)
-    if not image_base64:
-        logger.error("❌ ERROR: Could not encode image.")
+    if not image_binary:
+        logger.error("❌ ERROR: No image provided.")
         return []
 
     try:
-        prompt_text = load_prompt(INGREDIENTS_PROMPT_FILE)
-        if not prompt_text:
-            logger.error("❌ ERROR: Ingredients prompt is empty.")
+        prompt = get_prompt("ingredients_prompt")
+        if prompt is None:
+            return []
+
+        cache_key = make_key(image_binary, prompt.version, MODEL_NAME, prep_signature())
+        cached = ingredients_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Ingredients cache hit for image %s.", cache_key[:12])
+            return list(cached)
+
+        image_bytes, mime_type = model_image(image_binary)
+        image_base64 = _encode_image_to_base64(image_bytes)
+        if not image_base64:
+            logger.error("❌ ERROR: Could not encode image.")
             return []
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt_text
-                    }
-                ]
-            }],
+        response = complete(
+            "ingredients",
+            model=MODEL_NAME,
+            messages=_ingredients_messages(image_base64, mime_type, prompt.text),
         )
+        _record_usage("ingredients", response)
 
         if response and response.choices:
             raw_text = response.choices[0].message.content.strip()
             logger.info("AI response for ingredients: %s", raw_text)
-            detected_ingredients = [i.strip().lower() for i in raw_text.split(",")]
-            return list(set(detected_ingredients))
+            detected_ingredients = _parse_ingredients(raw_text)
+            ingredients_cache.set(cache_key, detected_ingredients)
+            return detected_ingredients
         else:
             logger.error("⚠️ ERROR: AI returned an empty response.")
             return []
     except Exception as e:
         logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("ingredients")
         return []
 
-def get_crossing_data_model_response(ingredients_list, user_allergies):
+def get_crossing_data_model_response(ingredients_list, user_allergies, stream=False):
     """
     Cross-checks detected ingredients vs. user allergies.
     Returns bracketed lines like "[status, emoji, ingredient, desc]".
+    Pairs the local allergen knowledge base can decide are answered without
+    the model; only the remaining ingredients are sent to the LLM.
+    With stream=True, returns a generator yielding each line as soon as it is complete.
     """
     if not ingredients_list or not user_allergies:
         logger.error("⚠️ ERROR: No ingredients or allergies provided.")
-        return []
+        return iter([]) if stream else []
 
-    ingredients_text = ", ".join(ingredients_list)
-    allergies_text = ", ".join(user_allergies)
+    if stream:
+        return _stream_crossing(ingredients_list, user_allergies)
 
-    prompt_text = load_prompt(CROSSING_PROMPT_FILE)
+    known, prompt_text, pending = _prepare_crossing(ingredients_list, user_allergies)
     if not prompt_text:
-        logger.error("❌ ERROR: Crossing prompt is empty.")
-        return []
-
-    prompt_text = prompt_text.format(ingredients_text, allergies_text)
+        return _merge_crossing(ingredients_list, known, [])
 
+    model_lines = []
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
+        response = complete(
+            "crossing",
+            model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt_text}],
         )
+        _record_usage("crossing", response)
 
         if response and response.choices:
             raw_response = response.choices[0].message.content.strip()
             logger.info("Crossing data AI response: %s", raw_response)
-            return [
-                line.strip()
-                for line in raw_response.split("\n")
-                if line.startswith("[")
-            ]
+            model_lines = _parse_crossing(raw_response)
+            for line in model_lines:
+                _remember_crossing(line, pending)
         else:
             logger.error("⚠️ ERROR: AI returned an invalid response.")
-            return []
     except Exception as e:
         logger.error("❌ ERROR calling AI: %s", e)
-        return []
+        mark_degraded("crossing")
+        model_lines += _unchecked_crossing(ingredients_list, pending, model_lines)
+    return _merge_crossing(ingredients_list, known, model_lines)
 
-def get_infers_allergy_model_response(description: str):
+def _stream_crossing(ingredients_list, user_allergies):
+    known, prompt_text, pending = _prepare_crossing(ingredients_list, user_allergies)
+    # Locally resolved and cached records are ready immediately.
+    yield from _merge_crossing(ingredients_list, known, [])
+    if not prompt_text:
+        return
+
+    answered = []
+    try:
+        response = complete(
+            "crossing",
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt_text}],
+            stream=True,
+        )
+        buffer = ""
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            buffer += chunk.choices[0].delta.content or ""
+            lines, buffer = _take_complete_lines(buffer)
+            for line in lines:
+                _remember_crossing(line, pending)
+                answered.append(line)
+                yield line
+        for line in _parse_crossing(buffer.strip()):
+            _remember_crossing(line, pending)
+            yield line
+    except Exception as e:
+        logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("crossing")
+        yield from _unchecked_crossing(ingredients_list, pending, answered)
+
+def _fused_cache_key(image_binary, user_allergies, prompt):
+    return make_key(image_binary, allergies_key(user_allergies), prompt.version, MODEL_NAME, prep_signature())
+
+def _parse_fused_ingredients(line):
+    """The "Ingredients: a, b, c" line of a fused answer, or None for any other line."""
+    label, _, rest = line.partition(":")
+    if label.strip().lower() != "ingredients" or not rest.strip():
+        return None
+    return _parse_ingredients(rest)
+
+def _parse_fused(raw_text):
+    """Splits a fused answer into (ingredients, records); ingredients fall back to the records' names."""
+    ingredients = None
+    for line in raw_text.split("\n"):
+        if ingredients is None:
+            ingredients = _parse_fused_ingredients(line.strip())
+    records = _parse_crossing(raw_text)
+    if ingredients is None:
+        cards = [parse_ingredient_assessment(line) for line in records]
+        ingredients = [card["ingredient"].strip().lower() for card in cards if card]
+    return ingredients, records
+
+def _local_crossing(ingredients_list, user_allergies):
+    """{ingredient key: record} for the pairs the knowledge base decides; merged with model records by severity."""
+    return {
+        ingredient_key(ingredient): line
+        for ingredient, line in zip(ingredients_list, resolve_locally(ingredients_list, user_allergies))
+        if line
+    }
+
+def get_fused_model_response(image_binary: bytes, user_allergies):
+    """
+    Detects ingredients and cross-checks them against the allergies in one
+    multimodal call (ANALYSIS_MODE=fused). Knowledge-base decisions are merged
+    with the model's records by severity, as in the two-step path.
+    Returns (ingredients, records in ingredient order).
+    """
+    if not image_binary or not user_allergies:
+        logger.error("❌ ERROR: No image or allergies provided.")
+        return [], []
+
+    try:
+        prompt = get_prompt("fused_prompt")
+        if prompt is None:
+            return [], []
+
+        cache_key = _fused_cache_key(image_binary, user_allergies, prompt)
+        cached = fused_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Fused cache hit for image %s.", cache_key[:12])
+            return list(cached["ingredients"]), list(cached["records"])
+
+        image_bytes, mime_type = model_image(image_binary)
+        response = complete(
+            "fused",
+            model=MODEL_NAME,
+            messages=_ingredients_messages(
+                _encode_image_to_base64(image_bytes), mime_type, prompt.format(", ".join(user_allergies))
+            ),
+        )
+        _record_usage("fused", response)
+
+        if response and response.choices:
+            raw_text = response.choices[0].message.content.strip()
+            logger.info("Fused AI response: %s", raw_text)
+            ingredients, model_lines = _parse_fused(raw_text)
+            records = _merge_crossing(ingredients, _local_crossing(ingredients, user_allergies), model_lines)
+            fused_cache.set(cache_key, {"ingredients": ingredients, "records": records})
+            return ingredients, records
+        else:
+            logger.error("⚠️ ERROR: AI returned an empty response.")
+            return [], []
+    except Exception as e:
+        logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("fused")
+        return [], []
+
+def normalize_description(description: str) -> str:
+    """Lowercased, whitespace-collapsed description, so trivial edits share one inference."""
+    return " ".join(description.lower().split()).strip(" .,;!?")
+
+def _parse_inferred_allergies(raw_text):
+    """Reads {"allergies": [...]} (or a bare list / comma-separated fallback) into lowercased names."""
+    raw_text = raw_text.strip()
+    if raw_text.startswith("```"):
+        raw_text = raw_text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(raw_text)
+        if isinstance(data, dict):
+            data = data.get("allergies", [])
+        if isinstance(data, list):
+            items = [str(item) for item in data]
+        else:
+            items = []
+    except json.JSONDecodeError:
+        logger.error("JSON decode error for allergies response: %s", raw_text)
+        items = [] if raw_text.lower() in ("[noone]", "none") else raw_text.split(",")
+    return list(dict.fromkeys(item.strip().lower() for item in items if item.strip()))
+
+def get_infers_allergy_model_response(description: str, use_local=True):
     """
     Analyzes user description to extract known allergies.
-    Returns a list of allergies.
+    Returns a list of allergies. Descriptions the local matcher fully
+    understands never reach the model; the rest are cached per normalized
+    description, so the same text is only ever sent to the model once.
     """
+    description = normalize_description(description or "")
     if not description:
         return []
 
-    prompt_text = load_prompt(INFERS_ALLERGY_PROMPT_FILE)
-    if not prompt_text:
-        logger.error("❌ ERROR: Infers allergy prompt is empty.")
+    if use_local:
+        allergies, confident = match_description(description)
+        if confident:
+            logger.info("Resolved allergy description locally: %s", list(allergies))
+            return list(allergies)
+
+    prompt = get_prompt("infers_allergy_prompt")
+    if prompt is None:
         return []
 
-    prompt_text = prompt_text.format(description)
+    cache_key = make_key(description, prompt.version, MODEL_NAME)
+    cached = inference_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Allergy inference cache hit for description %s.", cache_key[:12])
+        return list(cached)
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt_text}],
+        response = complete(
+            "infer_allergies",
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt.format(description)}],
+            response_format={"type": "json_object"},
         )
+        _record_usage("infer_allergies", response)
 
         if response and response.choices:
             raw_text = response.choices[0].message.content.strip()
             logger.info("Inferring allergies AI response: %s", raw_text)
-
-            if raw_text.lower() in ["[noone]", "none", ""]:
-                strict_prompt = f"""
-                Extract allergens from this user statement:
-                "{description}"
-                - ONLY return allergens in a JSON array format: ["allergen1", "allergen2"]
-                - DO NOT return "none", "[noone]", or explanations.
-                """
-                strict_response = client.chat.completions.create(
-                    model="gpt-4o-mini-2024-07-18",
-                    messages=[{"role": "user", "content": strict_prompt}],
-                )
-                raw_text = strict_response.choices[0].message.content.strip()
-                logger.info("Re-attempt AI response for allergies: %s", raw_text)
-
-            try:
-                allergy_list = json.loads(raw_text)
-                if isinstance(allergy_list, list):
-                    return [item.strip().lower() for item in allergy_list]
-            except json.JSONDecodeError:
-                logger.error("JSON decode error for allergies response: %s", raw_text)
-            return [item.strip().lower() for item in raw_text.split(",") if item]
+            allergies = _parse_inferred_allergies(raw_text)
+            inference_cache.set(cache_key, allergies)
+            return allergies
         else:
             logger.error("⚠️ ERROR: AI did not return a valid response.")
             return []
     except Exception as e:
         logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("infer_allergies")
         return []
 
-def get_allergy_symptoms_model_response(allergen: str) -> str:
+def get_allergy_symptoms_batch_model_response(allergens):
     """
-    Uses the GPT-4o model to generate a concise description (up to three sentences)
-    of common allergy symptoms for a given allergen.
+    Describes the symptoms for many allergens with a single structured request.
+    Returns {lowercased allergen: description}; cached allergens are not sent to the model.
     """
-    prompt = (
-        f"Describe in up to three sentences the common symptoms and allergic reactions "
-        f"experienced by individuals who are allergic to {allergen}. "
-        f"Provide a concise, clear, and informative description."
-    )
+    symptoms, misses = _split_cached_symptoms(allergens)
+    if not misses:
+        return symptoms
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt}],
+        response = complete(
+            "symptoms",
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": _symptoms_batch_prompt(misses)}],
+            response_format={"type": "json_object"},
         )
+        _record_usage("symptoms", response)
         if response and response.choices:
-            symptoms = response.choices[0].message.content.strip()
-            logger.info("Allergy symptoms for '%s': %s", allergen, symptoms)
-            return symptoms
+            raw_text = response.choices[0].message.content.strip()
+            logger.info("Allergy symptoms for %s: %s", misses, raw_text)
+            fetched = _parse_symptoms_batch(raw_text, misses)
+            _store_symptoms(fetched)
+            symptoms.update(fetched)
         else:
-            logger.error("No response from AI for allergen %s", allergen)
-            return "No description available."
+            logger.error("No response from AI for allergens %s", misses)
     except Exception as e:
         logger.error("Error calling AI for allergy symptoms: %s", e)
-        return "No description available."
+        mark_degraded("symptoms")
+
+    for name in misses:
+        symptoms.setdefault(name, NO_SYMPTOMS_TEXT)
+    return symptoms
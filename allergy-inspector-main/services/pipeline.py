@@ -0,0 +1,510 @@
+import os
+import time
+import asyncio
+import logging
+import queue
+from dataclasses import dataclass, field
+
+from services.clients import background_loop
+from services.resilience import complete_async, mark_degraded, start_degradation_tracking
+from services.prompts import get_prompt
+from services.cache import make_key
+from services.allergen_kb import may_affect, ingredient_key
+from services.image_prep import prep_signature
+from services.thumbnails import model_image
+from services.multi_modal import (
+    MODEL_NAME,
+    NO_SYMPTOMS_TEXT,
+    SYMPTOM_STATUSES,
+    ingredients_cache,
+    fused_cache,
+    parse_ingredient_assessment,
+    allergens_needing_symptoms,
+    _encode_image_to_base64,
+    _ingredients_messages,
+    _parse_ingredients,
+    _parse_crossing,
+    _take_complete_lines,
+    _prepare_crossing,
+    _remember_crossing,
+    _merge_crossing,
+    status_severity,
+    _unchecked_crossing,
+    _local_crossing,
+    _fused_cache_key,
+    _parse_fused_ingredients,
+    _symptoms_batch_prompt,
+    _parse_symptoms_batch,
+    _split_cached_symptoms,
+    _store_symptoms,
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on model requests in flight for a single analysis.
+MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "8"))
+# "two_step" (vision call, then a text crossing call) or "fused" (one multimodal call for both).
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "two_step").strip().lower()
+# Distinct ingredients per crossing request in batch mode; chunks are crossed concurrently.
+BATCH_CROSSING_SIZE = int(os.getenv("PIPELINE_BATCH_CROSSING_SIZE", "25"))
+
+
+@dataclass
+class AnalysisResult:
+    """Everything the UI needs to render one meal analysis."""
+    ingredients: list = field(default_factory=list)
+    assessments: list = field(default_factory=list)   # bracketed "[status, emoji, ingredient, desc]" lines
+    cards: list = field(default_factory=list)         # parsed assessments
+    symptoms: dict = field(default_factory=dict)      # lowercased ingredient -> symptom text (flagged cards only)
+    elapsed: float = 0.0
+    degraded: list = field(default_factory=list)      # operations answered by a fallback (provider unavailable)
+
+
+@dataclass
+class BatchItem:
+    """Per-image part of a batch analysis."""
+    name: str
+    ingredients: list = field(default_factory=list)
+    cards: list = field(default_factory=list)         # this image's assessments, taken from the shared report
+    elapsed: float = 0.0                              # ingredient detection time for this image
+
+
+@dataclass
+class BatchResult:
+    """A combined report over many images; every distinct ingredient is assessed once."""
+    items: list = field(default_factory=list)         # BatchItem per image, in input order
+    cards: list = field(default_factory=list)         # one card per distinct assessed ingredient
+    sources: dict = field(default_factory=dict)       # ingredient key -> names of the images it appears in
+    symptoms: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+    degraded: list = field(default_factory=list)
+
+
+async def _complete(operation, messages, semaphore, **kwargs):
+    async with semaphore:
+        response = await complete_async(operation, model=MODEL_NAME, messages=messages, **kwargs)
+    if response and response.choices:
+        return response.choices[0].message.content.strip()
+    return ""
+
+
+async def get_ingredients_async(image_binary: bytes, semaphore):
+    """Async counterpart of get_ingredients_model_response (shares its cache)."""
+    if not image_binary:
+        return []
+    prompt = get_prompt("ingredients_prompt")
+    if prompt is None:
+        return []
+
+    cache_key = make_key(image_binary, prompt.version, MODEL_NAME, prep_signature())
+    cached = ingredients_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    image_bytes, mime_type = await asyncio.to_thread(model_image, image_binary)
+    image_base64 = _encode_image_to_base64(image_bytes)
+    try:
+        raw_text = await _complete("ingredients", _ingredients_messages(image_base64, mime_type, prompt.text), semaphore)
+    except Exception as e:
+        logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("ingredients")
+        return []
+    if not raw_text:
+        logger.error("⚠️ ERROR: AI returned an empty response.")
+        return []
+    detected_ingredients = _parse_ingredients(raw_text)
+    ingredients_cache.set(cache_key, detected_ingredients)
+    return detected_ingredients
+
+
+async def get_crossing_async(ingredients_list, user_allergies, semaphore):
+    """Async counterpart of get_crossing_data_model_response (records in ingredient order)."""
+    lines = [line async for line in stream_crossing_async(ingredients_list, user_allergies, semaphore)]
+    return _merge_crossing(ingredients_list, {}, lines)
+
+
+async def stream_crossing_async(ingredients_list, user_allergies, semaphore):
+    """Yields crossing records as soon as each line of the model output is complete."""
+    if not ingredients_list or not user_allergies:
+        return
+    known, prompt_text, pending = _prepare_crossing(ingredients_list, user_allergies)
+    for line in _merge_crossing(ingredients_list, known, []):
+        yield line
+    if not prompt_text:
+        return
+    answered = []
+    try:
+        async with semaphore:
+            response = await complete_async(
+                "crossing",
+                model=MODEL_NAME,
+                messages=[{"role": "user", "content": prompt_text}],
+                stream=True,
+            )
+            buffer = ""
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+                lines, buffer = _take_complete_lines(buffer)
+                for line in lines:
+                    _remember_crossing(line, pending)
+                    answered.append(line)
+                    yield line
+        for line in _parse_crossing(buffer.strip()):
+            _remember_crossing(line, pending)
+            yield line
+    except Exception as e:
+        logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("crossing")
+        for line in _unchecked_crossing(ingredients_list, pending, answered):
+            yield line
+
+
+def _fused_line_events(line, state):
+    """
+    Turns one complete line of a fused answer into stream events. Records that
+    arrive before the "Ingredients:" line are held back until it is known.
+    """
+    line = line.strip()
+    if state["ingredients"] is None:
+        ingredients = _parse_fused_ingredients(line)
+        if ingredients is not None:
+            state["ingredients"] = ingredients
+            held, state["held"] = state["held"], []
+            return [("ingredients", ingredients)] + [("record", record) for record in held]
+        if line.startswith("["):
+            state["held"].append(line)
+        return []
+    return [("record", line)] if line.startswith("[") else []
+
+
+async def stream_fused_async(image_binary: bytes, user_allergies, semaphore):
+    """
+    Streams a fused (ingredients + crossing) answer: yields ("ingredients", [...])
+    as soon as the first line is complete, then ("record", line) per assessment.
+    The caller merges knowledge-base decisions in by severity. The cache stores
+    the merged records, as get_fused_model_response does; merging them again
+    changes nothing.
+    """
+    prompt = get_prompt("fused_prompt")
+    if prompt is None or not image_binary:
+        yield "ingredients", []
+        return
+    cache_key = _fused_cache_key(image_binary, user_allergies, prompt)
+    cached = fused_cache.get(cache_key)
+    if cached is not None:
+        yield "ingredients", list(cached["ingredients"])
+        for record in cached["records"]:
+            yield "record", record
+        return
+
+    image_bytes, mime_type = await asyncio.to_thread(model_image, image_binary)
+    messages = _ingredients_messages(
+        _encode_image_to_base64(image_bytes), mime_type, prompt.format(", ".join(user_allergies))
+    )
+    state = {"ingredients": None, "held": []}
+    records = []
+    failed = False
+    try:
+        async with semaphore:
+            response = await complete_async(
+                "fused", model=MODEL_NAME, messages=messages, stream=True,
+            )
+            buffer = ""
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+                if "\n" not in buffer:
+                    continue
+                complete, buffer = buffer.rsplit("\n", 1)
+                for line in complete.split("\n"):
+                    for event in _fused_line_events(line, state):
+                        if event[0] == "record":
+                            records.append(event[1])
+                        yield event
+        for event in _fused_line_events(buffer, state):
+            if event[0] == "record":
+                records.append(event[1])
+            yield event
+    except Exception as e:
+        logger.error("❌ ERROR calling AI: %s", e)
+        mark_degraded("fused")
+        failed = True
+
+    if state["ingredients"] is None:
+        # No "Ingredients:" line: name the ingredients after the records instead.
+        cards = [parse_ingredient_assessment(record) for record in state["held"]]
+        state["ingredients"] = [card["ingredient"].strip().lower() for card in cards if card]
+        yield "ingredients", state["ingredients"]
+        for record in state["held"]:
+            records.append(record)
+            yield "record", record
+    if failed:
+        # Ingredients the answer stopped before; the caller skips those the knowledge base decided.
+        pending = dict.fromkeys(ingredient_key(ingredient) for ingredient in state["ingredients"])
+        for record in _unchecked_crossing(state["ingredients"], pending, records):
+            yield "record", record
+    elif state["ingredients"]:
+        merged = _merge_crossing(
+            state["ingredients"], _local_crossing(state["ingredients"], user_allergies), records
+        )
+        fused_cache.set(cache_key, {"ingredients": state["ingredients"], "records": merged})
+
+
+async def analyze_meal_fused_stream(image_binary: bytes, user_allergies, max_concurrency=MAX_CONCURRENCY,
+                                    semaphore=None):
+    """
+    analyze_meal_stream for ANALYSIS_MODE=fused: same events, but ingredients and
+    assessments come from one multimodal call. Knowledge-base decisions are
+    shown as soon as the ingredients line arrives. A later, more severe model
+    record for the same ingredient is sent as another "card" event that
+    replaces the earlier one; a less severe one is dropped.
+    """
+    start = time.perf_counter()
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+    result = AnalysisResult()
+    degraded = start_degradation_tracking()
+    shown = {}  # ingredient key -> index in result.cards
+
+    def add_card(line):
+        card = parse_ingredient_assessment(line)
+        key = ingredient_key(card["ingredient"]) if card else None
+        if key is None:
+            return None
+        if key in shown:
+            index = shown[key]
+            if status_severity(card) <= status_severity(result.cards[index]):
+                return None
+            result.assessments[index] = line
+            result.cards[index] = card
+            return card
+        shown[key] = len(result.cards)
+        result.assessments.append(line)
+        result.cards.append(card)
+        return card
+
+    async for kind, payload in stream_fused_async(image_binary, user_allergies, semaphore):
+        if kind == "ingredients":
+            result.ingredients = payload
+            yield "ingredients", payload
+            for line in _local_crossing(payload, user_allergies).values():
+                card = add_card(line)
+                if card:
+                    yield "card", card
+        else:
+            card = add_card(payload)
+            if card:
+                yield "card", card
+
+    needed = allergens_needing_symptoms(result.cards)
+    result.symptoms = await get_symptoms_batch_async(needed, semaphore) if needed else {}
+    yield "symptoms", result.symptoms
+
+    result.elapsed = time.perf_counter() - start
+    result.degraded = sorted(degraded)
+    logger.info("Analyzed meal (fused) with %d ingredients in %.2fs.", len(result.ingredients), result.elapsed)
+    yield "done", result
+
+
+async def get_symptoms_batch_async(allergens, semaphore):
+    """Async counterpart of get_allergy_symptoms_batch_model_response (shares its cache)."""
+    symptoms, misses = _split_cached_symptoms(allergens)
+    if misses:
+        try:
+            raw_text = await _complete(
+                "symptoms",
+                [{"role": "user", "content": _symptoms_batch_prompt(misses)}],
+                semaphore,
+                response_format={"type": "json_object"},
+            )
+            fetched = _parse_symptoms_batch(raw_text, misses)
+            _store_symptoms(fetched)
+            symptoms.update(fetched)
+        except Exception as e:
+            logger.error("Error calling AI for allergy symptoms: %s", e)
+            mark_degraded("symptoms")
+    for name in misses:
+        symptoms.setdefault(name, NO_SYMPTOMS_TEXT)
+    return symptoms
+
+
+async def analyze_meal_stream(image_binary: bytes, user_allergies, max_concurrency=MAX_CONCURRENCY,
+                              semaphore=None):
+    """
+    Runs ingredient detection, crossing and symptom lookups for one image,
+    yielding (event, payload) tuples as results become available:
+      ("ingredients", [...]), ("card", {...}) per assessment, ("symptoms", {...}), ("done", AnalysisResult).
+    AnalysisResult.degraded lists the steps that fell back because the model
+    could not be reached; their cards are cautionary, not an all-clear.
+
+    One batched symptom request starts alongside the crossing stream for the
+    ingredients the knowledge base links to the user's allergies (allergen_kb.
+    may_affect), so the total time for the usual flagged cards is roughly
+    ingredients + max(crossing, symptoms). It is cancelled once crossing clears
+    all of them, and one extra request covers flagged cards it did not include.
+
+    Model calls are bounded by max_concurrency, or by semaphore when one is
+    shared with other analyses (server.py passes its server-wide cap).
+    """
+    if ANALYSIS_MODE == "fused" and user_allergies:
+        async for event in analyze_meal_fused_stream(image_binary, user_allergies, max_concurrency, semaphore):
+            yield event
+        return
+
+    start = time.perf_counter()
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+    result = AnalysisResult()
+    degraded = start_degradation_tracking()
+    result.ingredients = await get_ingredients_async(image_binary, semaphore)
+    yield "ingredients", result.ingredients
+    if not result.ingredients or not user_allergies:
+        result.elapsed = time.perf_counter() - start
+        result.degraded = sorted(degraded)
+        yield "done", result
+        return
+
+    speculative = {
+        ingredient.strip().lower() for ingredient in result.ingredients if may_affect(ingredient, user_allergies)
+    }
+    symptoms_task = asyncio.create_task(get_symptoms_batch_async(speculative, semaphore)) if speculative else None
+    undecided = set(speculative)
+    try:
+        async for line in stream_crossing_async(result.ingredients, user_allergies, semaphore):
+            card = parse_ingredient_assessment(line)
+            if card:
+                result.assessments.append(line)
+                result.cards.append(card)
+                yield "card", card
+                if card["status"].strip().lower() not in SYMPTOM_STATUSES:
+                    undecided.discard(card["ingredient"].strip().lower())
+                    if symptoms_task and not undecided:
+                        symptoms_task.cancel()  # Every speculated ingredient came back safe.
+                        symptoms_task = None
+        needed = allergens_needing_symptoms(result.cards)
+        if symptoms_task and speculative.isdisjoint(needed):
+            symptoms_task.cancel()
+            symptoms_task = None
+        symptoms = await symptoms_task if symptoms_task else {}
+    finally:
+        if symptoms_task:
+            symptoms_task.cancel()
+
+    missing = [name for name in needed if name not in symptoms]
+    if missing:
+        symptoms.update(await get_symptoms_batch_async(missing, semaphore))
+    result.symptoms = {name: symptoms[name] for name in needed}
+    yield "symptoms", result.symptoms
+
+    result.elapsed = time.perf_counter() - start
+    result.degraded = sorted(degraded)
+    logger.info("Analyzed meal with %d ingredients in %.2fs.", len(result.ingredients), result.elapsed)
+    yield "done", result
+
+
+async def analyze_images_stream(images, user_allergies, max_concurrency=MAX_CONCURRENCY,
+                                batch_size=BATCH_CROSSING_SIZE, semaphore=None):
+    """
+    Analyzes many images (a buffet, a multi-page menu) as one batch, yielding
+      ("image", BatchItem) as each image's ingredients are detected, then ("done", BatchResult).
+
+    images is a list of (name, bytes). Ingredient detection runs for all images
+    concurrently (bounded by max_concurrency); ingredients shared between images
+    are deduplicated, so each distinct one is crossed once, in concurrent chunks
+    of batch_size, and one symptom request covers every flagged card.
+    A shared semaphore (e.g. a server-wide model cap) replaces max_concurrency.
+    """
+    start = time.perf_counter()
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+    result = BatchResult(items=[BatchItem(name=name) for name, _ in images])
+    degraded = start_degradation_tracking()
+
+    async def detect(index, image_binary):
+        item_start = time.perf_counter()
+        ingredients = await get_ingredients_async(image_binary, semaphore)
+        return index, ingredients, time.perf_counter() - item_start
+
+    tasks = [asyncio.create_task(detect(i, image)) for i, (_, image) in enumerate(images)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, ingredients, elapsed = await next_done
+            item = result.items[index]
+            item.ingredients, item.elapsed = ingredients, elapsed
+            yield "image", item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    unique = {}
+    for item in result.items:
+        for ingredient in item.ingredients:
+            key = ingredient_key(ingredient)
+            unique.setdefault(key, ingredient)
+            sources = result.sources.setdefault(key, [])
+            if item.name not in sources:
+                sources.append(item.name)
+    distinct = list(unique.values())
+    logger.info(
+        "Batch of %d images: %d ingredients, %d distinct.",
+        len(images), sum(len(item.ingredients) for item in result.items), len(distinct)
+    )
+
+    if distinct and user_allergies:
+        chunks = [distinct[i:i + batch_size] for i in range(0, len(distinct), batch_size)]
+        crossed = await asyncio.gather(*(get_crossing_async(chunk, user_allergies, semaphore) for chunk in chunks))
+        by_key = {}
+        for line in (line for lines in crossed for line in lines):
+            card = parse_ingredient_assessment(line)
+            if card and ingredient_key(card["ingredient"]) not in by_key:
+                by_key[ingredient_key(card["ingredient"])] = card
+                result.cards.append(card)
+        for item in result.items:
+            keys = dict.fromkeys(ingredient_key(ingredient) for ingredient in item.ingredients)
+            item.cards = [by_key[key] for key in keys if key in by_key]
+        result.symptoms = await get_symptoms_batch_async(allergens_needing_symptoms(result.cards), semaphore)
+
+    result.elapsed = time.perf_counter() - start
+    result.degraded = sorted(degraded)
+    logger.info("Analyzed %d images in %.2fs.", len(images), result.elapsed)
+    yield "done", result
+
+
+def _iter_events(stream):
+    """
+    Synchronous generator over the events of an async pipeline stream, which
+    runs on the background loop. Closing the generator cancels the stream.
+    """
+    events = queue.Queue()
+    finished = object()
+
+    async def produce():
+        try:
+            async for event in stream:
+                events.put(event)
+        finally:
+            events.put(finished)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), background_loop())
+    try:
+        while True:
+            event = events.get()
+            if event is finished:
+                break
+            yield event
+        future.result()
+    finally:
+        future.cancel()
+
+
+def iter_analysis(image_binary: bytes, user_allergies):
+    """
+    Synchronous generator over analyze_meal_stream events, for incremental rendering.
+    Closing the generator (e.g. on a Streamlit rerun) cancels the analysis.
+    """
+    return _iter_events(analyze_meal_stream(image_binary, user_allergies))
+
+
+def iter_batch_analysis(images, user_allergies):
+    """Synchronous generator over analyze_images_stream events."""
+    return _iter_events(analyze_images_stream(images, user_allergies))
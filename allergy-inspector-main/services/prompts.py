@@ -0,0 +1,136 @@
+"""
+Prompt registry.
+
+Every file in prompts/ is read once, checked for the placeholders its callers
+fill in, and served from memory. A file is only re-read when its mtime changes
+(checked at most every PROMPT_RELOAD_INTERVAL seconds), so editing a prompt
+takes effect without a restart and without per-call file I/O. Each prompt
+carries a short content hash that caches use as the prompt's version.
+"""
+
+import os
+import time
+import string
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prompts")
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+
+# Placeholders each prompt must contain, exactly; files not listed here may have none.
+PLACEHOLDERS = {
+    "crossing_prompt": {"0", "1"},
+    "infers_allergy_prompt": {"0"},
+    "ingredients_prompt": set(),
+    "prepare_video_prompt": set(),
+    "fused_prompt": {"0"},
+}
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    text: str
+    version: str    # sha256 of the text, truncated; changes whenever the prompt does
+    mtime: float
+
+    def format(self, *args):
+        return self.text.format(*args)
+
+
+def placeholders(text):
+    """Names of the str.format fields in text ({0} -> "0")."""
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+
+class PromptRegistry:
+
+    def __init__(self, directory=PROMPT_DIR, expected=None, reload_interval=PROMPT_RELOAD_INTERVAL):
+        self.directory = os.path.abspath(directory)
+        self.expected = PLACEHOLDERS if expected is None else expected
+        self.reload_interval = reload_interval
+        self._prompts = {}
+        self._rejected = {}  # name -> mtime of a version that failed to load, so it is not re-read
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.reload()
+
+    def get(self, name):
+        """Returns the Prompt called name (file name without .txt), or None."""
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+        return self._prompts.get(name)
+
+    def reload(self):
+        """Re-reads the prompt files whose mtime changed since they were loaded."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                names = [name for name in os.listdir(self.directory) if name.endswith(".txt")]
+            except OSError as e:
+                logger.error("❌ ERROR: Prompt directory '%s' is unreadable: %s", self.directory, e)
+                return
+            for filename in names:
+                path = os.path.join(self.directory, filename)
+                name = filename[:-len(".txt")]
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                current = self._prompts.get(name)
+                if (current is not None and current.mtime == mtime) or self._rejected.get(name) == mtime:
+                    continue
+                prompt = self._load(name, path, mtime)
+                if prompt is None:
+                    self._rejected[name] = mtime
+                else:
+                    if current is not None:
+                        logger.info("🔄 Reloaded prompt '%s' (version %s).", name, prompt.version)
+                    self._prompts[name] = prompt
+
+    def _load(self, name, path, mtime):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read().strip()
+        except OSError as e:
+            logger.error("❌ ERROR: Could not read prompt file '%s': %s", path, e)
+            return None
+        found = placeholders(text)
+        wanted = self.expected.get(name, set())
+        if found != wanted:
+            # Keep serving the previous version rather than a prompt .format() would break on.
+            logger.error(
+                "❌ ERROR: Prompt '%s' has placeholders %s, expected %s; not loaded.",
+                name, sorted(found), sorted(wanted)
+            )
+            return None
+        if not text:
+            logger.error("❌ ERROR: Prompt file '%s' is empty.", path)
+            return None
+        version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        return Prompt(name=name, text=text, version=version, mtime=mtime)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide PromptRegistry, loaded on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+    return _registry
+
+
+def get_prompt(name):
+    """Returns the Prompt called name, or None (logged) when it is missing or invalid."""
+    prompt = get_registry().get(name)
+    if prompt is None:
+        logger.error("❌ ERROR: Prompt '%s' is not available.", name)
+    return prompt
@@ -0,0 +1,96 @@
+"""
+Thin client for the standalone analysis service (server.py).
+
+When ANALYSIS_API_URL is set, the Streamlit app sends its analyses here
+instead of calling the model itself; the functions mirror the local ones and
+fail the same way (empty results, logged errors).
+"""
+import os
+import json
+import logging
+
+import requests
+
+from services.http_session import get_session, CONNECT_TIMEOUT
+from services.pipeline import AnalysisResult, BatchItem, BatchResult
+from services.resilience import mark_degraded
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_API_URL = os.getenv("ANALYSIS_API_URL", "").rstrip("/")
+# Analyses stream events; this bounds the wait for the next one, not the whole analysis.
+ANALYSIS_API_TIMEOUT = (CONNECT_TIMEOUT, float(os.getenv("ANALYSIS_API_TIMEOUT", "120")))
+
+
+def remote_enabled():
+    return bool(ANALYSIS_API_URL)
+
+
+def _post_json(path, payload):
+    response = get_session().post(f"{ANALYSIS_API_URL}{path}", json=payload, timeout=ANALYSIS_API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def _events(response):
+    for line in response.iter_lines():
+        if line:
+            message = json.loads(line)
+            yield message["event"], message["data"]
+
+
+def infer_allergies(description: str):
+    """
+    Same as services.multi_modal.get_infers_allergy_model_response. Operations
+    the service answered from a fallback, or the unreachable service itself,
+    are marked degraded in the caller's tracking (resilience.start_degradation_tracking).
+    """
+    try:
+        data = _post_json("/v1/allergies/infer", {"description": description})
+        allergies = data["allergies"]
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logger.error("❌ ERROR calling analysis service: %s", e)
+        mark_degraded("analysis_service")
+        return []
+    for operation in data.get("degraded", []):
+        mark_degraded(operation)
+    return allergies
+
+
+def iter_analysis(image_binary: bytes, user_allergies):
+    """Same events as services.pipeline.iter_analysis, streamed from the service."""
+    sent_ingredients = False
+    try:
+        with get_session().post(
+            f"{ANALYSIS_API_URL}/v1/analyze", data=image_binary, params={"allergies": ",".join(user_allergies)},
+            headers={"Content-Type": "application/octet-stream"}, timeout=ANALYSIS_API_TIMEOUT, stream=True
+        ) as response:
+            response.raise_for_status()
+            for event, payload in _events(response):
+                sent_ingredients = sent_ingredients or event == "ingredients"
+                yield event, AnalysisResult(**payload) if event == "done" else payload
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logger.error("❌ ERROR calling analysis service: %s", e)
+        if not sent_ingredients:
+            yield "ingredients", []
+        yield "done", AnalysisResult(degraded=["analysis_service"])
+
+
+def iter_batch_analysis(images, user_allergies):
+    """Same events as services.pipeline.iter_batch_analysis, streamed from the service."""
+    try:
+        with get_session().post(
+            f"{ANALYSIS_API_URL}/v1/analyze/batch", params={"allergies": ",".join(user_allergies)},
+            files=[("images", (name, image_binary)) for name, image_binary in images],
+            timeout=ANALYSIS_API_TIMEOUT, stream=True
+        ) as response:
+            response.raise_for_status()
+            for event, payload in _events(response):
+                if event == "image":
+                    yield event, BatchItem(**payload)
+                elif event == "done":
+                    payload["items"] = [BatchItem(**item) for item in payload["items"]]
+                    yield event, BatchResult(**payload)
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logger.error("❌ ERROR calling analysis service: %s", e)
+        yield "done", BatchResult(degraded=["analysis_service"])
@@ -0,0 +1,425 @@
+"""
+Deadlines and hedging for model calls.
+
+Every chat completion goes through complete() / complete_async():
+- each operation ("ingredients", "crossing", ...) has a deadline; a call that
+  has not answered by then fails with DeadlineExceeded instead of blocking the
+  page;
+- a non-streaming call still running after the operation's recent p95
+  latency is hedged: an identical request is sent, the first answer wins
+  and the other request is cancelled.
+Streaming calls are not hedged (both copies would bill the full output); the
+deadline bounds the whole stream, from connecting to its last chunk, so a
+slow or stalled stream fails too.
+
+Each operation on the chat endpoint (and the video endpoint) also has a
+circuit breaker, so one failing operation does not cut off the others.
+Provider and transport failures count towards opening it (5xx, 408/429,
+connection errors and timeouts, including an expired deadline): a provider
+that hangs or is merely too slow is shed like one that fails. Client errors
+and our own cancellations do not count. After repeated failures it
+opens and calls fail with CircuitOpen at once, so callers fall back to cached
+or locally computed results (and mark the analysis degraded) instead of every
+user waiting out a timeout. After a cool-down one probe request is let through
+(half-open); its outcome closes the breaker or opens it again.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+
+from services.clients import get_async_openai_client, run_sync
+
+logger = logging.getLogger(__name__)
+
+# Seconds a model call may take, per operation; MODEL_DEADLINE_<OPERATION> overrides one.
+DEFAULT_DEADLINE = float(os.getenv("MODEL_DEADLINE", "30"))
+OPERATION_DEADLINES = {
+    "ingredients": 30.0,
+    "crossing": 30.0,
+    "fused": 45.0,
+    "infer_allergies": 15.0,
+    "symptoms": 20.0,
+}
+HEDGING_ENABLED = os.getenv("MODEL_HEDGING", "1") != "0"
+# Hedge after this percentile of the operation's recent latencies...
+HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "0.95"))
+# ...once this many have been seen; before that, after MODEL_HEDGE_DELAY seconds.
+HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", "10"))
+LATENCY_WINDOW = 200
+# Consecutive failures that open a breaker, and seconds before a probe is let through.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Endpoint name of the chat completions API; each operation gets its own breaker on it.
+CHAT_ENDPOINT = "chat_completions"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class DeadlineExceeded(TimeoutError):
+    """A model call did not answer within its operation's deadline."""
+
+
+class CircuitOpen(ConnectionError):
+    """The endpoint's breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failures -> half-open after `reset_seconds` -> closed."""
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.short_circuited = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go out now. While half-open, only one probe at a time does."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info("Circuit %s half-open: sending a probe request.", self.name)
+                return True
+            self.short_circuited += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open); not calling it.")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("✅ Circuit %s closed again.", self.name)
+            self._state = CLOSED
+            self._consecutive = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._consecutive >= self.failures):
+                logger.error("❌ Circuit %s opened after %d failures.", self.name, self._consecutive)
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """A call ended without an outcome (cancelled by us); lets another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, error):
+        """
+        Records a call's outcome. Provider and transport failures count against
+        the endpoint: 5xx, 408/429, connection errors and timeouts (the SDK's or
+        our deadline). Client errors (other 4xx) mean the endpoint is up. Other
+        exceptions are not about the provider and do not count.
+        """
+        if error is None:
+            self.record_success()
+            return
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            if status >= 500 or status in (408, 429):
+                self.record_failure()
+            else:
+                self.record_success()
+        elif isinstance(error, DeadlineExceeded) or _is_transport_error(error):
+            self.record_failure()
+        else:
+            self.release()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self._consecutive, "short_circuited": self.short_circuited}
+
+
+def _is_transport_error(error):
+    """Connection errors and timeouts of the SDK (APITimeoutError is an APIConnectionError)."""
+    import openai  # Deferred: the SDK is slow to import, and is loaded by the time a call failed.
+    return isinstance(error, openai.APIConnectionError)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    """Process-wide breaker for one provider endpoint (or one operation on it, see chat_breaker)."""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint)
+        return _breakers[endpoint]
+
+
+def chat_breaker(operation):
+    """Breaker for one operation ("ingredients", "crossing", ...) on the chat endpoint."""
+    return get_breaker(f"{CHAT_ENDPOINT}:{operation}")
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def reset_breakers():
+    """Forgets every breaker (all closed again); for benchmarks and tests."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def provider_available(operation):
+    """False while the operation's chat breaker is open (a probe may already be on its way)."""
+    return chat_breaker(operation).state != OPEN
+
+
+# Operations that fell back (failed model call, open circuit) during the current
+# analysis. The set is shared with the tasks the analysis starts.
+_degraded = contextvars.ContextVar("degraded_operations", default=None)
+
+
+def start_degradation_tracking():
+    """Starts a fresh record of fallbacks for the current analysis and returns it."""
+    operations = set()
+    _degraded.set(operations)
+    return operations
+
+
+def mark_degraded(operation):
+    """Notes that `operation` answered from a fallback instead of the model."""
+    operations = _degraded.get()
+    if operations is not None:
+        operations.add(operation)
+
+
+def deadline_for(operation):
+    override = os.getenv(f"MODEL_DEADLINE_{operation.upper()}")
+    return float(override) if override else OPERATION_DEADLINES.get(operation, DEFAULT_DEADLINE)
+
+
+class LatencyTracker:
+    """Recent successful latencies and hedge/timeout counts per operation."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latencies = {}
+        self._counts = {}
+
+    def record(self, operation, seconds):
+        with self._lock:
+            self._latencies.setdefault(operation, deque(maxlen=self._window)).append(seconds)
+
+    def count(self, operation, name):
+        with self._lock:
+            counts = self._counts.setdefault(operation, {"calls": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0})
+            counts[name] += 1
+
+    def percentile(self, operation, fraction):
+        with self._lock:
+            ordered = sorted(self._latencies.get(operation, ()))
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def hedge_delay(self, operation):
+        with self._lock:
+            samples = len(self._latencies.get(operation, ()))
+        if samples < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return self.percentile(operation, HEDGE_PERCENTILE)
+
+    def stats(self):
+        with self._lock:
+            operations = set(self._latencies) | set(self._counts)
+            counts = {operation: dict(self._counts.get(operation, {})) for operation in operations}
+        return {
+            operation: {
+                **counts[operation],
+                "p50": self.percentile(operation, 0.5),
+                "p95": self.percentile(operation, 0.95),
+                "p99": self.percentile(operation, 0.99),
+            }
+            for operation in operations
+        }
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._counts.clear()
+
+
+tracker = LatencyTracker()
+
+
+def latency_stats():
+    """Per-operation latency percentiles (seconds) and call/hedge/timeout counts in this process."""
+    return tracker.stats()
+
+
+async def complete_async(operation, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) on the async client, bounded by the
+    operation's deadline and hedged when it runs longer than usual. With
+    stream=True, returns an async iterator of chunks that raises
+    DeadlineExceeded once the deadline passes.
+    """
+    breaker = chat_breaker(operation)
+    breaker.check()
+    try:
+        if kwargs.get("stream"):
+            return await _stream_with_deadline(operation, breaker, **kwargs)
+        response = await _complete_with_hedge(operation, **kwargs)
+    except asyncio.CancelledError:
+        breaker.release()  # Our own cancellation says nothing about the provider.
+        raise
+    except Exception as e:
+        breaker.record(e)
+        raise
+    breaker.record_success()
+    return response
+
+
+async def _stream_with_deadline(operation, breaker, **kwargs):
+    create = get_async_openai_client().chat.completions.create
+    deadline = deadline_for(operation)
+    tracker.count(operation, "calls")
+    end = asyncio.get_running_loop().time() + deadline
+    try:
+        response = await asyncio.wait_for(create(timeout=deadline, **kwargs), deadline)
+    except asyncio.TimeoutError:
+        tracker.count(operation, "timeouts")
+        raise DeadlineExceeded(f"{operation} model call did not answer within {deadline:g}s.") from None
+    return _bounded_stream(operation, response, breaker, deadline, end)
+
+
+async def _bounded_stream(operation, response, breaker, deadline, end):
+    """
+    Yields the response's chunks until `end` (loop time), then raises
+    DeadlineExceeded. The breaker learns the outcome when the stream ends, the
+    same way complete_async records a non-streaming call.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = response.__aiter__()
+    error = None
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, end - loop.time()))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                tracker.count(operation, "timeouts")
+                raise DeadlineExceeded(f"{operation} model stream did not finish within {deadline:g}s.") from None
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        error = False  # Cancelled or abandoned by us; says nothing about the provider.
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if error is False:
+            breaker.release()
+        else:
+            breaker.record(error)
+        close = getattr(response, "close", None)
+        if close is not None:
+            await close()
+
+
+async def _complete_with_hedge(operation, **kwargs):
+    create = get_async_openai_client().chat.completions.create
+    deadline = deadline_for(operation)
+    tracker.count(operation, "calls")
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    end = start + deadline
+    attempts = [asyncio.ensure_future(create(timeout=deadline, **kwargs))]
+    try:
+        delay = tracker.hedge_delay(operation)
+        if HEDGING_ENABLED and delay < deadline:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                logger.info("Hedging %s call after %.2fs.", operation, delay)
+                tracker.count(operation, "hedged")
+                attempts.append(asyncio.ensure_future(create(timeout=end - loop.time(), **kwargs)))
+
+        pending, error = set(attempts), None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, end - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            # .exception() on every finished attempt, so no error goes unretrieved.
+            failures = {task: task.exception() for task in done}
+            winners = [task for task, exception in failures.items() if exception is None]
+            if winners:
+                tracker.record(operation, loop.time() - start)
+                if winners[0] is not attempts[0]:
+                    tracker.count(operation, "hedge_wins")
+                return winners[0].result()
+            error = next(iter(failures.values()))
+        if error is not None and not pending:
+            raise error
+        tracker.count(operation, "timeouts")
+        raise DeadlineExceeded(f"{operation} model call did not answer within {deadline:g}s.")
+    finally:
+        losers = [task for task in attempts if not task.done()]
+        for task in losers:
+            task.cancel()
+        # Wait for the cancellations, so a loser's late error is retrieved instead of logged.
+        await asyncio.gather(*losers, return_exceptions=True)
+
+
+def complete(operation, **kwargs):
+    """
+    Synchronous complete_async, run on the shared background loop, where a
+    losing hedge can actually be cancelled. With stream=True, returns an
+    iterator over the same deadline-bounded stream.
+    """
+    if kwargs.get("stream"):
+        return _iter_stream(run_sync(complete_async(operation, **kwargs)))
+    return run_sync(complete_async(operation, **kwargs))
+
+
+async def _next_chunk(stream):
+    """(True, chunk), or (False, None) once the stream is exhausted."""
+    try:
+        return True, await stream.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+def _iter_stream(stream):
+    """Iterates an async stream of the background loop from synchronous code."""
+    try:
+        while True:
+            more, chunk = run_sync(_next_chunk(stream))
+            if not more:
+                return
+            yield chunk
+    finally:
+        run_sync(stream.aclose())
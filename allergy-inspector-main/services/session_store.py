@@ -0,0 +1,211 @@
+"""
+Bounded per-session memory for uploaded images.
+
+Session state used to grow with every interaction: full uploads, and their
+base64 embedded in chat HTML that was sent to the browser again on each
+rerun. Session state now holds ImageHandles (sha256, size and a small JPEG
+thumbnail) and each session's SessionStore keeps the full bytes: the most
+recent ones within SESSION_MEMORY_BUDGET in memory, older ones spilled to a
+per-session directory on disk (capped at SESSION_DISK_BUDGET, oldest dropped
+first). The directory is removed when the session ends and its store is
+garbage collected, or at process exit.
+"""
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from services.cache import CACHE_DIR
+from services.thumbnails import thumbnail_for
+
+logger = logging.getLogger(__name__)
+
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(CACHE_DIR, "sessions"))
+# Image bytes a session keeps in memory (always at least the latest image); older ones are spilled to disk.
+SESSION_MEMORY_BUDGET = int(os.getenv("SESSION_MEMORY_BUDGET", str(8 * 1024 * 1024)))
+# Spilled bytes a session keeps on disk; older images are dropped.
+SESSION_DISK_BUDGET = int(os.getenv("SESSION_DISK_BUDGET", str(64 * 1024 * 1024)))
+# Spill directories left behind by a crashed process are removed after this many seconds.
+SESSION_ORPHAN_SECONDS = float(os.getenv("SESSION_ORPHAN_SECONDS", str(24 * 3600)))
+
+_sessions = weakref.WeakSet()
+_sessions_lock = threading.Lock()
+_orphans_checked = False
+
+
+@dataclass(frozen=True)
+class ImageHandle:
+    sha: str
+    size: int
+    thumbnail: bytes = b""     # small JPEG from services.thumbnails
+    name: str = ""
+
+
+def _remove_directory(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _remove_orphans():
+    """Removes spill directories no live process has touched for SESSION_ORPHAN_SECONDS."""
+    cutoff = time.time() - SESSION_ORPHAN_SECONDS
+    try:
+        entries = list(os.scandir(SESSION_SPILL_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                _remove_directory(entry.path)
+        except OSError:
+            pass
+
+
+class SessionStore:
+    """
+    Full bytes of one session's images, addressed by ImageHandle. Adding an
+    image that is already stored returns its existing handle.
+    """
+
+    def __init__(self, memory_budget=SESSION_MEMORY_BUDGET, disk_budget=SESSION_DISK_BUDGET):
+        global _orphans_checked
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.directory = os.path.join(SESSION_SPILL_DIR, uuid.uuid4().hex)
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._memory = OrderedDict()   # sha -> bytes, least recently used first
+        self._disk = OrderedDict()     # sha -> size of the spilled file
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self.spilled = 0
+        self.dropped = 0
+        # Runs when the session's store is garbage collected, or at exit.
+        self._finalizer = weakref.finalize(self, _remove_directory, self.directory)
+        with _sessions_lock:
+            _sessions.add(self)
+            if not _orphans_checked:
+                _orphans_checked = True
+                _remove_orphans()
+
+    def _path(self, sha):
+        return os.path.join(self.directory, sha)
+
+    def add_image(self, image_bytes, name=""):
+        """Stores the image and returns its handle."""
+        sha = hashlib.sha256(image_bytes).hexdigest()
+        with self._lock:
+            handle = self._handles.get(sha)
+            if handle is not None:
+                if sha in self._memory:
+                    self._memory.move_to_end(sha)
+                return handle
+        handle = ImageHandle(sha, len(image_bytes), thumbnail_for(image_bytes, sha), name)
+        with self._lock:
+            if sha not in self._handles:
+                self._handles[sha] = handle
+                self._memory[sha] = image_bytes
+                self._memory_bytes += len(image_bytes)
+                self._spill()
+            return self._handles[sha]
+
+    def read(self, handle):
+        """The full bytes of the handle's image, or None once it was dropped."""
+        with self._lock:
+            data = self._memory.get(handle.sha)
+            if data is not None:
+                self._memory.move_to_end(handle.sha)
+                return data
+            if handle.sha not in self._disk:
+                return None
+            self._disk.move_to_end(handle.sha)
+        try:
+            with open(self._path(handle.sha), "rb") as file:
+                return file.read()
+        except OSError as e:
+            logger.error("❌ ERROR reading spilled image %s: %s", handle.sha[:12], e)
+            return None
+
+    def _spill(self):
+        """Moves the least recently used images to disk until memory fits the budget. Holds the lock."""
+        while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+            sha, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+                with os.fdopen(fd, "wb") as file:
+                    file.write(data)
+                os.replace(tmp_path, self._path(sha))
+            except OSError as e:
+                logger.warning("⚠️ Could not spill image %s to disk; dropping it: %s", sha[:12], e)
+                self._drop(sha)
+                continue
+            self._disk[sha] = len(data)
+            self._disk_bytes += len(data)
+            self.spilled += 1
+        while self._disk_bytes > self.disk_budget and self._disk:
+            sha, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(sha))
+            except OSError:
+                pass
+            self._drop(sha)
+
+    def _drop(self, sha):
+        self._handles.pop(sha, None)
+        self.dropped += 1
+
+    def close(self):
+        """Forgets every image and removes the spill directory."""
+        with self._lock:
+            self._handles.clear()
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_bytes = self._disk_bytes = 0
+        self._finalizer()
+
+    def stats(self):
+        with self._lock:
+            thumbnails = sum(len(handle.thumbnail) for handle in self._handles.values())
+            return {
+                "images": len(self._handles),
+                "memory_bytes": self._memory_bytes + thumbnails,
+                "disk_bytes": self._disk_bytes,
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+            }
+
+
+def process_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def session_memory_stats():
+    """Live session stores, the bytes they hold in memory and on disk, and the process RSS."""
+    with _sessions_lock:
+        sessions = [store.stats() for store in list(_sessions)]
+    return {
+        "sessions": len(sessions),
+        "memory_bytes": sum(stats["memory_bytes"] for stats in sessions),
+        "max_session_memory_bytes": max((stats["memory_bytes"] for stats in sessions), default=0),
+        "disk_bytes": sum(stats["disk_bytes"] for stats in sessions),
+        "spilled": sum(stats["spilled"] for stats in sessions),
+        "dropped": sum(stats["dropped"] for stats in sessions),
+        "rss_bytes": process_rss(),
+    }
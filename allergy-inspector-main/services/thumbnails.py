@@ -0,0 +1,106 @@
+"""
+Thumbnails of uploaded photos, made once per image hash.
+
+Showing an upload used to mean inlining the whole photo as base64 for a
+100-pixel <img>, and the pipeline then decoded and re-encoded the same photo
+again for the model. thumbnail_for() decodes a photo once
+(image_prep.prepare_image_and_thumbnail): the small JPEG thumbnail goes to a
+persistent cache keyed by the image's sha256, and the model-ready image is
+kept in a small in-memory LRU, where model_image() finds it when the
+analysis starts instead of preprocessing the photo a second time.
+"""
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from services.cache import CACHE_DIR, DiskStore, make_key
+from services.image_prep import prepare_image, prepare_image_and_thumbnail, prep_signature
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join(CACHE_DIR, "thumbnails"))
+THUMBNAIL_EDGE = int(os.getenv("THUMBNAIL_EDGE", "200"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Model-ready images kept between displaying a photo and analyzing it.
+PREPARED_CACHE_ITEMS = int(os.getenv("PREPARED_CACHE_ITEMS", "16"))
+
+_store = DiskStore(THUMBNAIL_DIR, THUMBNAIL_CACHE_MAX_BYTES, (".jpg",), name="thumbnails")
+_prepared = OrderedDict()   # make_key(sha, prep_signature()) -> (image_bytes, mime_type)
+_lock = threading.Lock()
+_stats = {"thumbnail_hits": 0, "thumbnail_misses": 0, "prepared_hits": 0, "prepared_misses": 0}
+
+
+def _thumbnail_path(sha):
+    key = make_key(sha, f"{THUMBNAIL_EDGE}:{THUMBNAIL_QUALITY}")
+    return _store.path(key, ".jpg")
+
+
+def _prepared_key(sha):
+    return make_key(sha, prep_signature())
+
+
+def _remember_prepared(sha, prepared):
+    with _lock:
+        _prepared[_prepared_key(sha)] = prepared
+        _prepared.move_to_end(_prepared_key(sha))
+        while len(_prepared) > PREPARED_CACHE_ITEMS:
+            _prepared.popitem(last=False)
+
+
+def _store_thumbnail(path, thumbnail):
+    try:
+        _store.write(path, thumbnail)
+    except OSError as e:
+        logger.warning("⚠️ Could not cache thumbnail: %s", e)
+
+
+def thumbnail_for(image_bytes, sha=None):
+    """
+    JPEG thumbnail (at most THUMBNAIL_EDGE pixels) of the image, or b"" when it
+    cannot be decoded. sha is the image's sha256, when the caller already has it.
+    """
+    sha = sha or hashlib.sha256(image_bytes).hexdigest()
+    path = _thumbnail_path(sha)
+    try:
+        with open(path, "rb") as file:
+            thumbnail = file.read()
+        _store.touch(path)  # Recently shown thumbnails survive eviction.
+        with _lock:
+            _stats["thumbnail_hits"] += 1
+        return thumbnail
+    except OSError:
+        pass
+
+    image, mime_type, thumbnail = prepare_image_and_thumbnail(image_bytes, THUMBNAIL_EDGE, THUMBNAIL_QUALITY)
+    with _lock:
+        _stats["thumbnail_misses"] += 1
+    if thumbnail:
+        _remember_prepared(sha, (image, mime_type))
+        _store_thumbnail(path, thumbnail)
+    return thumbnail
+
+
+def model_image(image_binary):
+    """
+    prepare_image(image_binary), reusing the model image decoded along with a
+    thumbnail when the photo was just shown.
+    """
+    sha = hashlib.sha256(image_binary).hexdigest()
+    with _lock:
+        prepared = _prepared.get(_prepared_key(sha))
+        _stats["prepared_hits" if prepared else "prepared_misses"] += 1
+    if prepared:
+        return prepared
+    prepared = prepare_image(image_binary)
+    if prepared[0] is not image_binary:  # Never hold on to full-size originals.
+        _remember_prepared(sha, prepared)
+    return prepared
+
+
+def thumbnail_stats():
+    """Thumbnail cache hits/misses and how often the analysis reused an already prepared image."""
+    with _lock:
+        return dict(_stats)
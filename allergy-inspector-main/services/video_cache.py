@@ -0,0 +1,77 @@
+import os
+import time
+import logging
+import threading
+
+from services.cache import TieredCache, make_key
+from services.video_model import VIDEO_MODEL
+from services.video_store import video_path
+
+logger = logging.getLogger(__name__)
+
+# Videos are kept locally (services.video_store), so entries outlive the provider URL...
+VIDEO_CACHE_TTL = float(os.getenv("VIDEO_CACHE_TTL", str(30 * 24 * 3600)))
+# ...but an entry without a local copy is only as good as its URL, which expires.
+VIDEO_URL_TTL = float(os.getenv("VIDEO_URL_TTL", str(24 * 3600)))
+
+video_cache = TieredCache("videos", ttl=VIDEO_CACHE_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+def canonical_allergies(user_allergies):
+    """Sorted, lowercased, de-duplicated allergy names."""
+    return sorted({allergy.strip().lower() for allergy in user_allergies if allergy.strip()})
+
+
+def video_key(user_allergies, ratio="16:9", duration=5, model=VIDEO_MODEL):
+    """Identifies a video by what it shows, so identical requests share one generation."""
+    return make_key(",".join(canonical_allergies(user_allergies)), ratio, str(duration), model)
+
+
+def lookup_video(key):
+    """
+    Returns the cached video metadata for a key, or None.
+    Every lookup counts towards the hit rate; hits add their generation time to the savings.
+    """
+    entry = video_cache.get(key)
+    if entry is not None and not video_path(entry.get("video_sha")):
+        if entry.get("created_at", 0.0) + VIDEO_URL_TTL <= time.time():
+            entry = None
+    with _stats_lock:
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        _stats["saved_seconds"] += entry.get("generation_seconds", 0.0)
+        stats = dict(_stats)
+    logger.info(
+        "🎞️ Video cache hit for %s: hit rate %d/%d, %.1f min of generation saved.",
+        entry.get("allergies"), stats["hits"], stats["hits"] + stats["misses"], stats["saved_seconds"] / 60
+    )
+    return entry
+
+
+def store_video(key, user_allergies, ratio, duration, video_url, generation_id, generation_seconds, video_sha=None):
+    """Caches a finished generation with the metadata needed to report savings."""
+    video_cache.set(key, {
+        "url": video_url,
+        "video_sha": video_sha,
+        "generation_id": generation_id,
+        "allergies": canonical_allergies(user_allergies),
+        "ratio": ratio,
+        "duration": duration,
+        "model": VIDEO_MODEL,
+        "generation_seconds": generation_seconds,
+        "created_at": time.time(),
+    })
+
+
+def video_cache_stats():
+    """Hit/miss counts, hit rate and total generation time saved in this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / total if total else 0.0
+    return stats
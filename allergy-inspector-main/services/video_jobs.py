@@ -0,0 +1,388 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+
+from services.cache import CACHE_DIR
+from services.video_cache import canonical_allergies, video_key, lookup_video, store_video
+from services.video_store import download_video
+from services.video_model import (
+    IN_PROGRESS_STATUSES,
+    backoff_delay,
+    submit_generation,
+    fetch_video_status,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIVE_JOBS = int(os.getenv("VIDEO_MAX_ACTIVE_JOBS", "4"))
+POLL_BASE_DELAY = float(os.getenv("VIDEO_POLL_BASE_DELAY", "5"))
+POLL_MAX_DELAY = float(os.getenv("VIDEO_POLL_MAX_DELAY", "60"))
+JOB_MAX_WAIT = float(os.getenv("VIDEO_JOB_MAX_WAIT", "1200"))
+JOB_RETENTION = float(os.getenv("VIDEO_JOB_RETENTION", str(24 * 3600)))
+# Submit/poll calls that raise before a job is marked failed.
+JOB_MAX_ERRORS = int(os.getenv("VIDEO_JOB_MAX_ERRORS", "5"))
+# Finished videos downloaded at once, off the polling thread.
+DOWNLOAD_WORKERS = int(os.getenv("VIDEO_DOWNLOAD_WORKERS", "2"))
+# One JSON file per job, so processes sharing the cache never overwrite each other's jobs.
+JOBS_DIR = os.path.join(CACHE_DIR, "video_jobs")
+LEGACY_JOBS_FILE = os.path.join(CACHE_DIR, "video_jobs.json")
+
+# Job statuses; "queued"/"generating"/"processing" come straight from the provider.
+PENDING = "pending"        # waiting for a free submission slot
+SUBMITTED = "submitted"    # accepted by the provider, not polled yet
+DOWNLOADING = "downloading"  # finished at the provider, being copied to services.video_store
+COMPLETED = "completed"
+FAILED = "error"
+TIMED_OUT = "timeout"
+TERMINAL_STATUSES = (COMPLETED, FAILED, TIMED_OUT)
+
+
+@dataclass
+class VideoJob:
+    key: str
+    allergies: list
+    ratio: str = "16:9"
+    duration: int = 5
+    status: str = PENDING
+    generation_id: str = None
+    video_url: str = None
+    video_sha: str = None      # local copy in services.video_store
+    error: str = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    submitted_at: float = 0.0
+    next_poll_at: float = 0.0
+    polls: int = 0
+    errors: int = 0            # submit/poll calls that raised
+    cached: bool = False
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATUSES
+
+
+class VideoJobManager:
+    """
+    Owns every video generation in the process.
+
+    - Each distinct request (canonical allergy set + ratio + duration) is
+      submitted to the provider once; later requests attach to the same job,
+      and finished videos are served from the shared video cache.
+    - One background thread submits pending jobs (at most max_active_jobs in
+      flight) and polls the rest with exponential backoff and jitter. A job is
+      backed off before each call, so a call that raises is retried later,
+      not in a tight loop; after max_errors such errors the job fails.
+    - Finished videos are downloaded on a small pool of their own, so one
+      slow file does not hold up polling for every other job.
+    - Each job, including its generation_id, is persisted to its own JSON file,
+      so a restarted worker resumes polling instead of paying for a new
+      generation, and another process asked for the same video attaches to the
+      job instead of submitting it again. Only the changed job's file is
+      rewritten, so processes never drop each other's jobs.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_active_jobs=MAX_ACTIVE_JOBS,
+                 base_delay=POLL_BASE_DELAY, max_delay=POLL_MAX_DELAY, max_wait=JOB_MAX_WAIT,
+                 max_errors=JOB_MAX_ERRORS, download_workers=DOWNLOAD_WORKERS):
+        self.jobs_dir = jobs_dir
+        self.max_active_jobs = max_active_jobs
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.max_errors = max_errors
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="video-download")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._load()
+
+    # ---- public API -------------------------------------------------------
+
+    def submit(self, user_allergies, ratio="16:9", duration=5):
+        """Registers a video request and returns its job key (no provider call happens here)."""
+        key = video_key(user_allergies, ratio, duration)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.done:
+                # Another process may be running it already.
+                stored = self._read_job(self._job_path(key))
+                if stored is not None and not stored.done:
+                    self._jobs[key] = job = stored
+            reusing = job is not None and not job.done
+        if reusing:
+            logger.info("🎬 Reusing video job %s (%s).", key[:12], job.status)
+            self._ensure_worker()
+            return key
+
+        cached = lookup_video(key)
+        now = time.time()
+        job = VideoJob(
+            key=key,
+            allergies=canonical_allergies(user_allergies),
+            ratio=ratio,
+            duration=duration,
+            created_at=now,
+            updated_at=now,
+        )
+        if cached:
+            job.status, job.video_url, job.cached = COMPLETED, cached["url"], True
+            job.video_sha = cached.get("video_sha")
+        with self._lock:
+            existing = self._jobs.get(key)
+            if existing is not None and not existing.done:
+                return key  # Another session queued it while we checked the cache.
+            self._jobs[key] = job
+            self._save_locked(job)
+        if cached:
+            return key
+        logger.info("🎬 Queued video job %s for %s.", key[:12], job.allergies)
+        self._ensure_worker()
+        self._wakeup.set()
+        return key
+
+    def get(self, key):
+        """Returns a snapshot of the job as a dict, or None."""
+        with self._lock:
+            job = self._jobs.get(key)
+            return asdict(job) if job else None
+
+    def wait(self, key, timeout=None, interval=1.0):
+        """Blocks until the job is finished (or timeout) and returns its snapshot."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            snapshot = self.get(key)
+            if snapshot is None or snapshot["status"] in TERMINAL_STATUSES:
+                return snapshot
+            if deadline is not None and time.time() >= deadline:
+                return snapshot
+            time.sleep(interval)
+
+    # ---- background worker ------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="video-jobs", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("⚠️ Error in video job worker: %s", e)
+            with self._lock:
+                active = [job for job in self._jobs.values() if not job.done and job.status != DOWNLOADING]
+                next_at = min((job.next_poll_at for job in active), default=None)
+            if next_at is None:
+                self._wakeup.wait()
+            else:
+                self._wakeup.wait(max(0.0, next_at - time.time()))
+
+    def _tick(self):
+        now = time.time()
+        with self._lock:
+            in_flight = sum(
+                1 for job in self._jobs.values()
+                if job.generation_id and not job.done and job.status != DOWNLOADING
+            )
+            to_submit, to_poll = [], []
+            for job in sorted(self._jobs.values(), key=lambda j: j.created_at):
+                if job.done or job.status == DOWNLOADING or job.next_poll_at > now:
+                    continue
+                if job.generation_id:
+                    to_poll.append(job.key)
+                elif in_flight < self.max_active_jobs:
+                    to_submit.append(job.key)
+                    in_flight += 1
+                else:
+                    # No free slot; look again shortly (or sooner, when woken up).
+                    job.next_poll_at = now + self.base_delay
+                    continue
+                # Backed off before the call: if it raises, the job is not retried at once.
+                job.next_poll_at = now + backoff_delay(job.errors, self.base_delay, self.max_delay)
+
+        for key in to_submit:
+            self._run_step(self._submit_job, key)
+        for key in to_poll:
+            self._run_step(self._poll_job, key)
+
+    def _run_step(self, step, key):
+        try:
+            step(key)
+        except Exception as e:
+            with self._lock:
+                job = self._jobs[key]
+                job.errors += 1
+                job.updated_at = time.time()
+                if job.errors >= self.max_errors:
+                    job.status = FAILED
+                    job.error = f"⚠️ Error: Video job failed after {job.errors} errors: {e}"
+                    logger.error("❌ Video job %s failed after %d errors: %s", key[:12], job.errors, e)
+                else:
+                    logger.warning("⚠️ Error in video job %s (%d/%d): %s", key[:12], job.errors, self.max_errors, e)
+                self._save_locked(job)
+
+    def _submit_job(self, key):
+        with self._lock:
+            job = self._jobs[key]
+            allergies, ratio, duration = job.allergies, job.ratio, job.duration
+        generation_id, error = submit_generation(allergies, ratio, duration)
+        now = time.time()
+        with self._lock:
+            job = self._jobs[key]
+            job.updated_at = now
+            if error:
+                job.status, job.error = FAILED, error
+            else:
+                job.status = SUBMITTED
+                job.generation_id = generation_id
+                job.submitted_at = now
+                job.next_poll_at = now + backoff_delay(0, self.base_delay, self.max_delay)
+            self._save_locked(job)
+
+    def _poll_job(self, key):
+        with self._lock:
+            job = self._jobs[key]
+            generation_id, submitted_at, polls = job.generation_id, job.submitted_at, job.polls
+        result = fetch_video_status(generation_id)
+        now = time.time()
+        with self._lock:
+            job = self._jobs[key]
+            job.polls = polls + 1
+            job.updated_at = now
+            if result["status"] == COMPLETED:
+                # Fetched once, by the download pool, so pages play the local copy and survive URL expiry.
+                job.status, job.video_url = DOWNLOADING, result["url"]
+                self._downloads.submit(self._download_job, key)
+            elif result["status"] == FAILED:
+                job.status, job.error = FAILED, result["error"]
+            elif now - submitted_at > self.max_wait:
+                job.status = TIMED_OUT
+                job.error = f"⚠️ Error: Video processing timed out. Generation ID: {generation_id}"
+            else:
+                if result["status"] in IN_PROGRESS_STATUSES:
+                    job.status = result["status"]
+                job.next_poll_at = now + backoff_delay(job.polls, self.base_delay, self.max_delay)
+            self._save_locked(job)
+
+    def _download_job(self, key):
+        """Copies a finished video to the store; without a local copy the job completes with the provider URL."""
+        with self._lock:
+            job = self._jobs[key]
+            url = job.video_url
+            record = (job.allergies, job.ratio, job.duration, job.video_url, job.generation_id, job.submitted_at)
+        try:
+            video_sha = download_video(url)
+        except Exception as e:
+            logger.error("❌ ERROR downloading video for job %s: %s", key[:12], e)
+            video_sha = None
+        now = time.time()
+        allergies, ratio, duration, video_url, generation_id, submitted_at = record
+        # Cached before the job completes, so a later request for it finds the video.
+        store_video(key, allergies, ratio, duration, video_url, generation_id, now - submitted_at, video_sha)
+        with self._lock:
+            job = self._jobs[key]
+            job.status, job.video_sha, job.updated_at = COMPLETED, video_sha, now
+            self._save_locked(job)
+            polls = job.polls
+        logger.info("✅ Video job %s completed after %d polls.", key[:12], polls)
+
+    # ---- persistence ------------------------------------------------------
+
+    def _job_path(self, key):
+        return os.path.join(self.jobs_dir, key + ".json")
+
+    def _read_job(self, path):
+        """The job stored at path, or None when it is missing, unreadable or past its retention."""
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                job = VideoJob(**json.load(file))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("⚠️ Could not read video job '%s': %s", path, e)
+            return None
+        if job.done and job.updated_at < time.time() - JOB_RETENTION:
+            self._remove_job_file(job.key)
+            return None
+        job.next_poll_at = 0.0
+        if job.status == DOWNLOADING:
+            job.status = SUBMITTED  # Interrupted download: poll again, then download again.
+        return job
+
+    def _load(self):
+        self._migrate_legacy_file()
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning("⚠️ Could not read video jobs directory '%s': %s", self.jobs_dir, e)
+            return
+        for name in names:
+            if name.endswith(".json"):
+                job = self._read_job(os.path.join(self.jobs_dir, name))
+                if job is not None:
+                    self._jobs[job.key] = job
+        if any(not job.done for job in self._jobs.values()):
+            self._ensure_worker()
+
+    def _migrate_legacy_file(self):
+        """Splits the old single video_jobs.json (default location only) into per-job files."""
+        if self.jobs_dir != JOBS_DIR or not os.path.exists(LEGACY_JOBS_FILE):
+            return
+        try:
+            with open(LEGACY_JOBS_FILE, "r", encoding="utf-8") as file:
+                items = json.load(file)
+            for item in items:
+                path = self._job_path(item["key"])
+                if not os.path.exists(path):
+                    self._write_job(VideoJob(**item))
+            os.remove(LEGACY_JOBS_FILE)
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning("⚠️ Could not migrate video jobs file '%s': %s", LEGACY_JOBS_FILE, e)
+
+    def _write_job(self, job):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        path = self._job_path(job.key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(job), file)
+        os.replace(tmp_path, path)
+
+    def _remove_job_file(self, key):
+        try:
+            os.remove(self._job_path(key))
+        except OSError:
+            pass
+
+    def _save_locked(self, job):
+        """Persists one job (only its own file) and forgets finished jobs past their retention."""
+        cutoff = time.time() - JOB_RETENTION
+        for key in [key for key, other in self._jobs.items() if other.done and other.updated_at < cutoff]:
+            del self._jobs[key]
+            self._remove_job_file(key)
+        try:
+            self._write_job(job)
+        except OSError as e:
+            logger.warning("⚠️ Could not persist video job %s: %s", job.key[:12], e)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Process-wide VideoJobManager shared by every Streamlit session."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = VideoJobManager()
+    return _manager
@@ -1,36 +1,22 @@
-import os
 import requests
 import time
+import random
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
-# ✅ Load API Key
-VIDEO_API_KEY = os.getenv("VIDEO_API_KEY")
-if not VIDEO_API_KEY:
-    raise ValueError("❌ ERROR: VIDEO_API_KEY is not set. Please check your environment variables.")
+from services.clients import get_video_api_key
+from services.prompts import get_prompt
+from services.http_session import get_session
+from services.resilience import get_breaker, CircuitOpen
 
 # ✅ API Endpoint
 API_URL = "https://api.aimlapi.com/v2/generate/video/kling/generation"
 
-# ✅ Path to the Prompt File using a relative path
-PROMPT_FILE = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'prepare_video_prompt.txt')
-
-def load_prompt(filepath):
-    """Loads a prompt file and ensures it exists."""
-    if not os.path.exists(filepath):
-        logging.error("⚠️ ERROR: Prompt file '%s' not found.", filepath)
-        return ""
-    with open(filepath, 'r', encoding='utf-8') as file:
-        return file.read().strip()
-
 def generate_dynamic_prompt(user_allergies):
     """
     Generates a visual storytelling prompt based on user allergens.
     """
-    prompt_template = load_prompt(PROMPT_FILE)
-    if not prompt_template:
+    prompt_template = get_prompt("prepare_video_prompt")
+    if prompt_template is None:
         return "⚠️ Error: Video prompt file is missing or empty."
     
     allergy_story = (
@@ -41,23 +27,56 @@ def generate_dynamic_prompt(user_allergies):
         "A visual transition highlights emergency steps—EpiPen, seeking medical help. "
         "The video ends with prevention tips and an encouraging message about food safety."
     )
-    return prompt_template + "\n\n" + allergy_story.format(allergies=", ".join(user_allergies))
+    return prompt_template.text + "\n\n" + allergy_story.format(allergies=", ".join(user_allergies))
 
-def generate_videos(
-    user_allergies,
-    ratio="16:9",
-    duration=5, 
-    wait_time=30,
-    max_wait=1200
-):
+VIDEO_MODEL = "kling-video/v1.6/standard/text-to-video"
+# Circuit breaker name for the video generation endpoint.
+VIDEO_ENDPOINT = "video_generation"
+UNAVAILABLE_ERROR = "⚠️ The video service is unavailable right now. Please try again in a minute."
+
+# Provider statuses that mean the generation is still running.
+IN_PROGRESS_STATUSES = ("queued", "generating", "processing")
+
+
+def backoff_delay(attempt, base_delay=5.0, max_delay=60.0):
+    """Exponential backoff with equal jitter: half of min(max, base * 2^attempt) plus a random half."""
+    cap = min(max_delay, base_delay * (2 ** attempt))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+def _headers():
+    return {
+        "Authorization": f"Bearer {get_video_api_key()}",
+        "Content-Type": "application/json"
+    }
+
+
+def _request(method, **kwargs):
     """
-    Generates a high-quality allergy awareness video using AI animation.
-    :param user_allergies: List of user allergens.
-    :param ratio: Video aspect ratio (e.g., "16:9").
-    :param duration: Duration of the video in seconds.
-    :param wait_time: Time (in seconds) between polling attempts.
-    :param max_wait: Maximum total waiting time in seconds.
-    :return: Video URL if available, else an error message.
+    One call to the video API through its circuit breaker.
+    Raises CircuitOpen without calling the API while the breaker is open.
+    """
+    breaker = get_breaker(VIDEO_ENDPOINT)
+    breaker.check()
+    try:
+        response = get_session().request(method, API_URL, headers=_headers(), **kwargs)
+    except requests.exceptions.RequestException:
+        breaker.record_failure()
+        raise
+    except ValueError:  # VIDEO_API_KEY is missing: the API was never contacted
+        breaker.release()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def submit_generation(user_allergies, ratio="16:9", duration=5):
+    """
+    Starts one video generation.
+    :return: (generation_id, None) on success, (None, error message) otherwise.
     """
     prompt = generate_dynamic_prompt(user_allergies)
     if len(prompt) > 512:
@@ -65,81 +84,123 @@ def generate_videos(
         logging.debug("🔍 DEBUG: Prompt truncated to 512 characters.")
 
     payload = {
-        "model": "kling-video/v1.6/standard/text-to-video",
+        "model": VIDEO_MODEL,
         "prompt": prompt,
         "ratio": ratio,
         "duration": str(duration)
     }
 
-    headers = {
-        "Authorization": f"Bearer {VIDEO_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # Step 1: Send POST request
-    response = requests.post(API_URL, json=payload, headers=headers)
     try:
+        response = _request("POST", json=payload)
         response_data = response.json()
+    except CircuitOpen:
+        return None, UNAVAILABLE_ERROR
     except requests.exceptions.JSONDecodeError:
-        return "⚠️ Error: Failed to parse response JSON."
+        return None, "⚠️ Error: Failed to parse response JSON."
+    except requests.exceptions.RequestException as e:
+        logging.error("❌ ERROR: Generation request failed: %s", e)
+        return None, f"⚠️ Error: {e}"
+    except ValueError as e:  # VIDEO_API_KEY is missing
+        logging.error("❌ ERROR: %s", e)
+        return None, f"⚠️ Error: {e}"
 
     logging.info("🔍 DEBUG: Video Generation Response: %s", response_data)
     generation_id = response_data.get("id")
     if not generation_id:
         logging.error("⚠️ Error: No video ID returned from API.")
-        return "⚠️ Error: No video ID returned from API."
+        return None, "⚠️ Error: No video ID returned from API."
 
     logging.info("🎥 Video Generation Started. Generation ID: %s", generation_id)
+    return generation_id, None
 
-    # Step 2: Poll for the video to be ready
-    start_time = time.time()
-    while (time.time() - start_time) < max_wait:
-        logging.info("⏳ Waiting for video processing... (%d/%ds)", int(time.time() - start_time), max_wait)
-        time.sleep(wait_time)
-        video_url = fetch_video(generation_id)
-        if video_url and not video_url.startswith("⚠️"):
-            return video_url
-
-    return f"⚠️ Error: Video processing timed out. Generation ID: {generation_id}"
 
-def fetch_video(generation_id):
+def fetch_video_status(generation_id):
     """
-    Fetches the generated video URL from the AI API.
+    Polls one generation.
+    :return: dict with "status" (provider status, or "error"), "url" and "error".
     """
-    headers = {
-        "Authorization": f"Bearer {VIDEO_API_KEY}",
-        "Content-Type": "application/json"
-    }
     params = {"generation_id": generation_id}
 
     try:
-        response = requests.get(API_URL, params=params, headers=headers)
+        response = _request("GET", params=params)
         response.raise_for_status()
         data = response.json()
-        logging.info("🔍 DEBUG: Fetch Video Response: %s", data)
+    except CircuitOpen:
+        # Transient like any unreachable poll; by the next one a probe may have closed the circuit.
+        return {"status": "unreachable", "url": None, "error": UNAVAILABLE_ERROR}
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error("❌ ERROR: Fetch request failed: %s", e)
+        # Transient: the caller may poll again later.
+        return {"status": "unreachable", "url": None, "error": f"⚠️ Error: {e}"}
 
-        if data.get("status") == "error":
-            error_detail = data.get("error", {}).get("detail", "Unknown error")
-            logging.error("⚠️ Error in fetch_video: %s", error_detail)
-            return f"⚠️ Error: {error_detail}"
+    logging.info("🔍 DEBUG: Fetch Video Response: %s", data)
+    status = data.get("status", "")
 
-        if data.get("status") == "completed":
-            video_info = data.get("video", {})
-            video_url = video_info.get("url")
-            if video_url:
-                logging.info("✅ Video Ready! URL: %s", video_url)
-                return video_url
+    if status == "error":
+        error_detail = (data.get("error") or {}).get("detail", "Unknown error")
+        logging.error("⚠️ Error in fetch_video: %s", error_detail)
+        return {"status": "error", "url": None, "error": f"⚠️ Error: {error_detail}"}
 
-        status = data.get("status", "")
-        if status in ("queued", "generating", "processing"):
-            logging.info("⚠️ Video is still processing. Retrying soon...")
-            return "⚠️ Error: Video is still processing."
+    if status == "completed":
+        video_url = (data.get("video") or {}).get("url")
+        if video_url:
+            logging.info("✅ Video Ready! URL: %s", video_url)
+            return {"status": "completed", "url": video_url, "error": None}
+        return {"status": "error", "url": None, "error": "⚠️ Error: Completed without a video URL."}
 
-        return f"⚠️ Error: Unexpected status: {status}"
+    if status in IN_PROGRESS_STATUSES:
+        logging.info("⚠️ Video is still processing. Retrying soon...")
+        return {"status": status, "url": None, "error": None}
 
-    except requests.exceptions.RequestException as e:
-        logging.error("❌ ERROR: Fetch request failed: %s", e)
-        return f"⚠️ Error: {e}"
+    return {"status": "error", "url": None, "error": f"⚠️ Error: Unexpected status: {status}"}
+
+
+def generate_videos(
+    user_allergies,
+    ratio="16:9",
+    duration=5,
+    wait_time=30,
+    max_wait=1200
+):
+    """
+    Generates a high-quality allergy awareness video using AI animation.
+    Submits exactly one generation and polls it with exponential backoff.
+    :param user_allergies: List of user allergens.
+    :param ratio: Video aspect ratio (e.g., "16:9").
+    :param duration: Duration of the video in seconds.
+    :param wait_time: Upper bound (in seconds) between polling attempts.
+    :param max_wait: Maximum total waiting time in seconds.
+    :return: Video URL if available, else an error message.
+    """
+    generation_id, error = submit_generation(user_allergies, ratio, duration)
+    if error:
+        return error
+
+    start_time = time.time()
+    attempt = 0
+    while (time.time() - start_time) < max_wait:
+        logging.info("⏳ Waiting for video processing... (%d/%ds)", int(time.time() - start_time), max_wait)
+        time.sleep(backoff_delay(attempt, max_delay=wait_time))
+        attempt += 1
+        result = fetch_video_status(generation_id)
+        if result["status"] == "completed":
+            return result["url"]
+        if result["status"] == "error":
+            return result["error"]
+
+    return f"⚠️ Error: Video processing timed out. Generation ID: {generation_id}"
+
+
+def fetch_video(generation_id):
+    """
+    Fetches the generated video URL from the AI API.
+    """
+    result = fetch_video_status(generation_id)
+    if result["status"] == "completed":
+        return result["url"]
+    if result["status"] in IN_PROGRESS_STATUSES:
+        return "⚠️ Error: Video is still processing."
+    return result["error"]
 
 if __name__ == "__main__":
     # For testing purposes, call generate_videos with sample allergens.
@@ -0,0 +1,125 @@
+"""
+Local copies of generated videos.
+
+Provider URLs expire and every page render used to stream the video from the
+provider again. Finished videos are now downloaded once, in chunks straight
+to disk (never held in memory), and stored under their sha256 so identical
+files are kept once. They are served from here: by server.py (/v1/videos/<sha>,
+with Range support and long-lived cache headers) or by Streamlit from the path.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from services.cache import CACHE_DIR, DiskStore
+from services.http_session import get_session, CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+VIDEO_STORE_DIR = os.getenv("VIDEO_STORE_DIR", os.path.join(CACHE_DIR, "video_files"))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("VIDEO_DOWNLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_VIDEO_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(500 * 1024 * 1024)))
+# The oldest files are removed once the store grows past this.
+VIDEO_STORE_MAX_BYTES = int(os.getenv("VIDEO_STORE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Seconds without data before a download is abandoned.
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("VIDEO_DOWNLOAD_READ_TIMEOUT", "60"))
+# Base URL of the service that serves /v1/videos/<sha> (server.py); empty to serve files from Streamlit.
+VIDEO_PUBLIC_URL = os.getenv("VIDEO_PUBLIC_URL", "").rstrip("/")
+
+VIDEO_EXTENSIONS = {".mp4": "video/mp4", ".webm": "video/webm", ".mov": "video/quicktime"}
+DEFAULT_EXTENSION = ".mp4"
+
+# Only finished videos count; in-progress downloads (.part) are never evicted.
+_store = DiskStore(VIDEO_STORE_DIR, VIDEO_STORE_MAX_BYTES, tuple(VIDEO_EXTENSIONS), name="video_files")
+_stats_lock = threading.Lock()
+_stats = {"downloads": 0, "deduplicated": 0, "failed": 0, "bytes": 0}
+
+
+def _is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def _extension(url):
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return extension if extension in VIDEO_EXTENSIONS else DEFAULT_EXTENSION
+
+
+def video_path(sha):
+    """Path of the stored video with this sha256, or None."""
+    if not _is_sha256(sha):
+        return None
+    for extension in VIDEO_EXTENSIONS:
+        path = _store.path(sha, extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def content_type(path):
+    return VIDEO_EXTENSIONS.get(os.path.splitext(path)[1], "application/octet-stream")
+
+
+def download_video(url):
+    """
+    Streams the video at url to the store and returns its sha256, or None when
+    the download failed. A file whose content is already stored is discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = None
+    try:
+        os.makedirs(VIDEO_STORE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix="download-", suffix=".part", dir=VIDEO_STORE_DIR)
+        with os.fdopen(fd, "wb") as file, get_session().get(
+            url, stream=True, timeout=(CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_VIDEO_BYTES:
+                    raise ValueError(f"video is larger than {MAX_VIDEO_BYTES} bytes")
+                digest.update(chunk)
+                file.write(chunk)
+
+        sha = digest.hexdigest()
+        if video_path(sha):
+            with _stats_lock:
+                _stats["deduplicated"] += 1
+            logger.info("🎞️ Video %s already stored; discarding the duplicate download.", sha[:12])
+            return sha
+        _store.add(_store.path(sha, _extension(url)), tmp_path)
+        with _stats_lock:
+            _stats["downloads"] += 1
+            _stats["bytes"] += size
+        logger.info("✅ Stored video %s (%.1f MB).", sha[:12], size / 1e6)
+        return sha
+    except Exception as e:
+        with _stats_lock:
+            _stats["failed"] += 1
+        logger.error("❌ ERROR downloading video %s: %s", url, e)
+        return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def video_source(sha, fallback_url=None):
+    """
+    What to hand the player: the serving URL (VIDEO_PUBLIC_URL), else the local
+    path, else the provider URL while no local copy exists.
+    """
+    path = video_path(sha)
+    if path is None:
+        return fallback_url
+    if VIDEO_PUBLIC_URL:
+        return f"{VIDEO_PUBLIC_URL}/v1/videos/{sha}"
+    return path
+
+
+def video_store_stats():
+    """Downloads, de-duplicated downloads, failures and bytes stored by this process."""
+    with _stats_lock:
+        return dict(_stats)
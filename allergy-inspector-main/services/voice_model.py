@@ -1,7 +1,293 @@
 # services/voice_model.py
+"""
+Offline text-to-speech for ingredient alerts.
 
-def synthesize_voice(text):
-    # Placeholder for voice synthesis model integration
-    audio_output = f"voice_output_{text}.wav"  # Example filename for synthesized audio
-    # Your voice synthesis model integration goes here
-    return audio_output
\ No newline at end of file
+Speech comes from the espeak-ng (or espeak) command line, which writes a WAV
+to stdout while it is still synthesizing. Text is split into phrases
+("Peanut sauce." / "Contains Nuts." / "High allergy risk."); each phrase is
+synthesized once per voice and kept in a persistent on-disk cache, so
+recurring alert sentences are reused instead of re-synthesized.
+
+stream_voice() yields one WAV stream in chunks: cached phrases immediately,
+new ones while espeak is still producing them. server.py serves it at
+/v1/voice, and voice_url() points a browser player there (VOICE_PUBLIC_URL),
+so playback starts with the first phrase. synthesize_voice() returns the
+whole WAV, for apps without the service. Without an engine installed both
+log an error and return nothing.
+"""
+import os
+import re
+import time
+import queue
+import shutil
+import struct
+import logging
+import threading
+import subprocess
+from collections import deque
+from urllib.parse import urlencode
+
+from services.cache import CACHE_DIR, DiskStore, make_key
+
+logger = logging.getLogger(__name__)
+
+VOICE_ENGINE = os.getenv("VOICE_ENGINE", "")
+DEFAULT_VOICE = os.getenv("VOICE_NAME", "en-us")
+VOICE_SPEED = int(os.getenv("VOICE_SPEED", "165"))  # words per minute
+VOICE_CACHE_DIR = os.getenv("VOICE_CACHE_DIR", os.path.join(CACHE_DIR, "voice"))
+VOICE_CACHE_MAX_BYTES = int(os.getenv("VOICE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Bytes read from the engine at a time while streaming.
+STREAM_CHUNK_BYTES = int(os.getenv("VOICE_STREAM_CHUNK_BYTES", "4096"))
+SYNTHESIS_TIMEOUT = float(os.getenv("VOICE_SYNTHESIS_TIMEOUT", "30"))
+# Seconds between checks of a stream's stop event while the engine is silent.
+STOP_POLL_SECONDS = 0.1
+# Browser-reachable base URL of the service that streams /v1/voice (server.py); empty to synthesize in the app.
+VOICE_PUBLIC_URL = os.getenv("VOICE_PUBLIC_URL", os.getenv("VIDEO_PUBLIC_URL", "")).rstrip("/")
+
+# espeak voice names ("en-us", "en+f3"); anything else could be read as an option.
+VOICE_NAME_PATTERN = re.compile(r"[A-Za-z][\w+-]*")
+# Streamed WAVs do not know their length up front; players accept the maximum.
+UNKNOWN_LENGTH = 0xFFFFFFFF
+
+_store = DiskStore(VOICE_CACHE_DIR, VOICE_CACHE_MAX_BYTES, (".wav",), name="voice")
+_stats_lock = threading.Lock()
+_stats = {"phrases": 0, "hits": 0, "misses": 0}
+_first_audio = deque(maxlen=500)
+
+
+def find_engine():
+    """Path of the speech engine, or None when neither espeak-ng nor espeak is installed."""
+    if VOICE_ENGINE:
+        return shutil.which(VOICE_ENGINE)
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+
+def voice_available():
+    """Whether alerts can be read aloud: through the voice service, or with a local engine."""
+    return bool(VOICE_PUBLIC_URL) or find_engine() is not None
+
+
+def voice_url(text, voice=DEFAULT_VOICE):
+    """URL a player can stream the text's WAV from while it is synthesized, or None without VOICE_PUBLIC_URL."""
+    if not VOICE_PUBLIC_URL:
+        return None
+    return f"{VOICE_PUBLIC_URL}/v1/voice?" + urlencode({"text": text, "voice": voice})
+
+
+def split_phrases(text):
+    """Sentences (and lines) of the text, whitespace-normalized; the unit of caching."""
+    phrases = re.split(r"(?<=[.!?])\s+|\n+", text)
+    return [" ".join(phrase.split()) for phrase in phrases if phrase.strip()]
+
+
+def alert_text(cards):
+    """What to read out for the cards that are not safe: name, then the assessment."""
+    lines = []
+    for card in cards:
+        if card["status"].strip().lower() != "safe":
+            lines.append(f'{card["ingredient"].strip().capitalize()}.\n{card["description"].strip()}')
+    return "\n".join(lines)
+
+
+def _phrase_key(phrase, voice):
+    return make_key(phrase.lower(), voice, str(VOICE_SPEED))
+
+
+def _phrase_path(key):
+    return _store.path(key, ".wav")
+
+
+def _parse_wav(data):
+    """(fmt chunk body, offset of the PCM samples) of a WAV, or None while the header is incomplete."""
+    if len(data) < 12:
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("engine output is not a WAV stream")
+    offset, fmt = 12, None
+    while offset + 8 <= len(data):
+        chunk_id, size = data[offset:offset + 4], struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        if chunk_id == b"data":
+            return fmt, offset + 8
+        if offset + 8 + size > len(data):
+            return None
+        if chunk_id == b"fmt ":
+            fmt = data[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def _wav_header(fmt, data_size=UNKNOWN_LENGTH):
+    riff_size = UNKNOWN_LENGTH if data_size == UNKNOWN_LENGTH else 4 + 8 + len(fmt) + 8 + data_size
+    return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + \
+        b"data" + struct.pack("<I", data_size)
+
+
+def _load_phrase(key):
+    """(fmt, pcm) of a cached phrase, or None."""
+    try:
+        with open(_phrase_path(key), "rb") as file:
+            data = file.read()
+        fmt, offset = _parse_wav(data)
+        _store.touch(_phrase_path(key))  # Recently used phrases survive eviction.
+        return fmt, data[offset:]
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def _store_phrase(key, fmt, pcm):
+    try:
+        _store.write(_phrase_path(key), _wav_header(fmt, len(pcm)) + pcm)
+    except OSError as e:
+        logger.warning("⚠️ Could not cache voice phrase: %s", e)
+
+
+def _read_output(stream, chunks):
+    """Reader thread: puts each chunk of the engine's stdout on the queue, then b"" at EOF. Closes stdout."""
+    try:
+        while True:
+            chunk = stream.read1(STREAM_CHUNK_BYTES)
+            chunks.put(chunk)
+            if not chunk:
+                return
+    except (OSError, ValueError) as e:
+        logger.warning("⚠️ Could not read speech engine output: %s", e)
+        chunks.put(b"")
+    finally:
+        stream.close()
+
+
+def _synthesize_stream(engine, phrase, voice, stop=None):
+    """
+    Yields fmt once, then PCM chunks as the engine produces them. Stdout is read
+    on a separate thread, so an engine that hangs without writing still fails
+    with TimeoutError after SYNTHESIS_TIMEOUT (and is killed). Setting the
+    `stop` event (threading.Event) ends the stream early, also while waiting.
+    """
+    deadline = time.monotonic() + SYNTHESIS_TIMEOUT
+    process = subprocess.Popen(
+        [engine, "-v", voice, "-s", str(VOICE_SPEED), "--stdout", "--stdin"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    chunks = queue.Queue()
+    reader = threading.Thread(target=_read_output, args=(process.stdout, chunks), name="voice-reader", daemon=True)
+    reader.start()
+    try:
+        process.stdin.write(phrase.encode("utf-8"))
+        process.stdin.close()
+        buffer, header = b"", None
+        while True:
+            if stop is not None and stop.is_set():
+                return
+            remaining = deadline - time.monotonic()
+            try:
+                chunk = chunks.get(timeout=max(0.0, min(remaining, STOP_POLL_SECONDS)))
+            except queue.Empty:
+                if remaining <= STOP_POLL_SECONDS:
+                    raise TimeoutError(f"speech synthesis took longer than {SYNTHESIS_TIMEOUT:g}s") from None
+                continue
+            if not chunk:
+                break
+            if header is None:
+                buffer += chunk
+                header = _parse_wav(buffer)
+                if header is None:
+                    continue
+                fmt, offset = header
+                yield fmt
+                chunk = buffer[offset:]
+            if chunk:
+                yield chunk
+        try:
+            returncode = process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"speech synthesis took longer than {SYNTHESIS_TIMEOUT:g}s") from None
+        if returncode != 0:
+            raise RuntimeError(process.stderr.read().decode("utf-8", "replace").strip() or "speech engine failed")
+        if header is None:
+            raise ValueError("engine produced no audio")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stderr.close()
+
+
+def stream_voice(text, voice=DEFAULT_VOICE, stop=None):
+    """
+    Yields a WAV stream (header first, then PCM) for the text, phrase by phrase.
+    Records time-to-first-audio and phrase cache hits. Setting `stop` (a
+    threading.Event, e.g. when the listener disconnected) ends it and kills
+    the engine, even while a read is waiting on it.
+    """
+    if not VOICE_NAME_PATTERN.fullmatch(voice or ""):
+        logger.error("❌ ERROR: Invalid voice name %r.", voice)
+        return
+    phrases = split_phrases(text)
+    engine = find_engine()
+    start = time.perf_counter()
+    header_sent = False
+    for phrase in phrases:
+        if stop is not None and stop.is_set():
+            return
+        key = _phrase_key(phrase, voice)
+        cached = _load_phrase(key)
+        with _stats_lock:
+            _stats["phrases"] += 1
+            _stats["hits" if cached else "misses"] += 1
+        if cached:
+            fmt, pcm = cached
+            chunks = [pcm]
+        elif engine is None:
+            logger.error("❌ ERROR: No speech engine found; install espeak-ng (or set VOICE_ENGINE).")
+            return
+        else:
+            try:
+                stream = _synthesize_stream(engine, phrase, voice, stop)
+                fmt = next(stream)
+            except (OSError, RuntimeError, ValueError, TimeoutError, StopIteration) as e:
+                logger.error("❌ ERROR synthesizing %r: %s", phrase, e)
+                continue
+            chunks = stream
+
+        pcm_parts = []
+        try:
+            for chunk in chunks:
+                if not header_sent:
+                    with _stats_lock:
+                        _first_audio.append(time.perf_counter() - start)
+                    yield _wav_header(fmt)
+                    header_sent = True
+                pcm_parts.append(chunk)
+                yield chunk
+        except (OSError, RuntimeError, ValueError, TimeoutError) as e:
+            logger.error("❌ ERROR synthesizing %r: %s", phrase, e)
+            continue
+        finally:
+            if not cached:
+                chunks.close()  # Kills the engine when the listener went away mid-phrase.
+        if stop is not None and stop.is_set():
+            return  # A cut-off phrase is not cached.
+        if not cached:
+            _store_phrase(key, fmt, b"".join(pcm_parts))
+
+
+def synthesize_voice(text, voice=DEFAULT_VOICE):
+    """The whole WAV for the text as bytes (for st.audio), or None when nothing could be synthesized."""
+    chunks = list(stream_voice(text, voice))
+    if not chunks:
+        return None
+    header, pcm = chunks[0], b"".join(chunks[1:])
+    fmt, _ = _parse_wav(header)
+    return _wav_header(fmt, len(pcm)) + pcm
+
+
+def voice_stats():
+    """Phrase cache hit rate and time-to-first-audio (seconds) in this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+        first_audio = sorted(_first_audio)
+    stats["hit_rate"] = stats["hits"] / stats["phrases"] if stats["phrases"] else 0.0
+    if first_audio:
+        stats["first_audio_p50"] = first_audio[len(first_audio) // 2]
+        stats["first_audio_p95"] = first_audio[min(len(first_audio) - 1, int(0.95 * len(first_audio)))]
+    return stats
@@ -2,20 +2,20 @@ import os
 import streamlit as st
 import time
 import logging
-import threading
 from streamlit_chat import message
 
-from services.multi_modal import (
-    get_ingredients_model_response,
-    get_crossing_data_model_response,
-    get_allergy_symptoms_model_response  # new import
-)
-from services.video_model import generate_videos
-from utils.media_handler import image_to_base64
+from services import startup, remote
+from services.pipeline import iter_analysis, iter_batch_analysis, ingredient_key
+from services.video_jobs import get_job_manager, COMPLETED, TERMINAL_STATUSES
+from services.video_cache import video_cache_stats
+from services.video_store import video_source
+from services.voice_model import synthesize_voice, alert_text, voice_available, voice_url
+from utils.media_handler import thumbnail_html
+from utils.session_state import media_store
 from ui.sidebar import sidebar_setup
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Logging and key checks happen once per process, not on every rerun.
+startup()
 
 ##################################################
 # Helper: Safe Rerun Function (notification removed)
@@ -46,141 +46,241 @@ def format_ingredient_list(ingredients):
     # Header on one line and each ingredient on its own line.
     return "🔍 Detected Ingredients:\n" + "\n".join(cleaned)
 
-# Cache the allergy symptoms per allergen to avoid repeated API calls.
-@st.cache_data(show_spinner=False)
-def get_allergy_symptoms(allergen: str) -> str:
-    return get_allergy_symptoms_model_response(allergen)
+def render_ingredient_card(slot, item, symptoms=None, sources=None):
+    """
+    Renders one card into an st.empty() slot, so it can be redrawn once the
+    (batched, dangerous/alert only) symptoms arrive. In batch mode, sources
+    lists the images the ingredient was found in.
+    """
+    status = item["status"].lower()
+    color = "#ff6961" if status == "dangerous" else "#FFD700" if status == "alert" else "#77DD77"
+    reaction_html = (
+        f'<p style="margin-top: 5px; font-size: 0.8em; font-style: italic;">Allergy Reaction: {symptoms}</p>'
+        if symptoms else ""
+    )
+    sources_html = (
+        f'<p style="margin-top: 5px; font-size: 0.8em;">Found in: {", ".join(sources)}</p>'
+        if sources else ""
+    )
 
-def display_ingredient_cards(ingredient_data_list):
-    for item in ingredient_data_list:
-        status = item["status"].lower()
-        color = "#ff6961" if status == "dangerous" else "#FFD700" if status == "alert" else "#77DD77"
-        allergen = item["ingredient"].lower()
-        # Retrieve dynamic allergy symptoms
-        symptoms = get_allergy_symptoms(allergen)
-        
-        card_html = f"""
-        <div style="border: 2px solid {color}; 
-                    border-radius: 10px; 
-                    width: 400px; 
-                    padding: 10px; 
-                    margin-bottom: 10px; 
-                    background-color: {color}20;">
-            <div style="display: flex; align-items: center; gap: 8px;">
-                <span style="font-size: 1.5em;">{item["emoji"]}</span>
-                <h4 style="margin: 0; color: {color}; text-transform: capitalize;">
-                    {item["ingredient"]}
-                </h4>
-            </div>
-            <span style="color: {color}; font-weight: bold; text-transform: uppercase;">
-                {item["status"]}
-            </span>
-            <p style="margin-top: 5px; font-size: 0.9em;">
-                {item["description"]}
-            </p>
-            <p style="margin-top: 5px; font-size: 0.8em; font-style: italic;">
-                Allergy Reaction: {symptoms}
-            </p>
+    card_html = f"""
+    <div style="border: 2px solid {color}; 
+                border-radius: 10px; 
+                width: 400px; 
+                padding: 10px; 
+                margin-bottom: 10px; 
+                background-color: {color}20;">
+        <div style="display: flex; align-items: center; gap: 8px;">
+            <span style="font-size: 1.5em;">{item["emoji"]}</span>
+            <h4 style="margin: 0; color: {color}; text-transform: capitalize;">
+                {item["ingredient"]}
+            </h4>
         </div>
-        """
-        st.markdown(card_html, unsafe_allow_html=True)
-
-def parse_ingredient_assessment(bracket_str):
-    try:
-        parts = bracket_str.strip("[]").split(", ")
-        return {
-            "status": parts[0],
-            "emoji": parts[1],
-            "ingredient": parts[2],
-            "description": parts[3].strip('"')
-        }
-    except Exception as e:
-        logging.error("⚠️ ERROR parsing ingredient assessment: %s", e)
-        return None
-
-##################################################
-# Background Video Generation Thread
-##################################################
-class VideoGenerationThread(threading.Thread):
+        <span style="color: {color}; font-weight: bold; text-transform: uppercase;">
+            {item["status"]}
+        </span>
+        <p style="margin-top: 5px; font-size: 0.9em;">
+            {item["description"]}
+        </p>
+        {reaction_html}
+        {sources_html}
+    </div>
     """
-    Runs generate_videos(...) in a separate thread so the UI doesn't freeze.
-    """
-    def __init__(self, user_allergies, user_concern=""):
-        super().__init__()
-        self.user_allergies = user_allergies
-        self.user_concern = user_concern
-        self.video_url = None
-        self.keep_checking = True
+    slot.markdown(card_html, unsafe_allow_html=True)
+
+# Plain names for the steps AnalysisResult.degraded can list.
+DEGRADED_STEPS = {
+    "ingredients": "ingredient detection",
+    "crossing": "the allergy check",
+    "fused": "the analysis",
+    "symptoms": "the reaction descriptions",
+    "analysis_service": "the analysis service",
+}
 
-    def run(self):
-        try:
-            logging.info("🎥 Starting background video generation ...")
-            self.video_url = generate_videos(self.user_allergies)
-            retries = 0
-            while (not self.video_url or self.video_url.startswith("⚠️")) and self.keep_checking:
-                logging.warning("🚨 Video not ready yet. Retrying... (Attempt %d)", retries + 1)
-                time.sleep(30)
-                self.video_url = generate_videos(self.user_allergies)
-                retries += 1
-                if retries > 20:
-                    logging.error("❌ Maximum retries reached. Video generation failed.")
-                    self.video_url = "⚠️ Video generation failed after multiple attempts."
-                    break
-            logging.info("🎞️ Video generation finished: %s", self.video_url)
-        except Exception as e:
-            logging.error("⚠️ Error in generate_videos thread: %s", e)
-            self.video_url = f"⚠️ Error: {e}"
+def show_degraded_notice(degraded):
+    """Says plainly that the results are incomplete when the model could not be reached."""
+    steps = ", ".join(DEGRADED_STEPS.get(step, step) for step in degraded)
+    st.warning(
+        f"⚠️ Offline mode: {steps} could not reach the AI service, so these results only use "
+        "saved answers and our built-in allergen list. Ingredients marked ❔ were not checked. "
+        "Please try again in a minute before relying on them."
+    )
 
 ##################################################
 # Allergy Check & Video Generation
 ##################################################
-def check_allergies(ingredients_list):
+def check_allergies(events, ingredients_list):
+    """
+    Renders the remaining analysis events: each card as soon as its line is
+    streamed, then fills in the symptoms once the batch lookup completes.
+    """
     try:
         user_allergies = st.session_state.get("user_allergies", [])
         if user_allergies:
             user_message(f"And I'm also allergic to: {', '.join(user_allergies)}")
             bot_message("Let's see how they interact...")
-            bracketed = get_crossing_data_model_response(ingredients_list, user_allergies)
-            card_data = [parse_ingredient_assessment(bstr) for bstr in bracketed if parse_ingredient_assessment(bstr)]
-            if card_data:
-                bot_message("Here are the findings for each ingredient:")
-                display_ingredient_cards(card_data)
-            else:
-                bot_message("No recognized risks found.")
+            rendered = {}  # ingredient key -> (slot, card); a later card for the same key replaces it
+            degraded = []
+            for event, payload in events:
+                if event == "card":
+                    if not rendered:
+                        bot_message("Here are the findings for each ingredient:")
+                    key = ingredient_key(payload["ingredient"])
+                    slot = rendered[key][0] if key in rendered else st.empty()
+                    render_ingredient_card(slot, payload)
+                    rendered[key] = (slot, payload)
+                elif event == "symptoms":
+                    for slot, card in rendered.values():
+                        render_ingredient_card(slot, card, payload.get(card["ingredient"].lower()))
+                elif event == "done":
+                    degraded = payload.degraded
+            if degraded:
+                show_degraded_notice(degraded)
+            if not rendered:
+                # Never an all-clear when the check itself could not run.
+                bot_message("I couldn't check this meal right now." if degraded else "No recognized risks found.")
+            alerts = alert_text([card for _, card in rendered.values()])
+            if alerts and voice_available() and st.button("🔊 Read the alerts aloud"):
+                # Streamed from the voice service while it synthesizes, when there is one.
+                audio = voice_url(alerts) or synthesize_voice(alerts)
+                if audio:
+                    st.audio(audio, format="audio/wav")
+                else:
+                    st.warning("Voice playback is not available right now.")
             user_concern = st.text_area("Describe your allergy concerns (optional):", placeholder="e.g., I get severe reactions to peanuts.")
             if st.button("🎥 Make a Video About My Allergies"):
                 process_video_generation(user_allergies, user_concern)
+            if st.session_state.get("video_job"):
+                show_video_job(st.session_state["video_job"])
         else:
+            events.close()
             bot_message(format_ingredient_list(ingredients_list))
     except Exception as e:
         logging.error("⚠️ Error in check_allergies(): %s", e)
         st.error("An error occurred while checking allergies.")
 
+# Progress shown for each job status; provider statuses are queued/generating/processing.
+VIDEO_PROGRESS = {
+    "pending": (5, "Waiting for a free generation slot..."),
+    "submitted": (15, "Video request accepted..."),
+    "queued": (25, "Your video is queued at the provider..."),
+    "generating": (60, "Animating your video..."),
+    "processing": (85, "Finishing touches..."),
+    "downloading": (95, "Saving your video..."),
+}
+
 def process_video_generation(user_allergies, user_concern):
+    """
+    Hands the request to the job manager and returns immediately; the page
+    then follows the job through show_video_job's periodic refresh.
+    """
     if not user_concern:
         user_concern = "General allergy information."
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    status_text.text("Processing your video...")
-    thread = VideoGenerationThread(user_allergies, user_concern)
-    thread.start()
-    i = 0
-    while thread.is_alive():
-        i = (i + 1) % 100
-        progress_bar.progress(i + 1)
-        time.sleep(1.5)
-    progress_bar.progress(100)
-    video_url = thread.video_url
-    if video_url and not video_url.startswith("⚠️"):
-        status_text.text("✅ Video is ready!")
-        st.video(video_url)
+    # The job manager submits once per distinct request and polls in its own thread
+    st.session_state["video_job"] = get_job_manager().submit(user_allergies)
+
+def show_video_job(job_key):
+    job = get_job_manager().get(job_key)
+    if job is None:
+        st.session_state.pop("video_job", None)
+        return
+    if job["status"] in TERMINAL_STATUSES:
+        render_finished_video(job)
     else:
-        status_text.text("")
-        st.warning(video_url or "Video generation failed.")
+        video_progress(job_key)
+
+@st.fragment(run_every=3)
+def video_progress(job_key):
+    """Re-runs on its own every few seconds without re-running the rest of the page."""
+    job = get_job_manager().get(job_key)
+    if job is None or job["status"] in TERMINAL_STATUSES:
+        # Switch the whole page over to the finished video.
+        st.rerun()
+    percent, label = VIDEO_PROGRESS.get(job["status"], (50, "Processing your video..."))
+    elapsed = int(time.time() - job["created_at"])
+    st.progress(percent, text=f"{label} ({elapsed}s)")
+
+def render_finished_video(job):
+    if job["status"] == COMPLETED:
+        st.success("✅ Video is ready!")
+        if job["cached"]:
+            stats = video_cache_stats()
+            st.caption(
+                f"⚡ Served from the video cache (hit rate {stats['hit_rate']:.0%}, "
+                f"{stats['saved_seconds'] / 60:.1f} min of generation saved)."
+            )
+        st.video(video_source(job["video_sha"], job["video_url"]))
+    else:
+        st.warning(job["error"] or "Video generation failed.")
 
 ##################################################
 # Media Input Section with Two Buttons & Chat Integration
 ##################################################
+def analyze_meal_image(image_bytes):
+    """Streams the concurrent analysis pipeline and renders results as they arrive."""
+    bot_message("Analyzing your meal...")
+    # With ANALYSIS_API_URL set, the analysis service does the work instead of this process
+    analyze = remote.iter_analysis if remote.remote_enabled() else iter_analysis
+    events = analyze(image_bytes, st.session_state.get("user_allergies", []))
+    with st.spinner("Detecting ingredients..."):
+        _, ingredients_list = next(events)
+    bot_message(format_ingredient_list(ingredients_list))
+    check_allergies(events, ingredients_list)
+
+# Batch report order: most severe first.
+STATUS_ORDER = {"dangerous": 0, "alert": 1, "safe": 2}
+
+def analyze_meal_batch(uploaded_files):
+    """Analyzes many images at once and renders one combined report."""
+    user_allergies = st.session_state.get("user_allergies", [])
+    images = [(file.name, file.getvalue()) for file in uploaded_files]
+    bot_message(f"Analyzing {len(images)} images together...")
+    progress = st.progress(0, text="Detecting ingredients...")
+    report = None
+    analyze = remote.iter_batch_analysis if remote.remote_enabled() else iter_batch_analysis
+    for done, (event, payload) in enumerate(analyze(images, user_allergies), start=1):
+        if event == "image":
+            progress.progress(done / len(images), text=f"Detected ingredients in {payload.name} ({done}/{len(images)})")
+        elif event == "done":
+            report = payload
+    progress.empty()
+    if report is None:
+        st.error("An error occurred while analyzing the images.")
+        return
+
+    distinct = len(report.sources)
+    total = sum(len(item.ingredients) for item in report.items)
+    bot_message(f"Found {distinct} distinct ingredients ({total} in total) across {len(report.items)} images.")
+    for item in report.items:
+        flagged = [card for card in item.cards if card["status"].lower() != "safe"]
+        with st.expander(f"{item.name}: {len(item.ingredients)} ingredients, {len(flagged)} flagged"):
+            st.write(", ".join(item.ingredients) or "No ingredients detected.")
+    if report.degraded:
+        show_degraded_notice(report.degraded)
+    if not user_allergies:
+        return
+    if not report.cards:
+        bot_message("I couldn't check these meals right now." if report.degraded else "No recognized risks found.")
+        return
+    bot_message("Here are the findings for each ingredient:")
+    for card in sorted(report.cards, key=lambda card: STATUS_ORDER.get(card["status"].lower(), 1)):
+        render_ingredient_card(
+            st.empty(), card,
+            report.symptoms.get(card["ingredient"].lower()),
+            report.sources.get(ingredient_key(card["ingredient"]))
+        )
+
+def show_meal_image(image_file):
+    """
+    Keeps the photo in this session's bounded store, shows its thumbnail
+    aligned to the right and analyzes it. Session state only holds the handle.
+    """
+    store = media_store()
+    handle = store.add_image(image_file.getvalue(), image_file.name)
+    st.session_state["meal_image"] = handle
+    st.markdown(f'<div style="text-align: right;">{thumbnail_html(handle)}</div>', unsafe_allow_html=True)
+    analyze_meal_image(store.read(handle))
+
 def media_input():
     st.subheader("Select Input Method")
     # Option to change input method if already selected
@@ -190,44 +290,36 @@ def media_input():
             safe_rerun()
     # If no input method is selected, show the two buttons
     if "input_method" not in st.session_state:
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         if col1.button("📷 Take a Picture"):
             st.session_state["input_method"] = "camera"
             safe_rerun()
         if col2.button("📁 Upload"):
             st.session_state["input_method"] = "upload"
             safe_rerun()
+        if col3.button("🗂️ Batch"):
+            st.session_state["input_method"] = "batch"
+            safe_rerun()
     # Display the corresponding input widget
     if st.session_state.get("input_method") == "camera":
         st.subheader("Take a Picture")
         img_data = st.camera_input("Take a picture of your meal")
         if img_data is not None:
-            b64_img = image_to_base64(img_data.getvalue())
-            # Display the image aligned to the right as a thumbnail
-            st.markdown(
-                f'<div style="text-align: right;"><img src="data:image/png;base64,{b64_img}" width="100" style="border-radius:10px;" /></div>',
-                unsafe_allow_html=True
-            )
-            bot_message("Analyzing your meal...")
-            with st.spinner("Detecting ingredients..."):
-                ingredients_list = get_ingredients_model_response(img_data.getvalue())
-            bot_message(format_ingredient_list(ingredients_list))
-            check_allergies(ingredients_list)
+            show_meal_image(img_data)
     elif st.session_state.get("input_method") == "upload":
         st.subheader("Upload Meal Image")
         uploaded_file = st.file_uploader("Choose an image file", type=["jpg", "jpeg", "png"])
         if uploaded_file:
-            b64_img = image_to_base64(uploaded_file.getvalue())
-            # Display the image aligned to the right as a thumbnail
-            st.markdown(
-                f'<div style="text-align: right;"><img src="data:image/png;base64,{b64_img}" width="100" style="border-radius:10px;" /></div>',
-                unsafe_allow_html=True
-            )
-            bot_message("Analyzing your meal...")
-            with st.spinner("Detecting ingredients..."):
-                ingredients_list = get_ingredients_model_response(uploaded_file.getvalue())
-            bot_message(format_ingredient_list(ingredients_list))
-            check_allergies(ingredients_list)
+            show_meal_image(uploaded_file)
+    elif st.session_state.get("input_method") == "batch":
+        st.subheader("Upload Several Images")
+        uploaded_files = st.file_uploader(
+            "Choose images of every dish or menu page",
+            type=["jpg", "jpeg", "png"],
+            accept_multiple_files=True
+        )
+        if uploaded_files:
+            analyze_meal_batch(uploaded_files)
 
 ##################################################
 # Main Application
@@ -0,0 +1,82 @@
+import pytest
+
+from services.allergen_kb import assess_ingredient, may_affect, resolve_locally, MODIFIER_TOKENS
+
+# Composite and prepared foods whose recipe usually carries the allergen even
+# though no word in the name belongs to its family. They must reach the model.
+UNDECIDABLE = [
+    ("croissant", "Dairy"), ("brioche", "Dairy"), ("cake", "Dairy"), ("cookie", "Dairy"),
+    ("mashed potatoes", "Dairy"), ("naan", "Dairy"),
+    ("cake", "Eggs"), ("pasta", "Eggs"), ("ramen", "Eggs"), ("fried rice", "Eggs"),
+    ("fried rice", "Soy"), ("fried rice", "Dairy"),
+    ("fried chicken", "Gluten"), ("crispy chicken", "Gluten"), ("fried fish", "Gluten"),
+    ("dried mango", "Sulfites"), ("tempura", "Seafood"), ("miso", "Gluten"),
+    ("rice", "Dairy"), ("chicken", "Nuts"), ("granola", "Nuts"), ("carrot", "Celery"),
+]
+
+# Names carrying an allergen's word without the allergen (or claiming it is absent).
+LOOKALIKE = [
+    "gluten-free bread", "dairy-free cheese", "egg-free pasta", "peanut-free cookie", "vegan mayo",
+    "rice cake", "butter lettuce", "cream of tartar", "dairy free cheese", "coconut cream",
+]
+ALLERGIES = ("Nuts", "Dairy", "Gluten", "Eggs")
+
+DANGEROUS = [
+    ("cheddar cheese", "Dairy"), ("croissant", "Gluten"), ("fried shrimp", "Seafood"),
+    ("peanut butter", "Nuts"), ("scrambled eggs", "Eggs"), ("soy sauce", "Soy"),
+    ("soy sauce", "Gluten"), ("red wine", "Sulfites"), ("brioche", "Eggs"),
+]
+
+
+@pytest.mark.parametrize("ingredient, allergy", UNDECIDABLE)
+def test_never_clears_an_ingredient(ingredient, allergy):
+    assert assess_ingredient(ingredient, (allergy,)) is None
+
+
+@pytest.mark.parametrize("ingredient", LOOKALIKE)
+def test_lookalikes_are_left_to_the_model(ingredient):
+    assert assess_ingredient(ingredient, ALLERGIES) is None
+
+
+@pytest.mark.parametrize("ingredient, allergy", DANGEROUS)
+def test_flags_definite_allergens(ingredient, allergy):
+    record = assess_ingredient(ingredient, (allergy,))
+    assert record is not None
+    assert record.startswith("[dangerous, ")
+    assert allergy in record
+
+
+def test_specific_food_allergy():
+    assert assess_ingredient("roasted peanuts", ("peanuts",)).startswith("[dangerous, ")
+    assert assess_ingredient("almonds", ("peanuts",)) is None
+
+
+def test_preparation_words_that_add_allergens_are_not_modifiers():
+    for word in ("fried", "crispy", "dried", "mashed"):
+        assert word not in MODIFIER_TOKENS
+
+
+def test_resolve_locally_only_returns_dangerous_records():
+    ingredients = ["croissant", "fried rice", "shrimp", "lettuce"]
+    records = resolve_locally(ingredients, ["Dairy", "Eggs", "Seafood"])
+    assert records[0] is None and records[1] is None and records[3] is None
+    assert records[2].startswith("[dangerous, ")
+
+
+@pytest.mark.parametrize("ingredient, allergies", [
+    ("peanut sauce", ["Nuts"]),          # contains
+    ("granola", ["Nuts"]),               # may contain
+    ("carrot", ["Celery"]),              # related
+    ("strawberry jam", ["strawberries"]),
+])
+def test_may_affect_links_ingredients_to_allergies(ingredient, allergies):
+    assert may_affect(ingredient, allergies)
+
+
+@pytest.mark.parametrize("ingredient, allergies", [
+    ("rice", ["Nuts"]),
+    ("pad thai", ["Dairy"]),
+    ("granola", ["Seafood"]),
+])
+def test_may_affect_ignores_unrelated_ingredients(ingredient, allergies):
+    assert not may_affect(ingredient, allergies)
@@ -0,0 +1,65 @@
+import openai
+
+from services.resilience import (
+    CircuitBreaker, DeadlineExceeded, chat_breaker, reset_breakers, provider_available, CLOSED, OPEN,
+)
+
+REQUEST = None
+
+
+class StatusError(Exception):
+    """Stands in for openai.APIStatusError: the breaker only reads status_code."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def server_error(status=503):
+    return StatusError(status)
+
+
+def test_provider_failures_open_the_breaker():
+    breaker = CircuitBreaker("test", failures=3, reset_seconds=60)
+    for error in (server_error(), openai.APIConnectionError(request=REQUEST), server_error(429)):
+        assert breaker.allow()
+        breaker.record(error)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_timeouts_count_as_failures():
+    breaker = CircuitBreaker("test", failures=2, reset_seconds=60)
+    for error in (DeadlineExceeded("late"), openai.APITimeoutError(request=REQUEST)):
+        assert breaker.allow()
+        breaker.record(error)
+    assert breaker.state == OPEN
+
+
+def test_a_probe_that_times_out_opens_the_breaker_again():
+    breaker = CircuitBreaker("test", failures=1, reset_seconds=0)
+    breaker.record(DeadlineExceeded("late"))
+    assert breaker.allow()  # Half-open: the probe goes out.
+    breaker.record(DeadlineExceeded("late"))
+    breaker.reset_seconds = 60
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_client_errors_do_not_count():
+    breaker = CircuitBreaker("test", failures=2, reset_seconds=60)
+    for error in (server_error(400), ValueError("bug"), server_error(404), ValueError("bug")):
+        assert breaker.allow()
+        breaker.record(error)
+    assert breaker.state == CLOSED
+
+
+def test_each_operation_has_its_own_breaker():
+    reset_breakers()
+    ingredients = chat_breaker("ingredients")
+    for _ in range(ingredients.failures):
+        ingredients.record(server_error())
+    assert not provider_available("ingredients")
+    assert provider_available("crossing")
+    reset_breakers()
+    assert provider_available("ingredients")
@@ -0,0 +1,25 @@
+from services.multi_modal import _merge_crossing
+
+KNOWN_SAFE = {"croissant": '[safe, 🥐, croissant, "No known allergen risk."]'}
+KNOWN_DANGEROUS = {"shrimp": '[dangerous, 🦐, shrimp, "Contains Seafood. High allergy risk."]'}
+
+
+def test_model_can_raise_a_known_verdict():
+    model = ['[dangerous, 🥐, croissant, "Made with butter."]']
+    assert _merge_crossing(["croissant"], KNOWN_SAFE, model) == model
+
+
+def test_model_cannot_lower_a_known_verdict():
+    model = ['[safe, 🦐, shrimp, "Fine."]']
+    assert _merge_crossing(["shrimp"], KNOWN_DANGEROUS, model) == list(KNOWN_DANGEROUS.values())
+
+
+def test_known_record_wins_a_tie_and_duplicates_are_dropped():
+    model = ['[dangerous, 🦐, Shrimp, "Shellfish."]', '[dangerous, 🦐, shrimp, "Again."]']
+    assert _merge_crossing(["shrimp"], KNOWN_DANGEROUS, model) == list(KNOWN_DANGEROUS.values())
+
+
+def test_order_follows_ingredients():
+    model = ['[alert, 🍚, fried rice, "May contain egg."]', '[safe, 🥬, lettuce, "Fine."]']
+    merged = _merge_crossing(["lettuce", "shrimp", "fried rice"], KNOWN_DANGEROUS, model)
+    assert [line.split(", ")[2] for line in merged] == ["lettuce", "shrimp", "fried rice"]
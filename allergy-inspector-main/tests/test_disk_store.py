@@ -0,0 +1,42 @@
+import os
+
+from services.cache import DiskStore
+
+
+def write_files(store, count, size=100):
+    paths = []
+    for index in range(count):
+        path = store.path(f"{index:04x}" * 16, ".bin")
+        store.write(path, b"x" * size)
+        os.utime(path, (index, index))  # Oldest first.
+        paths.append(path)
+    return paths
+
+
+def test_eviction_removes_oldest_files_down_to_the_low_water_mark(tmp_path):
+    store = DiskStore(tmp_path, max_bytes=1000, suffixes=(".bin",))
+    paths = write_files(store, 11)
+    remaining = [path for path in paths if os.path.exists(path)]
+    assert sum(os.path.getsize(path) for path in remaining) <= 900
+    assert remaining == paths[-len(remaining):]
+
+
+def test_writes_under_budget_do_not_walk_the_directory(tmp_path, monkeypatch):
+    store = DiskStore(tmp_path, max_bytes=10_000, suffixes=(".bin",))
+    walks = []
+    entries = store._entries
+    monkeypatch.setattr(store, "_entries", lambda: walks.append(1) or entries())
+    write_files(store, 20)
+    assert len(walks) == 1  # The first write measures the directory.
+
+
+def test_add_and_other_suffixes(tmp_path):
+    store = DiskStore(tmp_path, max_bytes=150, suffixes=(".bin",))
+    other = tmp_path / "download.part"
+    other.write_bytes(b"y" * 1000)
+    tmp = tmp_path / "new.tmp"
+    tmp.write_bytes(b"x" * 100)
+    path = store.path("ab" * 32, ".bin")
+    store.add(path, str(tmp))
+    assert os.path.exists(path) and not tmp.exists()
+    assert other.exists()  # Files with other suffixes are neither counted nor evicted.
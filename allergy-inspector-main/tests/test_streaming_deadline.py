@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from services import resilience
+from services.resilience import DeadlineExceeded, chat_breaker, complete, complete_async, reset_breakers
+
+OPERATION = "stream_test"
+
+
+def fake_client(chunks, delay, error=None):
+    async def response():
+        for chunk in range(chunks):
+            await asyncio.sleep(delay)
+            yield chunk
+        if error is not None:
+            raise error
+
+    async def create(timeout=None, stream=False, **kwargs):
+        return response()
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.fixture(autouse=True)
+def short_deadline(monkeypatch):
+    monkeypatch.setenv(f"MODEL_DEADLINE_{OPERATION.upper()}", "0.2")
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+async def collect(**kwargs):
+    return [chunk async for chunk in await complete_async(OPERATION, stream=True, **kwargs)]
+
+
+def test_deadline_bounds_the_whole_stream(monkeypatch):
+    # Every chunk arrives well within the deadline; the stream as a whole does not.
+    monkeypatch.setattr(resilience, "get_async_openai_client", lambda: fake_client(chunks=10, delay=0.05))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(collect())
+    assert chat_breaker(OPERATION).stats()["consecutive_failures"] == 1  # A slow provider counts.
+
+
+def test_stream_errors_count_against_the_breaker(monkeypatch):
+    error = openai.APIConnectionError(request=None)
+    monkeypatch.setattr(resilience, "get_async_openai_client", lambda: fake_client(chunks=2, delay=0, error=error))
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(collect())
+    assert chat_breaker(OPERATION).stats()["consecutive_failures"] == 1
+
+
+def test_sync_streams_share_the_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "get_async_openai_client", lambda: fake_client(chunks=3, delay=0.01))
+    assert list(complete(OPERATION, stream=True)) == [0, 1, 2]
+    monkeypatch.setattr(resilience, "get_async_openai_client", lambda: fake_client(chunks=10, delay=0.05))
+    with pytest.raises(DeadlineExceeded):
+        list(complete(OPERATION, stream=True))
@@ -0,0 +1,50 @@
+import json
+import threading
+
+from services import video_jobs
+from services.video_jobs import COMPLETED, SUBMITTED, VideoJob, VideoJobManager
+
+
+def job(key, status=SUBMITTED, **fields):
+    return VideoJob(key=key, allergies=["Peanut"], ratio="16:9", duration=5, status=status, **fields)
+
+
+def test_managers_sharing_a_directory_keep_each_others_jobs(tmp_path):
+    first, second = VideoJobManager(jobs_dir=str(tmp_path)), VideoJobManager(jobs_dir=str(tmp_path))
+    with first._lock:
+        first._jobs["a"] = job("a")
+        first._save_locked(first._jobs["a"])
+    with second._lock:
+        second._jobs["b"] = job("b")
+        second._save_locked(second._jobs["b"])
+    assert sorted(VideoJobManager(jobs_dir=str(tmp_path))._jobs) == ["a", "b"]
+
+
+def test_submit_attaches_to_another_process_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_jobs, "lookup_video", lambda key: None)
+    manager = VideoJobManager(jobs_dir=str(tmp_path))
+    monkeypatch.setattr(manager, "_ensure_worker", lambda: None)
+    key = video_jobs.video_key(["Peanut"], "16:9", 5)
+    (tmp_path / f"{key}.json").write_text(json.dumps(video_jobs.asdict(job(key, generation_id="gen-1"))))
+    assert manager.submit(["Peanut"]) == key
+    assert manager.get(key)["generation_id"] == "gen-1"
+
+
+def test_store_runs_outside_the_lock(tmp_path, monkeypatch):
+    manager = VideoJobManager(jobs_dir=str(tmp_path))
+    manager._jobs["a"] = job("a", video_url="https://video.example/a.mp4", generation_id="gen-1")
+    locked = []
+    monkeypatch.setattr(video_jobs, "download_video", lambda url: "sha")
+
+    def store_video(*args):
+        acquired = manager._lock.acquire(blocking=False)
+        locked.append(not acquired)
+        if acquired:
+            manager._lock.release()
+
+    monkeypatch.setattr(video_jobs, "store_video", store_video)
+    thread = threading.Thread(target=manager._download_job, args=("a",))
+    thread.start()
+    thread.join()
+    assert locked == [False]
+    assert manager.get("a")["status"] == COMPLETED and manager.get("a")["video_sha"] == "sha"
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import threading
+
+from services import voice_model
+
+# An engine that writes a WAV header and then hangs without closing stdout.
+HUNG_ENGINE = """#!{python}
+import sys, time, struct
+sys.stdin.read()
+fmt = struct.pack("<HHIIHH", 1, 1, 22050, 44100, 2, 16)
+sys.stdout.buffer.write(b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE" + b"fmt " + struct.pack("<I", 16) + fmt
+                        + b"data" + struct.pack("<I", 0xFFFFFFFF) + b"\\0" * 100)
+sys.stdout.flush()
+time.sleep(60)
+"""
+
+
+def hung_engine(tmp_path):
+    path = tmp_path / "espeak-ng"
+    path.write_text(HUNG_ENGINE.format(python=sys.executable))
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+def test_hung_engine_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(voice_model, "SYNTHESIS_TIMEOUT", 0.5)
+    stream = voice_model._synthesize_stream(hung_engine(tmp_path), "Peanut sauce.", "en-us")
+    next(stream)  # fmt
+    start = time.monotonic()
+    try:
+        list(stream)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("expected TimeoutError")
+    assert time.monotonic() - start < 2
+
+
+def test_stop_ends_the_stream_without_caching(tmp_path, monkeypatch):
+    monkeypatch.setattr(voice_model, "find_engine", lambda: hung_engine(tmp_path))
+    monkeypatch.setattr(voice_model, "_store_phrase", lambda *args: stored.append(args))
+    stored, stop = [], threading.Event()
+    threading.Timer(0.3, stop.set).start()
+    start = time.monotonic()
+    chunks = list(voice_model.stream_voice("A phrase nobody cached.", stop=stop))
+    assert chunks and time.monotonic() - start < 2
+    assert not stored
+
+
+def test_voice_url(monkeypatch):
+    monkeypatch.setattr(voice_model, "VOICE_PUBLIC_URL", "")
+    assert voice_model.voice_url("Peanut.") is None
+    monkeypatch.setattr(voice_model, "VOICE_PUBLIC_URL", "https://api.example")
+    assert voice_model.voice_url("Peanut sauce.") == "https://api.example/v1/voice?text=Peanut+sauce.&voice=en-us"
+    assert voice_model.voice_available()
@@ -7,7 +7,21 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from utils.session_state import init_session_state
 from utils.media_handler import image_to_base64
-from services.multi_modal import get_infers_allergy_model_response
+from services.multi_modal import get_infers_allergy_model_response, normalize_description
+from services.resilience import provider_available, start_degradation_tracking
+from services import remote
+
+def add_inferred_allergies(inferred):
+    """Adds inferred allergies to the options and selection, reusing an existing option's spelling."""
+    options = {option.lower(): option for option in st.session_state["allergy_options"]}
+    for item in inferred:
+        name = options.setdefault(item.lower(), item)
+        st.session_state["allergy_options"].append(name)
+        st.session_state["user_allergies"].append(name)
+
+    # Remove duplicates while preserving order
+    st.session_state["allergy_options"] = list(dict.fromkeys(st.session_state["allergy_options"]))
+    st.session_state["user_allergies"] = list(dict.fromkeys(st.session_state["user_allergies"]))
 
 def sidebar_setup():
     """Sets up the sidebar UI for user allergy preferences."""
@@ -28,22 +42,30 @@ def sidebar_setup():
                 "Describe what made you sick previously when you ate it (optional):",
                 value=st.session_state.get("user_description", "")
             )
-
-            # Automatically infer allergies from user description
-            if description:
-                with st.spinner("Processing..."):
-                    response = get_infers_allergy_model_response(description)
-                    if response and response != "[noone]":
-                        response_list = [item.strip() for item in response]  # Ensure clean list
-                        for item in response_list:
-                            st.session_state["allergy_options"].append(item)
-                            st.session_state["user_allergies"].append(item)
-
-                        # Remove duplicates while preserving order
-                        st.session_state["allergy_options"] = list(dict.fromkeys(st.session_state["allergy_options"]))
-                        st.session_state["user_allergies"] = list(dict.fromkeys(st.session_state["user_allergies"]))
-                    else:
-                        st.write("No allergies identified.")
+            st.session_state["user_description"] = description
+
+            # Infer allergies only when the description actually changed, not on every rerun
+            normalized = normalize_description(description)
+            if normalized != st.session_state.get("inferred_description", ""):
+                inferred, degraded = [], set()
+                if normalized:
+                    with st.spinner("Processing..."):
+                        infer = remote.infer_allergies if remote.remote_enabled() else get_infers_allergy_model_response
+                        degraded = start_degradation_tracking()
+                        inferred = infer(normalized)
+                    add_inferred_allergies(inferred)
+                st.session_state["inferred_description"] = normalized
+                st.session_state["inferred_allergies"] = inferred
+                st.session_state["inference_degraded"] = bool(degraded)
+            if normalized and not st.session_state.get("inferred_allergies"):
+                # A failed lookup is not "no allergies".
+                unavailable = st.session_state.get("inference_degraded") or (
+                    not remote.remote_enabled() and not provider_available("infer_allergies")
+                )
+                if unavailable:
+                    st.warning("The AI service is unavailable right now. Please pick your allergies from the list below.")
+                else:
+                    st.write("No allergies identified.")
 
             user_allergies = st.multiselect(
                 "Select your allergies:",
@@ -1,4 +1,5 @@
 import base64
+import html
 import streamlit as st
 from PIL import Image
 import io
@@ -13,3 +14,11 @@ def image_to_base64(image_bytes):
         return "Image file not found. Please check the path."
     except Exception as e:
         return f"An error occurred: {str(e)}"
+
+def thumbnail_html(handle, width=100, style="border-radius:10px;"):
+    """
+    An <img> tag showing the handle's thumbnail (a few KB) instead of the full image.
+    """
+    if not handle.thumbnail:
+        return f'<span title="{html.escape(handle.name, quote=True)}">🖼️</span>'
+    return f'<img src="data:image/jpeg;base64,{image_to_base64(handle.thumbnail)}" width="{width}" style="{style}" />'
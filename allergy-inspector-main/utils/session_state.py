@@ -1,5 +1,7 @@
 import streamlit as st
 
+from services.session_store import SessionStore
+
 def init_session_state():
     if "allergies_selected" not in st.session_state:
         st.session_state["allergies_selected"] = False
@@ -7,7 +9,9 @@ def init_session_state():
         st.session_state["user_name"] = ""
         st.session_state["user_avatar"] = ""
         st.session_state["user_description"] = ""
-        st.session_state["uploaded_file"] = None
+        st.session_state["inferred_description"] = ""
+        st.session_state["inferred_allergies"] = []
+        st.session_state["meal_image"] = None  # ImageHandle of the last photo; bytes live in media_store()
         st.session_state["active"] = False
         st.session_state["selected"] = ""
         st.session_state["processing"] = False
@@ -19,3 +23,12 @@ def init_session_state():
             "Onion", "Spices", "Lupin", "Poppy seeds"
         ]
         st.session_state["videos"] = []
+
+def media_store():
+    """
+    This session's SessionStore. It lives in session state, so it is garbage
+    collected (and its spill directory removed) when the session ends.
+    """
+    if "media_store" not in st.session_state:
+        st.session_state["media_store"] = SessionStore()
+    return st.session_state["media_store"]